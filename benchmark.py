@@ -1,37 +1,702 @@
+import difflib
+import hashlib
+import json
+import math
+import subprocess
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from ingestor import Neo4JIngestor, PSQLIngestor
+from pathlib import Path
+import parser
+import exporter
+import manifest
+from ingestor import Neo4JIngestor, PSQLIngestor, PartitionedPSQLIngestor, RESULT_DIR
+from results import read_rss, reset_peak_rss
+from reference import (
+    ReferenceEngine,
+    REFERENCE_SIMPLE,
+    REFERENCE_COMPLEX,
+    REFERENCE_GRAPH_SIMPLE,
+    REFERENCE_GRAPH_COMPLEX,
+    REFERENCE_ANALYTICS,
+    REFERENCE_GRAPH_ANALYTICS
+)
 from queries import (
     POSTGRES_SIMPLE,
     POSTGRES_COMPLEX,
+    POSTGRES_INT_SIMPLE,
+    POSTGRES_INT_COMPLEX,
+    POSTGRES_AGG_SIMPLE,
+    POSTGRES_AGG_COMPLEX,
+    POSTGRES_INT_AGG_SIMPLE,
+    POSTGRES_INT_AGG_COMPLEX,
+    POSTGRES_PRUNING,
+    POSTGRES_ANALYTICS,
+    POSTGRES_INT_ANALYTICS,
     NEO4J_SIMPLE,
     NEO4J_COMPLEX
 )
 
-def run_metrics(pg_runner: PSQLIngestor | None = None, neo4j_runner: Neo4JIngestor | None = None):
-    if pg_runner is None and neo4j_runner is None:
+# Query set matching each PSQLIngestor.KEY_TYPE
+POSTGRES_QUERIES = {
+    "text": (POSTGRES_SIMPLE, POSTGRES_COMPLEX),
+    "int": (POSTGRES_INT_SIMPLE, POSTGRES_INT_COMPLEX),
+}
+
+# The same queries answered from the aggregate tables, where they apply
+POSTGRES_AGG_QUERIES = {
+    "text": (POSTGRES_AGG_SIMPLE, POSTGRES_AGG_COMPLEX),
+    "int": (POSTGRES_INT_AGG_SIMPLE, POSTGRES_INT_AGG_COMPLEX),
+}
+
+POSTGRES_ANALYTICS_QUERIES = {
+    "text": POSTGRES_ANALYTICS,
+    "int": POSTGRES_INT_ANALYTICS,
+}
+
+def summarize(samples: list[float], confidence: float = 0.95, resamples: int = 2000) -> dict:
+    """
+    Order statistics of a query's timed runs, with a bootstrap
+    confidence interval of the median.
+    """
+    a = np.asarray(samples, dtype=float)
+    medians = np.median(np.random.default_rng(0).choice(a, (resamples, len(a))), axis=1)
+    ci_low, ci_high = np.quantile(medians, [(1 - confidence) / 2, (1 + confidence) / 2])
+
+    return {
+        "iterations": len(a),
+        "min_sec": a.min(),
+        "median_sec": np.median(a),
+        "mean_sec": a.mean(),
+        "p95_sec": np.quantile(a, 0.95),
+        "p99_sec": np.quantile(a, 0.99),
+        "std_sec": a.std(ddof=1) if len(a) > 1 else 0.0,
+        "ci_low_sec": ci_low,
+        "ci_high_sec": ci_high,
+    }
+
+def mann_whitney_p(a: list[float], b: list[float]) -> float:
+    """
+    Two-sided p-value of the Mann-Whitney U test, normal approximation
+    with tie correction. Makes no assumption about the shape of the
+    latency distributions, which are usually skewed.
+    """
+    n1, n2 = len(a), len(b)
+    n = n1 + n2
+    ranks = pd.Series([*a, *b]).rank(method="average").to_numpy()
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+
+    ties = pd.Series([*a, *b]).value_counts().to_numpy()
+    variance = n1 * n2 / 12 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+
+    z = max(abs(u - n1 * n2 / 2) - 0.5, 0) / math.sqrt(variance)
+    return math.erfc(z / math.sqrt(2))
+
+def compare_backends(samples: pd.DataFrame, alpha: float = 0.05, partners: dict[str, set[str]] | None = None) -> pd.DataFrame:
+    """
+    Compares every pair of databases on the queries they both ran, matched
+    by query id (S1, C2, ...). significant is False when the difference in
+    timings could be noise at the alpha level. A db listed in partners is
+    only compared with the dbs listed for it, e.g. a reference engine with
+    the backends whose queries it computes.
+    """
+    partners = partners or {}
+    samples = samples.assign(query_id=samples["query"].str.split("_").str[0])
+    timings = samples.groupby(["db", "query_id"])["time_sec"].apply(list)
+    dbs = list(samples["db"].unique())
+    rows = []
+
+    for i, db_a in enumerate(dbs):
+        for db_b in dbs[i + 1:]:
+            if db_b not in partners.get(db_a, {db_b}) or db_a not in partners.get(db_b, {db_a}):
+                continue
+            for query_id in sorted(set(timings[db_a].index) & set(timings[db_b].index)):
+                a, b = timings[db_a][query_id], timings[db_b][query_id]
+                p = mann_whitney_p(a, b)
+                rows.append({
+                    "query_id": query_id,
+                    "db_a": db_a,
+                    "db_b": db_b,
+                    "median_a_sec": np.median(a),
+                    "median_b_sec": np.median(b),
+                    "ratio_b_a": np.median(b) / np.median(a) if np.median(a) > 0 else np.nan,
+                    "p_value": p,
+                    "significant": p < alpha,
+                })
+
+    return pd.DataFrame(rows)
+
+def cold_cache_hook(command: str, runners: list[PSQLIngestor | Neo4JIngestor]) -> Callable[[], None]:
+    """
+    Runs a shell command that empties the caches before each timed run,
+    e.g. restarting the servers and dropping the OS page cache, then waits
+    for every runner to reconnect.
+    """
+    def evict():
+        subprocess.run(command, shell=True, check=True)
+        for runner in runners:
+            runner.reconnect()
+    return evict
+
+def capture_plans(runner: PSQLIngestor | Neo4JIngestor, queries: dict, tolerance: float = 0.1) -> list[dict]:
+    """
+    Saves the executed plan of every query next to its result CSV, as
+    {label}_{query}.plan.json, and compares it with the plan saved by the
+    previous run. A plan's fingerprint hashes its outline (see plan_outline),
+    so it changes only when the shape of the plan does. A counter (db hits,
+    buffer reads, ...) counts as changed when it moved by more than tolerance.
+    A changed outline is diffed into {label}_{query}.plan.diff.
+    """
+    records = []
+
+    for name, query in queries.items():
+        path = Path(RESULT_DIR) / f"{runner.label}_{name}.plan.json"
+        previous = json.loads(path.read_text()) if path.exists() else None
+
+        plan = runner.query_plan(query)
+        outline = runner.plan_outline(plan)
+        counters = runner.plan_counters(plan)
+        fingerprint = hashlib.sha256("\n".join(outline).encode()).hexdigest()[:16]
+
+        path.write_text(json.dumps({
+            "fingerprint": fingerprint,
+            "outline": outline,
+            "counters": counters,
+            "plan": plan,
+        }, indent=2, default=str))
+
+        record = {"db": runner.label, "query": name, "fingerprint": fingerprint, **counters}
+        if previous is not None:
+            record["previous_fingerprint"] = previous["fingerprint"]
+            record["plan_changed"] = previous["fingerprint"] != fingerprint
+            changed = []
+            for counter, value in counters.items():
+                old = previous["counters"].get(counter, 0)
+                record[f"previous_{counter}"] = old
+                if abs(value - old) > tolerance * max(old, 1):
+                    changed.append(counter)
+            record["counters_changed"] = ",".join(changed)
+
+            diff_path = path.with_suffix(".diff")
+            if record["plan_changed"]:
+                diff_path.write_text("\n".join(difflib.unified_diff(
+                    previous["outline"], outline, "previous", "current", lineterm=""
+                )) + "\n")
+                record["diff_path"] = str(diff_path)
+            elif diff_path.exists():
+                diff_path.unlink()
+
+        records.append(record)
+
+    return records
+
+def run_metrics(
+    pg_runner: PSQLIngestor | None = None,
+    neo4j_runner: Neo4JIngestor | None = None,
+    warmup: int = 1,
+    iterations: int = 10,
+    cold_command: str | None = None,
+    reference: ReferenceEngine | None = None,
+    analytics: bool = False,
+    result_format: str = "csv"
+):
+    """
+    Times every query iterations times after warmup untimed runs, or with
+    cold caches when cold_command is given (see cold_cache_hook). Writes the
+    per-query statistics to benchmark_results.csv, every timed run to
+    benchmark_samples.csv and the pairwise backend comparison to
+    benchmark_comparison.csv. Query plans are captured and compared with
+    the previous run's into plan_changes.csv, see capture_plans.
+
+    When pg_runner keeps aggregate tables, the queries they answer are also
+    timed against them under the "{label}_agg" db, so the comparison shows
+    raw against precomputed.
+
+    With a reference engine, the queries are also computed in process, the
+    relational ones as "reference" and the graph ones as "reference_graph",
+    and every database result that differs from them is listed in
+    result_mismatches.csv.
+
+    With analytics, the graph analytics (triangles, components, k-core,
+    PageRank) are timed as a third "analytics" tier on PostgreSQL and the
+    reference engine. There are no Cypher versions of them yet.
+
+    Results are written as result_format, see results.py; the streamed
+    formats never hold a whole result on the client. Every query's export
+    throughput and peak memory are in benchmark_results.csv.
+    """
+    if pg_runner is None and neo4j_runner is None and reference is None:
         raise ValueError("No database is provided")
+    if iterations < 1:
+        raise ValueError("At least one timed iteration is needed")
 
-    results = []
+    runners = [r for r in (pg_runner, neo4j_runner) if r is not None]
+    before_run = cold_cache_hook(cold_command, runners) if cold_command else None
+    options = {"warmup": warmup, "iterations": iterations, "before_run": before_run, "result_format": result_format}
+
+    pg_results = []
+    neo4j_results = []
+    reference_results = []
+    reference_graph_results = []
 
     if pg_runner is not None:
-        results += pg_runner.metrics(
-            POSTGRES_SIMPLE,  "simple"
+        simple, complex = POSTGRES_QUERIES[pg_runner.KEY_TYPE]
+        pg_results += pg_runner.metrics(
+            simple,  "simple", **options
         )
-        results += pg_runner.metrics(
-            POSTGRES_COMPLEX, "complex"
+        pg_results += pg_runner.metrics(
+            complex, "complex", **options
         )
+        if pg_runner.aggregates:
+            simple, complex = POSTGRES_AGG_QUERIES[pg_runner.KEY_TYPE]
+            label = f"{pg_runner.label}_agg"
+            pg_results += pg_runner.metrics(
+                simple, "simple", **options, label=label
+            )
+            pg_results += pg_runner.metrics(
+                complex, "complex", **options, label=label
+            )
+        if analytics:
+            pg_results += pg_runner.metrics(
+                POSTGRES_ANALYTICS_QUERIES[pg_runner.KEY_TYPE], "analytics", **options
+            )
 
     if neo4j_runner is not None:
-        results += neo4j_runner.metrics(
-            NEO4J_SIMPLE, "simple"
+        neo4j_results += neo4j_runner.metrics(
+            NEO4J_SIMPLE, "simple", **options
         )
-        results += neo4j_runner.metrics(
-            NEO4J_COMPLEX, "complex"
+        neo4j_results += neo4j_runner.metrics(
+            NEO4J_COMPLEX, "complex", **options
         )
 
-    df = pd.DataFrame(results)
+    if reference is not None:
+        # In process, there are no caches to evict
+        reference_options = {"warmup": warmup, "iterations": iterations, "result_format": result_format}
+        reference_results += reference.metrics(
+            REFERENCE_SIMPLE, "simple", **reference_options
+        )
+        reference_results += reference.metrics(
+            REFERENCE_COMPLEX, "complex", **reference_options
+        )
+        reference_graph_results += reference.metrics(
+            REFERENCE_GRAPH_SIMPLE, "simple", **reference_options, label=f"{reference.label}_graph"
+        )
+        reference_graph_results += reference.metrics(
+            REFERENCE_GRAPH_COMPLEX, "complex", **reference_options, label=f"{reference.label}_graph"
+        )
+        if analytics:
+            reference_results += reference.metrics(
+                REFERENCE_ANALYTICS, "analytics", **reference_options
+            )
+            reference_graph_results += reference.metrics(
+                REFERENCE_GRAPH_ANALYTICS, "analytics", **reference_options, label=f"{reference.label}_graph"
+            )
+
+        mismatches = pd.DataFrame(
+            reference.mismatches(reference_results, pg_results)
+            + reference.mismatches(reference_graph_results, neo4j_results)
+        )
+        mismatches.to_csv("result_mismatches.csv", index=False)
+        for m in mismatches.itertuples():
+            if not m.match:
+                print(
+                    f"{m.query} on {m.db} differs from {m.reference}: {m.rows} rows instead of "
+                    f"{m.expected_rows}, {m.missing_rows} missing, {m.extra_rows} unexpected"
+                )
+
+    results = pg_results + neo4j_results + reference_results + reference_graph_results
+
+    samples = pd.DataFrame([
+        {"db": r["db"], "query": r["query"], "complexity": r["complexity"], "iteration": i, **timing}
+        for r in results
+        for i, timing in enumerate(r["samples"])
+    ])
+    samples["cold"] = cold_command is not None
+    samples.to_csv("benchmark_samples.csv", index=False)
+
+    df = pd.DataFrame([
+        {**{k: v for k, v in r.items() if k != "samples"}, **summarize([t["time_sec"] for t in r["samples"]])}
+        for r in results
+    ])
     df["preview"] = df["preview"].astype(str)
     df.to_csv("benchmark_results.csv", index=False)
 
+    plans = []
+    if pg_runner is not None:
+        for queries in POSTGRES_QUERIES[pg_runner.KEY_TYPE]:
+            plans += capture_plans(pg_runner, queries)
+    if neo4j_runner is not None:
+        for queries in (NEO4J_SIMPLE, NEO4J_COMPLEX):
+            plans += capture_plans(neo4j_runner, queries)
+
+    plans = pd.DataFrame(plans)
+    plans.to_csv("plan_changes.csv", index=False)
+    if "plan_changed" in plans.columns:
+        for p in plans[plans["plan_changed"] == True].itertuples():
+            print(f"Plan of {p.query} on {p.db} changed since the previous run:")
+            print(Path(p.diff_path).read_text())
+        for p in plans[plans["counters_changed"].fillna("") != ""].itertuples():
+            print(f"{p.query} on {p.db}: {p.counters_changed} changed since the previous run")
+
+    # The relational reference answers the PostgreSQL queries, the graph one the Neo4j queries
+    partners = {}
+    if reference is not None:
+        partners[reference.label] = {r["db"] for r in pg_results}
+        partners[f"{reference.label}_graph"] = {r["db"] for r in neo4j_results}
+    comparison = compare_backends(samples, partners=partners)
+    comparison.to_csv("benchmark_comparison.csv", index=False)
+    if not comparison.empty and not comparison["significant"].all():
+        print("Not statistically significant:", ", ".join(
+            f"{c.query_id} ({c.db_a} vs {c.db_b}, p={c.p_value:.2f})"
+            for c in comparison.itertuples() if not c.significant
+        ))
+
     return df
 
+def count_rows(
+    edges: list[tuple[str, str]],
+    feats: list[tuple[str, str]],
+    node_features: dict[str, list[str]],
+    ego_features: dict[str, list[str]],
+    circles: dict[str, list[str]]
+) -> int:
+    """
+    Number of rows handed to ingestEgoNetwork for a single ego,
+    used to turn load times into rows/sec.
+    """
+    return (
+        2 # node + ego
+        + 2 * len(node_features) # node + user_node
+        + len(circles)
+        + sum(len(users) for users in circles.values())
+        + len(feats)
+        + sum(len(f) for f in node_features.values())
+        + sum(len(f) for f in ego_features.values())
+        + len(edges)
+    )
+
+def run_load_metrics(runner: PSQLIngestor | Neo4JIngestor, data_dir: Path, modes: list[str]):
+    """
+    Wipes the database and reloads the full dataset once per load mode.
+    Time spent in begin_load, ingestEgoNetwork, finish_ego and finish_load is
+    measured, parsing is excluded. finish_ego includes the upkeep of the
+    PostgreSQL aggregate tables when they are enabled.
+    Every ego is recorded in the ingest manifest, untimed, as data-import
+    does, so the database is left loaded and known to be. The runner's load
+    mode is restored afterwards.
+    """
+    uids = parser.getUids(data_dir)
+    results = []
+    load_mode = runner.load_mode
+
+    try:
+        for mode in modes:
+            runner.wipe()
+            runner.load_mode = mode
+            rows = 0
+
+            start = time.perf_counter()
+            runner.begin_load()
+            elapsed = time.perf_counter() - start
+
+            for uid in uids:
+                network = parser.parseEgoNetwork(data_dir, uid)
+                rows += count_rows(*network)
+
+                start = time.perf_counter()
+                runner.ingestEgoNetwork(uid, *network)
+                runner.finish_ego(uid)
+                elapsed += time.perf_counter() - start
+
+                checksums = manifest.checksums(data_dir, uid)
+                manifest.snapshot(data_dir, uid, checksums)
+                runner.recordEgo(uid, checksums, manifest.rowCounts(*network))
+
+            start = time.perf_counter()
+            runner.finish_load()
+            finish = time.perf_counter() - start
+            elapsed += finish
+
+            results.append({
+                "db": runner.label,
+                "mode": mode,
+                "egos": len(uids),
+                "rows": rows,
+                "time_sec": elapsed,
+                "finish_sec": finish,
+                "rows_per_sec": rows / elapsed if elapsed else 0.0
+            })
+    finally:
+        runner.load_mode = load_mode
+
+    df = pd.DataFrame(results)
+    df.to_csv(f"load_results_{runner.label}.csv", index=False)
+
+    return df
+
+def run_offline_load_metrics(data_dir: Path, database: str, neo4j_admin: str | None = None, out_dir: Path = Path(exporter.EXPORT_DIR)):
+    """
+    Times the neo4j-admin CSV export and, when a neo4j-admin binary is given,
+    the offline import of those files into database, which is overwritten
+    and must not be running (see exporter.runAdminImport).
+    """
+    results = []
+
+    start = time.perf_counter()
+    counts = exporter.exportNeo4jImport(data_dir, out_dir)
+    elapsed = time.perf_counter() - start
+    rows = sum(counts.values())
+
+    results.append({
+        "db": database,
+        "mode": "admin-export",
+        "egos": len(parser.getUids(data_dir)),
+        "rows": rows,
+        "time_sec": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0
+    })
+
+    if neo4j_admin is not None:
+        start = time.perf_counter()
+        exporter.runAdminImport(database, out_dir, neo4j_admin)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            "db": database,
+            "mode": "admin-import",
+            "egos": results[0]["egos"],
+            "rows": rows,
+            "time_sec": elapsed,
+            "rows_per_sec": rows / elapsed if elapsed else 0.0
+        })
+
+    df = pd.DataFrame(results)
+    df.to_csv(f"load_results_{database}_offline.csv", index=False)
+
+    return df
+
+def run_memory_metrics(runner: PSQLIngestor | Neo4JIngestor, data_dir: Path, batch_bytes: int):
+    """
+    Reloads the dataset in memory and streaming mode and records the
+    peak RSS reached while parsing and ingesting each ego.
+    """
+    uids = parser.getUids(data_dir)
+    results = []
+
+    for mode in ("in-memory", "streaming"):
+        runner.wipe()
+
+        for uid in uids:
+            reset_peak_rss()
+            rss_before = read_rss()
+            start = time.perf_counter()
+
+            if mode == "streaming":
+                runner.ingestEgoStream(uid, parser.EgoStream(data_dir, uid, batch_bytes))
+            else:
+                runner.ingestEgoNetwork(uid, *parser.parseEgoNetwork(data_dir, uid))
+
+            elapsed = time.perf_counter() - start
+            peak = read_rss("VmHWM")
+
+            results.append({
+                "db": runner.label,
+                "mode": mode,
+                "ego": uid,
+                "input_mb": sum(f.stat().st_size for f in data_dir.glob(f"{uid}.*")) / 2**20,
+                "rss_before_mb": rss_before / 2**20,
+                "peak_rss_mb": peak / 2**20,
+                "peak_delta_mb": (peak - rss_before) / 2**20,
+                "time_sec": elapsed
+            })
+
+    df = pd.DataFrame(results)
+    df.to_csv(f"memory_results_{runner.label}.csv", index=False)
+
+    return df
+
+def run_size_metrics(pg_runner: PSQLIngestor):
+    """
+    Records the on-disk size of every table of the runner's schema.
+    """
+    df = pd.DataFrame(pg_runner.table_sizes())
+    df.to_csv(f"size_results_{pg_runner.label}.csv", index=False)
+
+    return df
+
+def run_index_metrics(pg_runner: PSQLIngestor, profile: str = "workload", warmup: int = 1, iterations: int = 10):
+    """
+    Times the workload without any secondary index, then builds profile
+    (see PSQLIngestor.INDEX_PROFILES) and times it again. Writes the build
+    time and size of each index to index_build_{label}.csv and the median
+    of each query with and without the indexes to index_speedup_{label}.csv.
+    The runner's own profile is restored afterwards.
+    """
+    simple, complex = POSTGRES_QUERIES[pg_runner.KEY_TYPE]
+    label = f"{pg_runner.label}_{profile}"
+
+    pg_runner.drop_indexes()
+    pg_runner.analyze()
+    without = pg_runner.metrics(simple, "simple", warmup, iterations)
+    without += pg_runner.metrics(complex, "complex", warmup, iterations)
+
+    build = pd.DataFrame(pg_runner.build_indexes(profile))
+    build.to_csv(f"index_build_{pg_runner.label}.csv", index=False)
+
+    with_indexes = pg_runner.metrics(simple, "simple", warmup, iterations, label=label)
+    with_indexes += pg_runner.metrics(complex, "complex", warmup, iterations, label=label)
+
+    pg_runner.drop_indexes()
+    pg_runner.build_indexes()
+
+    speedup = pd.DataFrame([
+        {
+            "db": pg_runner.label,
+            "profile": profile,
+            "query": a["query"],
+            "complexity": a["complexity"],
+            "without_sec": a["time_sec"],
+            "with_sec": b["time_sec"],
+            "speedup": a["time_sec"] / b["time_sec"] if b["time_sec"] else math.nan,
+            "p_value": mann_whitney_p(
+                [t["time_sec"] for t in a["samples"]], [t["time_sec"] for t in b["samples"]]
+            )
+        }
+        for a, b in zip(without, with_indexes)
+    ])
+    speedup.to_csv(f"index_speedup_{pg_runner.label}.csv", index=False)
+
+    return build, speedup
+
+def run_partition_metrics(
+    part_runner: PartitionedPSQLIngestor,
+    base_runner: PSQLIngestor | None = None,
+    warmup: int = 1,
+    iterations: int = 10
+):
+    """
+    Times the text-schema workload and POSTGRES_PRUNING on the partitioned
+    schema with partition-wise aggregation and joins off, then on (under
+    the "{label}_pwise" db), and on base_runner's unpartitioned tables
+    when given. Writes the statistics to partition_results.csv, with the
+    number of edge partitions each query read, and the pairwise comparison
+    to partition_comparison.csv.
+    """
+    simple, complex = POSTGRES_QUERIES[part_runner.KEY_TYPE]
+    query_sets = [(simple, "simple"), (complex, "complex"), (POSTGRES_PRUNING, "pruning")]
+    options = {"warmup": warmup, "iterations": iterations}
+
+    results = []
+    if base_runner is not None:
+        for queries, complexity in query_sets:
+            results += base_runner.metrics(queries, complexity, **options)
+
+    try:
+        for enabled, label in ((False, part_runner.label), (True, f"{part_runner.label}_pwise")):
+            part_runner.partitionwise(enabled)
+            for queries, complexity in query_sets:
+                for r in part_runner.metrics(queries, complexity, **options, label=label):
+                    r["partitions_scanned"] = part_runner.scanned_partitions(queries[r["query"]])
+                    results.append(r)
+    finally:
+        part_runner.partitionwise(False)
+
+    samples = pd.DataFrame([
+        {"db": r["db"], "query": r["query"], "complexity": r["complexity"], "iteration": i, **timing}
+        for r in results
+        for i, timing in enumerate(r["samples"])
+    ])
+
+    df = pd.DataFrame([
+        {**{k: v for k, v in r.items() if k not in ("samples", "preview")}, **summarize([t["time_sec"] for t in r["samples"]])}
+        for r in results
+    ])
+    df["partitions"] = len(part_runner.partitions())
+    df.to_csv("partition_results.csv", index=False)
+
+    comparison = compare_backends(samples)
+    comparison.to_csv("partition_comparison.csv", index=False)
+
+    return df, comparison
+
+def workload(runner: PSQLIngestor | Neo4JIngestor) -> dict:
+    """
+    Every simple and complex query the runner's backend is benchmarked with.
+    """
+    if isinstance(runner, PSQLIngestor):
+        simple, complex = POSTGRES_QUERIES[runner.KEY_TYPE]
+    else:
+        simple, complex = NEO4J_SIMPLE, NEO4J_COMPLEX
+    return {**simple, **complex}
+
+def run_throughput_metrics(runner: PSQLIngestor | Neo4JIngestor, levels: list[int], duration_sec: float = 10):
+    """
+    Runs the runner's workload from K concurrent clients for duration_sec,
+    for every K in levels. Each client is a thread with its own
+    runner.worker() that cycles through the queries, starting at a different
+    one, so that every query is in flight at every level. Records the
+    throughput and the latency percentiles of each level.
+    """
+    queries = list(workload(runner).values())
+    results = []
+
+    for clients in levels:
+        latencies: list[float] = []
+        errors = 0
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration_sec
+
+        def client(offset: int):
+            nonlocal errors
+            db = runner.worker()
+            own: list[float] = []
+            failed = 0
+            try:
+                i = offset
+                while time.perf_counter() < deadline:
+                    try:
+                        _, timing = db.run_query(queries[i % len(queries)])
+                        own.append(timing["time_sec"])
+                    except Exception:
+                        # Counted and reported, a failing query must not stop the client
+                        failed += 1
+                        if isinstance(db, PSQLIngestor):
+                            db.conn.rollback()
+                    i += 1
+            finally:
+                if db is not runner:
+                    db.close()
+            with lock:
+                latencies.extend(own)
+                errors += failed
+
+        with ThreadPoolExecutor(clients) as pool:
+            for future in [pool.submit(client, k) for k in range(clients)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        a = np.asarray(latencies)
+        results.append({
+            "db": runner.label,
+            "clients": clients,
+            "queries": len(a),
+            "errors": errors,
+            "elapsed_sec": elapsed,
+            "qps": len(a) / elapsed,
+            "p50_sec": np.quantile(a, 0.5) if len(a) else np.nan,
+            "p95_sec": np.quantile(a, 0.95) if len(a) else np.nan,
+            "p99_sec": np.quantile(a, 0.99) if len(a) else np.nan,
+            "mean_sec": a.mean() if len(a) else np.nan,
+        })
+        print(f"{runner.label}: {clients} clients, {results[-1]['qps']:.1f} queries/sec")
+
+    df = pd.DataFrame(results)
+    df.to_csv(f"throughput_results_{runner.label}.csv", index=False)
+
+    return df
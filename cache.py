@@ -0,0 +1,163 @@
+"""
+Binary cache of the parsed dataset, one .npy file per array so every array
+can be opened with mmap_mode. Node and feature ids are interned to integers
+shared by all egos:
+
+    nodes.npy                   node id strings, indexed by interned node id
+    feature_groups.npy          group name of each interned feature
+    feature_names.npy           name of each interned feature
+    egos/<uid>/featnames.npy    interned feature ids, in .featnames order
+    egos/<uid>/users.npy        interned node ids, in .feat order
+    egos/<uid>/feat_indptr.npy  CSR row pointers of the user x feature incidence
+    egos/<uid>/feat_indices.npy interned feature ids of each user
+    egos/<uid>/egofeat.npy      interned feature ids of the ego
+    egos/<uid>/edge_nodes.npy   interned node ids of the ego-local edge numbering
+    egos/<uid>/edge_indptr.npy  CSR row pointers of the edges, by local source
+    egos/<uid>/edge_indices.npy local destination of each edge
+    egos/<uid>/circle_ids.npy   circle id strings
+    egos/<uid>/circle_indptr.npy  CSR row pointers of the circle memberships
+    egos/<uid>/circle_indices.npy interned node ids of each circle's members
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from shutil import rmtree
+import numpy as np
+import parser
+
+COMPLETE_MARKER = "COMPLETE"
+
+def cacheDir(data_dir: Path) -> Path:
+    return data_dir.with_name(f"{data_dir.name}.cache")
+
+def isFresh(data_dir: Path, cache_dir: Path | None = None) -> bool:
+    """
+    The cache is used only if it was fully written after the last change to any source file.
+    """
+    marker = (cache_dir or cacheDir(data_dir)) / COMPLETE_MARKER
+    if not marker.exists():
+        return False
+
+    built = marker.stat().st_mtime
+    return all(f.stat().st_mtime <= built for f in data_dir.iterdir())
+
+def to_csr(rows: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=indptr[1:])
+    indices = np.fromiter((v for r in rows for v in r), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+def compileCache(data_dir: Path, cache_dir: Path | None = None):
+    """
+    Parses every ego once and writes the binary cache.
+    """
+    cache_dir = cache_dir or cacheDir(data_dir)
+    if cache_dir.exists():
+        rmtree(cache_dir)
+    (cache_dir / "egos").mkdir(parents=True)
+
+    node_ids: dict[str, int] = {}
+    feature_ids: dict[tuple[str, str], int] = {}
+
+    def node(node_id: str) -> int:
+        return node_ids.setdefault(node_id, len(node_ids))
+
+    def feature(key: tuple[str, str]) -> int:
+        return feature_ids.setdefault(key, len(feature_ids))
+
+    for uid in parser.getUids(data_dir):
+        edges, feats, node_features, ego_features, circles = parser.parseEgoNetwork(data_dir, uid, use_cache=False)
+        ego_dir = cache_dir / "egos" / uid
+        ego_dir.mkdir()
+
+        featnames = [feature(f) for f in feats]
+        # Parsed features only keep the name, any feature with that name decodes the same
+        by_name: dict[str, int] = {}
+        for (_, name), fid in zip(feats, featnames):
+            by_name.setdefault(name, fid)
+
+        feat_indptr, feat_indices = to_csr([[by_name[n] for n in names] for names in node_features.values()])
+
+        src = np.fromiter((node(a) for a, _ in edges), dtype=np.int32, count=len(edges))
+        dst = np.fromiter((node(b) for _, b in edges), dtype=np.int32, count=len(edges))
+        edge_nodes = np.unique(np.concatenate([src, dst]))
+        local_src = np.searchsorted(edge_nodes, src)
+        order = np.argsort(local_src, kind="stable")
+        edge_indptr = np.zeros(len(edge_nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(local_src, minlength=len(edge_nodes)), out=edge_indptr[1:])
+        edge_indices = np.searchsorted(edge_nodes, dst[order]).astype(np.int32)
+
+        circle_indptr, circle_indices = to_csr([[node(u) for u in users] for users in circles.values()])
+
+        arrays = {
+            "featnames": np.array(featnames, dtype=np.int32),
+            "users": np.array([node(u) for u in node_features.keys()], dtype=np.int32),
+            "feat_indptr": feat_indptr,
+            "feat_indices": feat_indices,
+            "egofeat": np.array([by_name[n] for n in ego_features.get(uid, [])], dtype=np.int32),
+            "edge_nodes": edge_nodes.astype(np.int32),
+            "edge_indptr": edge_indptr,
+            "edge_indices": edge_indices,
+            "circle_ids": np.array(list(circles.keys()), dtype=str),
+            "circle_indptr": circle_indptr,
+            "circle_indices": circle_indices,
+        }
+        for name, array in arrays.items():
+            np.save(ego_dir / f"{name}.npy", array)
+
+    np.save(cache_dir / "nodes.npy", np.array(list(node_ids.keys()), dtype=str))
+    np.save(cache_dir / "feature_groups.npy", np.array([g for g, _ in feature_ids], dtype=str))
+    np.save(cache_dir / "feature_names.npy", np.array([n for _, n in feature_ids], dtype=str))
+
+    (cache_dir / COMPLETE_MARKER).touch()
+    openShared.cache_clear()
+
+@lru_cache(maxsize=4)
+def openShared(cache_dir: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.load(cache_dir / "nodes.npy", mmap_mode="r"),
+        np.load(cache_dir / "feature_groups.npy", mmap_mode="r"),
+        np.load(cache_dir / "feature_names.npy", mmap_mode="r"),
+    )
+
+def openEgo(cache_dir: Path, uid: str) -> dict[str, np.ndarray]:
+    ego_dir = cache_dir / "egos" / uid
+    return {f.stem: np.load(f, mmap_mode="r") for f in ego_dir.glob("*.npy")}
+
+def loadEgoNetwork(cache_dir: Path, uid: str) -> tuple[
+    list[tuple[str, str]],
+    list[tuple[str, str]],
+    dict[str, list[str]],
+    dict[str, list[str]],
+    dict[str, list[str]]
+]:
+    """
+    Decodes an ego from the cache into the same structures parseEgoNetwork returns.
+    Edges come back grouped by source node.
+    """
+    nodes, groups, names = openShared(cache_dir)
+    ego = openEgo(cache_dir, uid)
+
+    edge_nodes = nodes[ego["edge_nodes"]]
+    src = np.repeat(edge_nodes, np.diff(ego["edge_indptr"]))
+    dst = edge_nodes[ego["edge_indices"]]
+    edges = list(zip(src.tolist(), dst.tolist()))
+
+    feats = list(zip(groups[ego["featnames"]].tolist(), names[ego["featnames"]].tolist()))
+
+    users = nodes[ego["users"]].tolist()
+    feat_indptr = ego["feat_indptr"].tolist()
+    feat_names = names[ego["feat_indices"]].tolist()
+    node_features = {u: feat_names[feat_indptr[i]:feat_indptr[i + 1]] for i, u in enumerate(users)}
+
+    ego_features = {uid: names[ego["egofeat"]].tolist()}
+
+    circle_indptr = ego["circle_indptr"].tolist()
+    members = nodes[ego["circle_indices"]].tolist()
+    circles: dict[str, list[str]] = defaultdict(list[str], {
+        cid: members[circle_indptr[i]:circle_indptr[i + 1]]
+        for i, cid in enumerate(ego["circle_ids"].tolist())
+    })
+
+    return edges, feats, node_features, ego_features, circles
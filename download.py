@@ -0,0 +1,231 @@
+"""
+Parallel, resumable download of a tar archive that is extracted while it
+downloads:
+
+    HTTP Range requests (thread pool) -> <archive>.part at their offsets
+    <archive>.part, read in order as it fills -> sha256 + streaming tarfile
+
+The ranges done so far are kept in <archive>.part.json, so an interrupted
+download resumes where it stopped as long as the server still serves the
+same file (same size and ETag or Last-Modified). Members are extracted
+into a staging directory that is moved into place only once the archive
+is complete and its checksum verified.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CHUNK_BYTES = 8 * 1024 * 1024
+PIECE_BYTES = 1024 * 1024
+
+class ChecksumError(Exception):
+    pass
+
+class PartFile:
+    """
+    The archive being downloaded: chunks are written by the download
+    threads at their offsets, and read back in order by the extraction,
+    which waits for bytes that are not there yet.
+    """
+    def __init__(self, path: Path, size: int | None, chunk_bytes: int, state: dict | None = None) -> None:
+        self.path = path
+        self.size = size
+        self.lock = threading.Condition()
+        self.error: BaseException | None = None
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if size is None:
+            self.chunks = [(0, None)]
+        else:
+            os.ftruncate(self.fd, size)
+            self.chunks = [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+        # Bytes written at the start of each chunk
+        self.filled = (state or {}).get("filled") or [0] * len(self.chunks)
+        self.finished = False
+        self.pos = 0
+        self.digest = hashlib.sha256()
+
+    def state(self) -> dict:
+        with self.lock:
+            return {"filled": list(self.filled)}
+
+    def write(self, chunk: int, data: bytes):
+        """
+        Raises the error that stopped the download, if any, so the other
+        threads stop too.
+        """
+        if self.error is not None:
+            raise self.error
+        start, _ = self.chunks[chunk]
+        os.pwrite(self.fd, data, start + self.filled[chunk])
+        with self.lock:
+            self.filled[chunk] += len(data)
+            self.lock.notify_all()
+
+    def done(self, chunk: int) -> bool:
+        start, end = self.chunks[chunk]
+        return end is not None and self.filled[chunk] == end - start
+
+    def fail(self, error: BaseException):
+        with self.lock:
+            self.error = error
+            self.lock.notify_all()
+
+    def finish(self):
+        """
+        Marks the end of an archive of unknown size.
+        """
+        with self.lock:
+            self.finished = True
+            self.lock.notify_all()
+
+    def available(self) -> int:
+        """
+        Bytes that can be read from pos without waiting, -1 at the end.
+        """
+        if self.size is not None and self.pos >= self.size:
+            return -1
+        chunk = next(i for i, (start, end) in enumerate(self.chunks) if end is None or self.pos < end)
+        start, _ = self.chunks[chunk]
+        ready = start + self.filled[chunk] - self.pos
+        if ready <= 0 and self.size is None and self.finished:
+            return -1
+        return max(ready, 0)
+
+    def read(self, n: int = -1) -> bytes:
+        with self.lock:
+            while (ready := self.available()) == 0:
+                if self.error is not None:
+                    raise self.error
+                self.lock.wait()
+        if ready < 0:
+            return b""
+        data = os.pread(self.fd, ready if n < 0 else min(n, ready), self.pos)
+        self.pos += len(data)
+        self.digest.update(data)
+        return data
+
+    def close(self):
+        os.close(self.fd)
+
+def probe(session, url: str) -> tuple[int | None, str | None]:
+    """
+    Size of the file behind url and a validator that changes with it, or
+    None for a size when the server does not serve byte ranges.
+    """
+    r = session.head(url, allow_redirects=True, timeout=60)
+    r.raise_for_status()
+    validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+    if r.headers.get("Accept-Ranges", "").lower() != "bytes" or "Content-Length" not in r.headers:
+        return None, validator
+    return int(r.headers["Content-Length"]), validator
+
+def fetchChunk(url: str, part: PartFile, chunk: int, validator: str | None):
+    import requests
+    start, end = part.chunks[chunk]
+    if part.done(chunk):
+        return
+    headers = {}
+    if end is not None:
+        headers["Range"] = f"bytes={start + part.filled[chunk]}-{end - 1}"
+        if validator is not None:
+            headers["If-Range"] = validator
+
+    with requests.get(url, headers=headers, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        if end is not None and r.status_code != 206:
+            raise IOError(f"{url} changed or ignored the range request (HTTP {r.status_code})")
+        for data in r.iter_content(chunk_size=PIECE_BYTES):
+            part.write(chunk, data)
+    if end is None:
+        part.finish()
+    elif not part.done(chunk):
+        raise IOError(f"{url} ended early in bytes {start}-{end - 1}")
+
+def fetchArchive(
+    url: str,
+    archive: Path,
+    out_dir: Path,
+    workers: int = 4,
+    chunk_bytes: int = CHUNK_BYTES,
+    sha256: str | None = None
+) -> str:
+    """
+    Downloads the tar archive at url with workers concurrent range requests
+    of chunk_bytes and extracts it into out_dir as it arrives, resuming a
+    previous attempt left in archive.part. Raises ChecksumError when the
+    archive's sha256 is not the expected one, and returns it otherwise.
+    Servers without range support are read in one request, from the start.
+    """
+    import requests
+    part_path = Path(f"{archive}.part")
+    state_path = Path(f"{archive}.part.json")
+    staging = out_dir / f".{archive.name}.extract"
+
+    with requests.Session() as session:
+        size, validator = probe(session, url)
+
+    key = {"url": url, "size": size, "validator": validator, "chunk_bytes": chunk_bytes}
+    state = json.loads(state_path.read_text()) if state_path.exists() else None
+    if size is None or state is None or state.get("key") != key or not part_path.exists():
+        part_path.unlink(missing_ok=True)
+        state = None
+    shutil.rmtree(staging, ignore_errors=True)
+
+    part = PartFile(part_path, size, chunk_bytes, state)
+    saving = threading.Lock()
+
+    def save():
+        if size is not None:
+            with saving:
+                tmp = state_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps({"key": key, **part.state()}))
+                tmp.replace(state_path)
+
+    def fetch(chunk: int):
+        try:
+            fetchChunk(url, part, chunk, validator)
+        except BaseException as e:
+            part.fail(e)
+            raise
+        finally:
+            save()
+
+    try:
+        with ThreadPoolExecutor(max(workers, 1)) as pool:
+            futures = [pool.submit(fetch, chunk) for chunk in range(len(part.chunks))]
+            try:
+                with tarfile.open(fileobj=part, mode="r|*") as tar:
+                    tar.extractall(staging, filter="data")
+                # Padding after the last member, read for the checksum
+                while part.read(PIECE_BYTES):
+                    pass
+            except BaseException as e:
+                # Stops the chunks that have not started
+                for future in futures:
+                    future.cancel()
+                part.fail(e)
+                raise
+            for future in futures:
+                future.result()
+    finally:
+        part.close()
+
+    digest = part.digest.hexdigest()
+    if sha256 is not None and digest != sha256.lower():
+        part_path.unlink()
+        state_path.unlink(missing_ok=True)
+        shutil.rmtree(staging)
+        raise ChecksumError(f"{url} has sha256 {digest}, expected {sha256}")
+
+    for entry in staging.iterdir():
+        entry.rename(out_dir / entry.name)
+    staging.rmdir()
+    part_path.unlink()
+    state_path.unlink(missing_ok=True)
+    return digest
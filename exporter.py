@@ -0,0 +1,120 @@
+import csv
+import subprocess
+from os import makedirs
+from pathlib import Path
+import parser
+
+EXPORT_DIR = "neo4j_import"
+
+# file name -> (header, label or relationship type)
+NODE_FILES: dict[str, tuple[list[str], str]] = {
+    "egos.csv": (["id:ID(Ego)", ":LABEL"], "Ego"),
+    "users.csv": (["id:ID(User)", ":LABEL"], "User"),
+    "circles.csv": (["id:ID(Circle)", ":LABEL"], "Circle"),
+    "featgroups.csv": (["name:ID(FeatGroup)", ":LABEL"], "FeatGroup"),
+    "featnames.csv": (["name:ID(FeatName)", ":LABEL"], "FeatName"),
+}
+
+RELATIONSHIP_FILES: dict[str, tuple[list[str], str]] = {
+    "ego_follows.csv": ([":START_ID(Ego)", ":END_ID(User)", ":TYPE"], "FOLLOWS"),
+    "user_follows.csv": ([":START_ID(User)", ":END_ID(User)", ":TYPE"], "FOLLOWS"),
+    "owns.csv": ([":START_ID(Ego)", ":END_ID(Circle)", ":TYPE"], "OWNS"),
+    "ego_has_feat.csv": ([":START_ID(Ego)", ":END_ID(FeatName)", ":TYPE"], "HAS_FEAT"),
+    "user_has_feat.csv": ([":START_ID(User)", ":END_ID(FeatName)", ":TYPE"], "HAS_FEAT"),
+    "owns_feat.csv": ([":START_ID(FeatGroup)", ":END_ID(FeatName)", ":TYPE"], "OWNS_FEAT"),
+    "part_of.csv": ([":START_ID(User)", ":END_ID(Circle)", ":TYPE"], "PART_OF"),
+}
+
+def write_csv(path: Path, header: list[str], tag: str, rows) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow((*row, tag))
+            count += 1
+    return count
+
+def exportNeo4jImport(data_dir: Path, out_dir: Path = Path(EXPORT_DIR)) -> dict[str, int]:
+    """
+    Writes the whole dataset as deduplicated node and relationship CSVs
+    for `neo4j-admin database import full`.
+    Mirrors the graph built by Neo4JIngestor.ingestEgoNetwork: relationships
+    whose endpoints are not created as nodes are dropped, like an unmatched MATCH.
+    Returns the number of rows written per file.
+    """
+    egos: set[str] = set()
+    users: set[str] = set()
+    circles: set[str] = set()
+    groups: set[str] = set()
+    names: set[str] = set()
+
+    ego_follows: set[tuple[str, str]] = set()
+    user_follows: set[tuple[str, str]] = set()
+    owns: set[tuple[str, str]] = set()
+    ego_has_feat: set[tuple[str, str]] = set()
+    user_has_feat: set[tuple[str, str]] = set()
+    owns_feat: set[tuple[str, str]] = set()
+    part_of: set[tuple[str, str]] = set()
+
+    for uid in parser.getUids(data_dir):
+        edges, feats, node_features, ego_features, circs = parser.parseEgoNetwork(data_dir, uid)
+
+        egos.add(uid)
+        users.update(node_features.keys())
+        circles.update(circs.keys())
+        groups.update(group for group, _ in feats)
+        names.update(name for _, name in feats)
+
+        ego_follows.update((uid, user) for user in node_features.keys())
+        user_follows.update(edges)
+        owns.update((uid, cid) for cid in circs.keys())
+        ego_has_feat.update((ego, name) for ego, fs in ego_features.items() for name in fs)
+        user_has_feat.update((user, name) for user, fs in node_features.items() for name in fs)
+        owns_feat.update(feats)
+        part_of.update((user, cid) for cid, members in circs.items() for user in members)
+
+    nodes = {
+        "egos.csv": ((e,) for e in egos),
+        "users.csv": ((u,) for u in users),
+        "circles.csv": ((c,) for c in circles),
+        "featgroups.csv": ((g,) for g in groups),
+        "featnames.csv": ((n,) for n in names),
+    }
+
+    relationships = {
+        "ego_follows.csv": ego_follows,
+        "user_follows.csv": ((a, b) for a, b in user_follows if a in users and b in users),
+        "owns.csv": owns,
+        "ego_has_feat.csv": ((e, n) for e, n in ego_has_feat if n in names),
+        "user_has_feat.csv": ((u, n) for u, n in user_has_feat if n in names),
+        "owns_feat.csv": owns_feat,
+        "part_of.csv": ((u, c) for u, c in part_of if u in users),
+    }
+
+    makedirs(out_dir, exist_ok=True)
+    counts: dict[str, int] = {}
+
+    for fname, (header, label) in NODE_FILES.items():
+        counts[fname] = write_csv(out_dir / fname, header, label, nodes[fname])
+
+    for fname, (header, rel_type) in RELATIONSHIP_FILES.items():
+        counts[fname] = write_csv(out_dir / fname, header, rel_type, relationships[fname])
+
+    return counts
+
+def adminImportCommand(database: str, out_dir: Path = Path(EXPORT_DIR), neo4j_admin: str = "neo4j-admin") -> list[str]:
+    return [
+        neo4j_admin, "database", "import", "full", database,
+        "--overwrite-destination",
+        *[f"--nodes={(out_dir / fname).resolve()}" for fname in NODE_FILES],
+        *[f"--relationships={(out_dir / fname).resolve()}" for fname in RELATIONSHIP_FILES],
+    ]
+
+def runAdminImport(database: str, out_dir: Path = Path(EXPORT_DIR), neo4j_admin: str = "neo4j-admin"):
+    """
+    Runs the offline importer. The target database must not be running,
+    a name the server does not serve needs no stop, and neo4j-admin must
+    run on the database host.
+    """
+    subprocess.run(adminImportCommand(database, out_dir, neo4j_admin), check=True)
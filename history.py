@@ -0,0 +1,239 @@
+"""
+Append-only benchmark history in SQLite. Every metrics run is recorded
+with what it ran against, next to the per-query statistics and timed
+samples run_metrics wrote:
+
+    runs            one row per run: id, time, git revision, server
+                    versions and the PostgreSQL configuration
+    query_results   per-query statistics of a run (benchmark_results.csv)
+    query_samples   every timed run of a query (benchmark_samples.csv)
+
+Rows are only ever inserted, a run is compared against the runs before it
+with the same configuration (see regression_report).
+"""
+
+import sqlite3
+import subprocess
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+from ingestor import Neo4JIngestor, PSQLIngestor
+
+SCHEMA = """
+create table if not exists runs (
+    run_id text primary key,
+    started_at text not null,
+    git_revision text,
+    git_dirty integer,
+    postgres_version text,
+    neo4j_version text,
+    pg_schema text,
+    index_profile text,
+    aggregates integer,
+    result_format text,
+    cold integer not null,
+    warmup integer not null,
+    iterations integer not null
+);
+
+create table if not exists query_results (
+    run_id text not null references runs(run_id),
+    db text not null,
+    query text not null,
+    complexity text,
+    rows integer,
+    median_sec real,
+    min_sec real,
+    mean_sec real,
+    p95_sec real,
+    ci_low_sec real,
+    ci_high_sec real,
+    server_sec real,
+    peak_bytes integer,
+    primary key (run_id, db, query)
+);
+
+create table if not exists query_samples (
+    run_id text not null references runs(run_id),
+    db text not null,
+    query text not null,
+    iteration integer not null,
+    time_sec real not null,
+    primary key (run_id, db, query, iteration)
+);
+"""
+
+RESULT_COLUMNS = [
+    "db", "query", "complexity", "rows", "median_sec", "min_sec", "mean_sec", "p95_sec",
+    "ci_low_sec", "ci_high_sec", "server_sec", "peak_bytes"
+]
+
+# A run's baseline is made of earlier runs that agree on all of these
+CONFIG_COLUMNS = ["pg_schema", "index_profile", "aggregates", "result_format", "cold"]
+
+@contextmanager
+def connect(db_path: str) -> Iterator[sqlite3.Connection]:
+    """
+    A connection to the history, created if missing, committed on success.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            yield conn
+    finally:
+        conn.close()
+
+def git_revision() -> tuple[str | None, bool | None]:
+    """
+    Commit checked out in the repository of this file and whether the
+    working tree has changes, None outside of a git checkout.
+    """
+    cwd = Path(__file__).parent
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, bool(status.strip())
+
+def run_info(
+    pg_runner: PSQLIngestor | None,
+    neo4j_runner: Neo4JIngestor | None,
+    warmup: int,
+    iterations: int,
+    cold: bool = False,
+    result_format: str = "csv"
+) -> dict:
+    revision, dirty = git_revision()
+    return {
+        "run_id": uuid.uuid4().hex,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": revision,
+        "git_dirty": dirty,
+        "postgres_version": pg_runner.server_version() if pg_runner is not None else None,
+        "neo4j_version": neo4j_runner.server_version() if neo4j_runner is not None else None,
+        "pg_schema": pg_runner.label if pg_runner is not None else None,
+        "index_profile": pg_runner.indexes if pg_runner is not None else None,
+        "aggregates": pg_runner.aggregates if pg_runner is not None else None,
+        "result_format": result_format,
+        "cold": cold,
+        "warmup": warmup,
+        "iterations": iterations,
+    }
+
+def record_run(
+    db_path: str,
+    info: dict,
+    results_csv: str = "benchmark_results.csv",
+    samples_csv: str = "benchmark_samples.csv"
+) -> str:
+    """
+    Appends the run described by info (see run_info) with the results
+    run_metrics wrote, returning its run id.
+    """
+    results = pd.read_csv(results_csv)
+    samples = pd.read_csv(samples_csv)
+    run_id = info["run_id"]
+
+    results = results.reindex(columns=RESULT_COLUMNS).assign(run_id=run_id)
+    samples = samples[["db", "query", "iteration", "time_sec"]].assign(run_id=run_id)
+
+    with connect(db_path) as conn:
+        pd.DataFrame([info]).to_sql("runs", conn, if_exists="append", index=False)
+        results.to_sql("query_results", conn, if_exists="append", index=False)
+        samples.to_sql("query_samples", conn, if_exists="append", index=False)
+    return run_id
+
+def load_history(db_path: str) -> pd.DataFrame:
+    """
+    Every recorded query result with the run it belongs to, in the order
+    the runs were recorded.
+    """
+    with connect(db_path) as conn:
+        return pd.read_sql(
+            """
+            select r.*, q.db, q.query, q.complexity, q.rows, q.median_sec, q.min_sec, q.mean_sec,
+                   q.p95_sec, q.ci_low_sec, q.ci_high_sec, q.server_sec, q.peak_bytes
+            from query_results q
+            join runs r on r.run_id = q.run_id
+            order by r.rowid, q.rowid
+            """,
+            conn
+        )
+
+def regression_report(
+    db_path: str,
+    run_id: str | None = None,
+    threshold: float = 0.2,
+    window: int = 5,
+    alpha: float = 0.05
+) -> pd.DataFrame:
+    """
+    Compares every query of run_id, the latest run by default, with its
+    rolling baseline: the median of its medians over the window previous
+    runs of the same configuration (CONFIG_COLUMNS). regressed when the
+    query got slower than the baseline by more than threshold, a fraction,
+    and significant when its samples differ from the baseline runs' at the
+    alpha level (see benchmark.mann_whitney_p).
+    """
+    from benchmark import mann_whitney_p
+
+    history = load_history(db_path)
+    if history.empty:
+        return pd.DataFrame()
+    if run_id is None:
+        run_id = history["run_id"].iloc[-1]
+
+    runs = history.drop_duplicates("run_id").reset_index(drop=True)
+    position = runs.index[runs["run_id"] == run_id][0]
+    current = runs.loc[position]
+    earlier = runs.loc[:position - 1]
+    same_config = (earlier[CONFIG_COLUMNS].fillna("") == current[CONFIG_COLUMNS].fillna("")).all(axis=1)
+    baseline_ids = list(earlier[same_config]["run_id"].iloc[-window:]) if window > 0 else []
+
+    with connect(db_path) as conn:
+        samples = pd.read_sql("select run_id, db, query, time_sec from query_samples", conn)
+    samples = samples[samples["run_id"].isin([run_id, *baseline_ids])]
+
+    rows = []
+    for q in history[history["run_id"] == run_id].itertuples():
+        base = history[
+            history["run_id"].isin(baseline_ids) & (history["db"] == q.db) & (history["query"] == q.query)
+        ]
+        record = {
+            "run_id": run_id,
+            "db": q.db,
+            "query": q.query,
+            "median_sec": q.median_sec,
+            "baseline_sec": None,
+            "baseline_runs": len(base),
+            "change": None,
+            "p_value": None,
+            "regressed": False,
+            "significant": False,
+        }
+        if not base.empty:
+            baseline = base["median_sec"].median()
+            mine = samples[(samples["run_id"] == run_id) & (samples["db"] == q.db) & (samples["query"] == q.query)]
+            theirs = samples[
+                samples["run_id"].isin(base["run_id"]) & (samples["db"] == q.db) & (samples["query"] == q.query)
+            ]
+            p = mann_whitney_p(mine["time_sec"].tolist(), theirs["time_sec"].tolist())
+            record.update({
+                "baseline_sec": baseline,
+                "change": q.median_sec / baseline - 1 if baseline > 0 else None,
+                "p_value": p,
+                "regressed": baseline > 0 and q.median_sec > baseline * (1 + threshold),
+                "significant": p < alpha,
+            })
+        rows.append(record)
+
+    return pd.DataFrame(rows)
@@ -1,7 +1,17 @@
+import json
+import sys
 import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable, Iterator
+from copy import copy
 from typing import LiteralString
 import pandas as pd
 from os import makedirs
+from parser import EgoStream
+from manifest import EgoDiff
+from results import RESULT_BATCH_ROWS, PeakMemory, export_stats, result_path, stream_result
 
 RESULT_DIR = "query_results"
 
@@ -9,55 +19,644 @@ def split_to_chunks(data, size:int = 50000):
     for i in range(0, len(data), size):
         yield data[i:i + size]
 
+def partition_rounds(pairs: list[tuple[str, str]], partitions: int, same_space: bool) -> list[list[list[tuple[str, str]]]]:
+    """
+    Splits (start node, end node) pairs into rounds of batches such that no two
+    batches of the same round touch a node of the same partition, so the
+    batches of a round can be written concurrently without lock conflicts.
+    For two node spaces (e.g. User -> FeatName) round r pairs start partition i
+    with end partition (i + r) % partitions. Within one space (User -> User)
+    partitions are paired like a round-robin tournament, plus one round for the
+    pairs that stay inside a partition. partitions must be even for same_space.
+    """
+    cells: dict[tuple[int, int], list[tuple[str, str]]] = defaultdict(list)
+    for src, dst in pairs:
+        cells[(hash(src) % partitions, hash(dst) % partitions)].append((src, dst))
+
+    if not same_space:
+        rounds = [
+            [cells[(i, (i + r) % partitions)] for i in range(partitions)]
+            for r in range(partitions)
+        ]
+    else:
+        rounds = [[cells[(i, i)] for i in range(partitions)]]
+        teams = list(range(partitions))
+        for _ in range(partitions - 1):
+            rounds.append([
+                cells[(teams[m], teams[-1 - m])] + cells[(teams[-1 - m], teams[m])]
+                for m in range(partitions // 2)
+            ])
+            teams = [teams[0], teams[-1], *teams[1:-1]]
+
+    return [[batch for batch in rnd if batch] for rnd in rounds]
+
+def phase_medians(timings: list[dict[str, float]]) -> dict[str, float]:
+    """
+    Median of each timed phase of a query's runs (see metrics). client_sec is
+    what the client adds to the server time: network transfer and decoding
+    rows into Python objects.
+    """
+    df = pd.DataFrame(timings)
+    df["client_sec"] = (df["time_sec"] - df["server_sec"]).clip(lower=0)
+    return {phase: float(value) for phase, value in df.median().items()}
+
+class AdaptiveBatcher:
+    """
+    Splits rows into batches whose size adapts per stage (one stage per write
+    statement) to the latency of the previous batches: sizes double while a
+    batch takes under half of target_sec and shrink towards target_sec when a
+    batch takes longer. A batch failing with an error the ingestor marks as
+    shrinkable (see Neo4JIngestor.shrinkable) is retried at half the size,
+    which also becomes the most the stage grows back to.
+    Shared by the threads of a parallel import.
+    """
+    def __init__(
+        self,
+        shrinkable: Callable[[Exception], bool],
+        initial: int = 50000,
+        min_size: int = 100,
+        max_size: int = 200000,
+        target_sec: float = 1.0
+    ) -> None:
+        self.shrinkable = shrinkable
+        self.initial = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_sec = target_sec
+        self.lock = threading.Lock()
+        self.sizes: dict[str, int] = {}
+        self.ceilings: dict[str, int] = {}
+        self.retries: dict[str, int] = defaultdict(int)
+
+    def size(self, stage: str) -> int:
+        with self.lock:
+            return self.sizes.setdefault(stage, self.initial)
+
+    def observe(self, stage: str, size: int, rows: int, elapsed: float):
+        """
+        Adjusts the stage's size after a batch of rows written in elapsed seconds.
+        Batches cut short by the end of the data only ever shrink the size.
+        """
+        if elapsed > self.target_sec:
+            new = max(int(size * self.target_sec / elapsed), size // 2, self.min_size)
+        elif elapsed < self.target_sec / 2 and rows == size:
+            new = min(size * 2, self.ceilings.get(stage, self.max_size))
+        else:
+            return
+        with self.lock:
+            self.sizes[stage] = new
+
+    def shrink(self, stage: str, size: int, exc: Exception) -> int:
+        if size <= self.min_size or not self.shrinkable(exc):
+            raise exc
+        new = max(size // 2, self.min_size)
+        with self.lock:
+            self.sizes[stage] = min(self.sizes.get(stage, new), new)
+            self.ceilings[stage] = min(self.ceilings.get(stage, new), new)
+            self.retries[stage] += 1
+        return new
+
+    def run(self, stage: str, rows: list, write: Callable[[list], None]):
+        """
+        Calls write on consecutive batches of rows. write must leave nothing
+        behind when it fails, so that the batch can be retried.
+        """
+        start = 0
+        while start < len(rows):
+            size = self.size(stage)
+            chunk = rows[start:start + size]
+            began = time.perf_counter()
+            try:
+                write(chunk)
+            except Exception as e:
+                self.shrink(stage, size, e)
+                continue
+            self.observe(stage, size, len(chunk), time.perf_counter() - began)
+            start += len(chunk)
+
+    def settled(self, names: dict[str, str]) -> pd.DataFrame:
+        """
+        The batch size each stage settled on, stages named by names.
+        """
+        return pd.DataFrame([
+            {"stage": names.get(stage, stage), "batch_size": size, "retries": self.retries[stage]}
+            for stage, size in sorted(self.sizes.items())
+        ])
+
+def stage_names(cls: type) -> dict[str, str]:
+    """
+    Names the write statements of an ingestor class after their attributes,
+    so that batch sizes can be reported per stage.
+    """
+    names: dict[str, str] = {}
+    for klass in reversed(cls.__mro__):
+        for attr, value in vars(klass).items():
+            if isinstance(value, str) and attr.isupper():
+                names[value] = attr
+            elif isinstance(value, dict) and attr.isupper():
+                names.update({v: f"{attr}[{k}]" for k, v in value.items() if isinstance(v, str)})
+    return names
+
 class Neo4JIngestor:
-    def __init__(self, uri: str, user: str, password: str, database: str) -> None:
+    LOAD_MODES = ("merge", "create")
+
+    def __init__(self, uri: str, user: str, password: str, database: str, load_mode: str = "merge", writers: int = 4) -> None:
         from neo4j import GraphDatabase
+        if load_mode not in self.LOAD_MODES:
+            raise ValueError(f"Unknown load mode: {load_mode}")
         self.database = database
-        self.driver = GraphDatabase.driver(uri, auth=(user, password), database = database)
+        self.label = database
+        self.load_mode = load_mode
+        self.writers = max(writers, 1)
+        # Fresh-load state of the create mode, see createEgoNetwork
+        self.fresh = False
+        self.created: dict[str, set] = defaultdict(set)
+        self.create_lock = threading.Lock()
+        self.batcher = AdaptiveBatcher(self.shrinkable)
+        self.driver_args = dict(uri = uri, auth = (user, password), database = database)
+        self.driver = GraphDatabase.driver(**self.driver_args)
+        self.setup_schema()
 
     def close(self):
         self.driver.close()
 
-    def wipe(self):
-        result = self.driver.session().run(
-            """
-            CALL {
-                MATCH (n)
-                DETACH DELETE n
-            } IN TRANSACTIONS;
-            """
-        )
+    def begin_load(self):
+        """
+        In create mode, checks that the database is empty and starts
+        tracking what has been created.
+        """
+        if self.load_mode != "create":
+            return
 
-    def metrics(self, queries: dict[str, LiteralString], complexity: str):
+        with self.driver.session() as session:
+            if session.run("MATCH (n) RETURN n LIMIT 1").single() is not None:
+                raise ValueError("The create load mode needs an empty database, wipe it first")
+
+        self.created.clear()
+        self.fresh = True
+
+    def finish_load(self):
+        self.fresh = False
+        self.created.clear()
+
+    def worker(self) -> "Neo4JIngestor":
+        """
+        The driver is thread-safe and ingestEgoNetwork opens its own session,
+        so parallel import workers share this ingestor.
+        """
+        return self
+
+    def retryable(self, exc: Exception) -> bool:
+        """
+        Transient errors, such as deadlocks between workers MERGE-ing the same
+        users, leave nothing behind and the ego can be re-ingested. In create
+        mode, the batches committed before the error are in created, so the
+        retry only writes the rest.
+        """
+        from neo4j.exceptions import TransientError
+        return isinstance(exc, TransientError)
+
+    def shrinkable(self, exc: Exception) -> bool:
+        """
+        Batches that exceed the transaction or heap memory of the server can
+        succeed when retried smaller.
+        """
+        from neo4j.exceptions import Neo4jError
+        return isinstance(exc, Neo4jError) and "OutOfMemory" in (exc.code or "")
+
+    def batch_sizes(self) -> pd.DataFrame:
+        return self.batcher.settled(stage_names(type(self)))
+
+    def wipe(self):
+        with self.driver.session() as session:
+            session.run(
+                """
+                CALL {
+                    MATCH (n)
+                    DETACH DELETE n
+                } IN TRANSACTIONS;
+                """
+            ).consume()
+        self.created.clear()
+
+    def reconnect(self, timeout_sec: float = 120):
+        """
+        Waits for the server to accept connections again, e.g. after a restart.
+        The driver replaces its broken connections by itself.
+        """
+        deadline = time.monotonic() + timeout_sec
+        while True:
+            try:
+                self.driver.verify_connectivity()
+                return
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1)
+
+    def server_version(self) -> str:
+        with self.driver.session() as session:
+            record = session.run("CALL dbms.components() YIELD versions, edition RETURN versions[0] AS version, edition").single()
+        return f"{record['version']} {record['edition']}"
+
+    def run_query(self, query: LiteralString) -> tuple[pd.DataFrame, dict[str, float]]:
+        """
+        Runs a query and returns its rows with the time spent until they are
+        all on the client (time_sec), the server's share of it as reported
+        by the result summary (server_sec) and the DataFrame build (frame_sec).
+        """
+        with self.driver.session() as session:
+            start = time.perf_counter()
+            result = session.run(query)
+            rows = list(result)
+            elapsed = time.perf_counter() - start
+            summary = result.consume()
+
+        start = time.perf_counter()
+        df = pd.DataFrame([r.data() for r in rows]) if rows else pd.DataFrame()
+        frame = time.perf_counter() - start
+
+        server = ((summary.result_available_after or 0) + (summary.result_consumed_after or 0)) / 1000
+        return df, {"time_sec": elapsed, "server_sec": server, "frame_sec": frame}
+
+    def stream_to(self, query: LiteralString, path: str, fmt: str) -> tuple[dict, dict[str, float]]:
+        """
+        Runs a query iterating its records lazily, RESULT_BATCH_ROWS pulled
+        from the server and written into path at a time. Timed as run_query,
+        write_sec being the time spent converting and writing the batches.
+        """
+        def batches(result) -> Iterator[tuple[list[str], list[tuple]]]:
+            # The first batch is yielded even when empty, it names the columns
+            columns = result.keys()
+            yield columns, [tuple(r.values()) for r in result.fetch(RESULT_BATCH_ROWS)]
+            while records := result.fetch(RESULT_BATCH_ROWS):
+                yield columns, [tuple(r.values()) for r in records]
+
+        with self.driver.session(fetch_size=RESULT_BATCH_ROWS) as session:
+            start = time.perf_counter()
+            result = session.run(query)
+            exported = stream_result(batches(result), path, fmt)
+            elapsed = time.perf_counter() - start
+            summary = result.consume()
+
+        server = ((summary.result_available_after or 0) + (summary.result_consumed_after or 0)) / 1000
+        return exported, {"time_sec": elapsed, "server_sec": server, "write_sec": exported["write_sec"]}
+
+    def query_plan(self, query: LiteralString) -> dict:
+        """
+        Profiled plan of a query, with the rows and db hits of every operator.
+        """
+        with self.driver.session() as session:
+            return session.run("PROFILE " + query).consume().profile
+
+    @staticmethod
+    def plan_outline(plan: dict, depth: int = 0) -> list[str]:
+        """
+        The shape of a plan, one operator per line: what it does and on
+        what, without any row counts or timings.
+        """
+        operator = plan["operatorType"].split("@")[0]
+        details = plan.get("args", {}).get("Details", "")
+        lines = ["  " * depth + (f"{operator} {details}" if details else operator)]
+        for child in plan.get("children", []):
+            lines += Neo4JIngestor.plan_outline(child, depth + 1)
+        return lines
+
+    @staticmethod
+    def plan_counters(plan: dict) -> dict[str, int]:
+        counters = {
+            "db_hits": plan.get("dbHits", 0),
+            "page_cache_hits": plan.get("pageCacheHits", 0),
+            "page_cache_misses": plan.get("pageCacheMisses", 0),
+        }
+        for child in plan.get("children", []):
+            for name, value in Neo4JIngestor.plan_counters(child).items():
+                counters[name] += value
+        return counters
+
+    def metrics(
+        self,
+        queries: dict[str, LiteralString],
+        complexity: str,
+        warmup: int = 0,
+        iterations: int = 1,
+        before_run: Callable[[], None] | None = None,
+        result_format: str = "csv"
+    ):
+        """
+        Runs every query warmup times untimed, then iterations timed times,
+        calling before_run (e.g. a cache eviction) ahead of each timed run.
+        Every phase (see run_query) is reported as its median, write_sec is
+        the time to write the result file and samples holds every timed run.
+        The result export and its peak memory are measured as in
+        PSQLIngestor.metrics.
+        """
         makedirs(RESULT_DIR, exist_ok=True)
         results = []
 
+        for name, query in queries.items():
+            path = result_path(RESULT_DIR, self.database, name, result_format)
+            for _ in range(warmup):
+                self.run_query(query)
+
+            timings = []
+            peak_memory = PeakMemory()
+            for i in range(iterations):
+                last = i == iterations - 1
+                if before_run is not None:
+                    before_run()
+                if last:
+                    peak_memory.start()
+                if result_format == "csv":
+                    df, timing = self.run_query(query)
+                    if last:
+                        start = time.perf_counter()
+                        df.to_csv(path, index=False)
+                        write_sec = time.perf_counter() - start
+                else:
+                    exported, timing = self.stream_to(query, path, result_format)
+                if last:
+                    peak = peak_memory.stop()
+                timings.append(timing)
+
+            medians = phase_medians(timings)
+            if result_format == "csv":
+                medians["write_sec"] = write_sec
+                exported = {"rows": len(df), "preview": df.head(10).to_dict(orient="records")}
+                export_sec = medians["time_sec"] + medians["frame_sec"] + medians["write_sec"]
+            else:
+                export_sec = medians["time_sec"]
+
+            results.append({
+                "db": self.database,
+                "query": name,
+                "complexity": complexity,
+                **medians,
+                "samples": timings,
+                "rows": exported["rows"],
+                "preview": exported["preview"],
+                "result_path": path,
+                **export_stats(exported["rows"], path, export_sec, peak)
+            })
+        return results
+        
+    CONSTRAINTS: list[LiteralString] = [
+        """
+        CREATE CONSTRAINT ingest_manifest_pk IF NOT EXISTS
+        FOR (m:IngestManifest)
+        REQUIRE (m.ego) IS UNIQUE;
+        """,
+        """
+        CREATE CONSTRAINT ego_pk IF NOT EXISTS
+        FOR (e:Ego)
+        REQUIRE (e.id) IS UNIQUE;
+        """,
+        """
+        CREATE CONSTRAINT user_pk IF NOT EXISTS
+        FOR (u:User)
+        REQUIRE (u.id) IS UNIQUE;
+        """,
+        """
+        CREATE CONSTRAINT circle_pk IF NOT EXISTS
+        FOR (c:Circle)
+        REQUIRE (c.id) IS UNIQUE;
+        """,
+        """
+        CREATE CONSTRAINT featgroup_pk IF NOT EXISTS
+        FOR (fg:FeatGroup)
+        REQUIRE (fg.name) IS UNIQUE;
+        """,
+        """
+        CREATE CONSTRAINT featname_pk IF NOT EXISTS
+        FOR (fn:FeatName)
+        REQUIRE (fn.name) IS UNIQUE;
+        """,
+    ]
+
+    def setup_schema(self, timeout_sec: int = 300):
+        """
+        Creates the uniqueness constraints every MERGE/MATCH of the ingest
+        relies on, once per ingestor, and waits for their indexes to be online.
+        """
         with self.driver.session() as session:
-            for name, query in queries.items():
-                start = time.perf_counter()
-                result = session.run(query)
-                rows = list(result)
-                elapsed = time.perf_counter() - start
+            for constraint in self.CONSTRAINTS:
+                session.run(constraint).consume()
+            session.run("CALL db.awaitIndexes($timeout)", timeout = timeout_sec).consume()
+
+    MERGE_EGO: LiteralString = """
+        MERGE (e:Ego {id: $ego})
+    """
+
+    MERGE_USERS: LiteralString = """
+        UNWIND $rows as n
+        MERGE (u:User {id: n.id})
+    """
+
+    MERGE_CIRCLES: LiteralString = """
+        UNWIND $rows as n
+        MERGE (c:Circle {id: n.id})
+        WITH n,c
+        MATCH (e:Ego {id: n.ego})
+        MERGE (e)-[:OWNS]->(c)
+    """
+
+    MERGE_FEAT_GROUPS: LiteralString = """
+        UNWIND $rows as f
+        MERGE (fg:FeatGroup {name: f.name})
+    """
+
+    MERGE_FEAT_NAMES: LiteralString = """
+        UNWIND $rows as f
+        MERGE (fn:FeatName {name: f.fn})
+        WITH f, fn
+        MATCH (fg:FeatGroup {name: f.gn})
+        MERGE (fg)-[:OWNS_FEAT]->(fn)
+    """
+
+    MERGE_USER_FEATS: LiteralString = """
+        UNWIND $rows as m
+        MATCH (u:User {id: m.id})
+        MATCH (fn:FeatName {name: m.fn})
+        MERGE (u)-[:HAS_FEAT]->(fn)
+    """
+
+    MERGE_EGO_FEATS: LiteralString = """
+        UNWIND $rows as m
+        MATCH (e:Ego {id: m.id})
+        MATCH (fn:FeatName {name: m.fn})
+        MERGE (e)-[:HAS_FEAT]->(fn)
+    """
+
+    MERGE_EGO_FOLLOWS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (e:Ego {id: n.src})
+        MATCH (u:User {id: n.dst})
+        MERGE (e)-[:FOLLOWS]->(u)
+    """
+
+    MERGE_USER_FOLLOWS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (a:User {id: n.src})
+        MATCH (b:User {id: n.dst})
+        MERGE (a)-[:FOLLOWS]->(b)
+    """
+
+    MERGE_MEMBERSHIPS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (u:User {id: n.user})
+        MATCH (c:Circle {id: n.circle})
+        MERGE (u)-[:PART_OF]->(c)
+    """
+
+    def run_chunked(self, session, query: LiteralString, rows: list[dict]):
+        self.batcher.run(query, rows, lambda chunk: session.run(query, rows = chunk).consume())
+
+    MERGE_EGOS: LiteralString = """
+        UNWIND $rows as n
+        MERGE (e:Ego {id: n.id})
+    """
+
+    def egoStages(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        feats: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ) -> list[list[tuple[LiteralString, list]]]:
+        """
+        The statements of ingestEgoNetwork with their rows, in stages for the
+        async pipeline. Statements of a stage are independent of each other,
+        every stage MATCHes nodes merged by the stages before it.
+        """
+        if self.load_mode != "merge":
+            raise ValueError("The async pipeline only supports the merge load mode")
+
+        users = sorted(node_features.keys())
+        return [
+            [
+                (self.MERGE_EGOS, [{"id": ego_id}]),
+                (self.MERGE_USERS, [{"id": uid} for uid in users]),
+                (self.MERGE_FEAT_GROUPS, [{"name": name} for name in {g for g, _ in feats}]),
+            ],
+            [
+                (self.MERGE_CIRCLES, [{"id": cid, "ego": ego_id} for cid in circles.keys()]),
+                (self.MERGE_FEAT_NAMES, [{"gn": g, "fn": f} for g, f in feats]),
+            ],
+            [
+                (self.MERGE_USER_FEATS, [{"id": uid, "fn": f} for uid in users for f in node_features[uid]]),
+                (self.MERGE_EGO_FEATS, [{"id": ego_id, "fn": f} for f in ego_features.get(ego_id, [])]),
+                (self.MERGE_EGO_FOLLOWS, [{"src": ego_id, "dst": uid} for uid in users]),
+                (self.MERGE_USER_FOLLOWS, [{"src": a, "dst": b} for a, b in sorted(edges)]),
+                (self.MERGE_MEMBERSHIPS, [{"user": uid, "circle": cid} for cid, members in circles.items() for uid in members]),
+            ],
+        ]
 
-                if rows:
-                    df = pd.DataFrame([r.data() for r in rows])
-                else:
-                    df = pd.DataFrame()
+    MERGE_MANIFEST: LiteralString = """
+        MERGE (m:IngestManifest {ego: $ego})
+        SET m.checksums = $checksums, m.row_counts = $row_counts, m.completed_at = datetime()
+    """
 
-                result_path = f"{RESULT_DIR}/{self.database}_{name}.csv"
-                df.to_csv(result_path, index=False)
+    def finishedEgos(self) -> dict[str, dict[str, str]]:
+        """
+        Source file checksums of every ego in the ingest manifest.
+        """
+        with self.driver.session() as session:
+            return {
+                record["ego"]: json.loads(record["checksums"])
+                for record in session.run("MATCH (m:IngestManifest) RETURN m.ego AS ego, m.checksums AS checksums")
+            }
+
+    def recordEgo(self, ego_id: str, checksums: dict[str, str], row_counts: dict[str, int]):
+        with self.driver.session() as session:
+            session.run(
+                self.MERGE_MANIFEST,
+                ego = ego_id,
+                checksums = json.dumps(checksums),
+                row_counts = json.dumps(row_counts)
+            ).consume()
+
+    def finish_ego(self, ego_id: str):
+        """
+        Neo4j keeps no precomputed aggregates, see PSQLIngestor.finish_ego.
+        """
+
+    DELETE_CIRCLES: LiteralString = """
+        UNWIND $rows as n
+        MATCH (:Ego {id: n.ego})-[:OWNS]->(c:Circle {id: n.id})
+        DETACH DELETE c
+    """
+
+    DELETE_MEMBERSHIPS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (:User {id: n.user})-[r:PART_OF]->(:Circle {id: n.circle})
+        DELETE r
+    """
+
+    DELETE_USER_FEATS: LiteralString = """
+        UNWIND $rows as m
+        MATCH (:User {id: m.id})-[r:HAS_FEAT]->(:FeatName {name: m.fn})
+        DELETE r
+    """
+
+    DELETE_EGO_FEATS: LiteralString = """
+        UNWIND $rows as m
+        MATCH (:Ego {id: m.id})-[r:HAS_FEAT]->(:FeatName {name: m.fn})
+        DELETE r
+    """
+
+    DELETE_EGO_FOLLOWS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (:Ego {id: n.src})-[r:FOLLOWS]->(:User {id: n.dst})
+        DELETE r
+    """
+
+    DELETE_USER_FOLLOWS: LiteralString = """
+        UNWIND $rows as n
+        MATCH (:User {id: n.src})-[r:FOLLOWS]->(:User {id: n.dst})
+        DELETE r
+    """
+
+    def ingestEgoDiff(self, diff: EgoDiff):
+        """
+        Writes only what changed since the ego was last ingested. Follows from
+        the ego, circles and memberships belong to the ego and are removed
+        exactly. User follows and user features are stored once for all egos
+        and kept while another ego still asserts them. Nodes are never removed.
+        """
+        ego_id = diff.ego_id
+        ego_pairs = [(n, f) for n, f in diff.removed_node_features if n == ego_id]
+        user_pairs = [
+            (n, f) for n, f in diff.removed_node_features
+            if n != ego_id and (n, f) not in diff.shared_node_features
+        ]
+
+        with self.driver.session() as session:
+            self.run_chunked(session, self.DELETE_USER_FOLLOWS, [
+                {"src": a, "dst": b} for a, b in diff.removed_edges if (a, b) not in diff.shared_edges
+            ])
+            self.run_chunked(session, self.DELETE_USER_FEATS, [{"id": n, "fn": f} for n, f in user_pairs])
+            self.run_chunked(session, self.DELETE_EGO_FEATS, [{"id": n, "fn": f} for n, f in ego_pairs])
+            self.run_chunked(session, self.DELETE_MEMBERSHIPS, [{"user": u, "circle": c} for c, u in diff.removed_memberships])
+            self.run_chunked(session, self.DELETE_CIRCLES, [{"id": c, "ego": ego_id} for c in diff.removed_circles])
+            self.run_chunked(session, self.DELETE_EGO_FOLLOWS, [{"src": ego_id, "dst": u} for u in diff.removed_users])
+
+            session.run(self.MERGE_EGO, ego = ego_id).consume()
+            self.run_chunked(session, self.MERGE_FEAT_GROUPS, [{"name": name} for name in {g for g, _ in diff.feats}])
+            self.run_chunked(session, self.MERGE_FEAT_NAMES, [{"gn": g, "fn": f} for g, f in diff.feats])
+            self.run_chunked(session, self.MERGE_USERS, [{"id": uid} for uid in diff.added_users])
+            self.run_chunked(session, self.MERGE_EGO_FOLLOWS, [{"src": ego_id, "dst": uid} for uid in diff.added_users])
+            self.run_chunked(session, self.MERGE_CIRCLES, [{"id": c, "ego": ego_id} for c in diff.added_circles])
+            self.run_chunked(session, self.MERGE_MEMBERSHIPS, [{"user": u, "circle": c} for c, u in diff.added_memberships])
+            self.run_chunked(session, self.MERGE_USER_FEATS, [
+                {"id": n, "fn": f} for n, f in diff.added_node_features if n != ego_id
+            ])
+            self.run_chunked(session, self.MERGE_EGO_FEATS, [
+                {"id": n, "fn": f} for n, f in diff.added_node_features if n == ego_id
+            ])
+            self.run_chunked(session, self.MERGE_USER_FOLLOWS, [{"src": a, "dst": b} for a, b in diff.added_edges])
 
-                results.append({
-                    "db": self.database,
-                    "query": name,
-                    "complexity": complexity,
-                    "time_sec": elapsed,
-                    "rows": len(df),
-                    "preview": df.head(10).to_dict(orient="records"),
-                    "result_path": result_path
-                })
-        return results
-        
     def ingestEgoNetwork(
         self,
         ego_id: str,
@@ -67,6 +666,9 @@ class Neo4JIngestor:
         ego_features: dict[str, list[str]], # Usually singular, but added for consistency
         circles: dict[str, list[str]]
     ):
+        if self.load_mode == "create":
+            return self.createEgoNetwork(ego_id, edges, feats, node_features, ego_features, circles)
+
         circs = [
             {
                 "id": cname,
@@ -84,7 +686,8 @@ class Neo4JIngestor:
             for userId in users
         ]
 
-        users = [{"id": uid} for uid in node_features.keys()]
+        # Nodes shared with other egos are written in id order so parallel workers lock them in the same order
+        users = [{"id": uid} for uid in sorted(node_features.keys())]
 
         feat_groups = {name for name, _ in feats}
         feat_groups = [{"name": name} for name in feat_groups]
@@ -93,274 +696,814 @@ class Neo4JIngestor:
 
         ego_follows = [{"src": ego_id, "dst": userId} for userId in node_features.keys()]
 
-        feature_map = [{"id": node_id, "fn": feature_name} for node_id in node_features.keys() for feature_name in node_features[node_id]]
+        feature_map = [{"id": node_id, "fn": feature_name} for node_id in sorted(node_features.keys()) for feature_name in node_features[node_id]]
         ego_feature_map = [{"id": ego_id, "fn": feature_name} for feature_name in ego_features[ego_id]]
 
-        follows = [{"src": a, "dst": b} for a, b in edges]
+        follows = [{"src": a, "dst": b} for a, b in sorted(edges)]
 
         with self.driver.session() as session:
-            # print("Adding constraints")
-            result = session.run(
-                """
-                CREATE CONSTRAINT ego_pk IF NOT EXISTS
-                FOR (e:Ego)
-                REQUIRE (e.id) IS UNIQUE;
-                """
-            )
-                
-            result = session.run(
-                """
-                CREATE CONSTRAINT user_pk IF NOT EXISTS
-                FOR (u:User)
-                REQUIRE (u.id) IS UNIQUE;
-                """
-            )
-            
-            result = session.run(
-                """
-                CREATE CONSTRAINT circle_pk IF NOT EXISTS
-                FOR (c:Circle)
-                REQUIRE (c.id) IS UNIQUE;
-                """
-            )
-
-            result = session.run(
-                """
-                CREATE CONSTRAINT featgroup_pk IF NOT EXISTS
-                FOR (fg:FeatGroup)
-                REQUIRE (fg.name) IS UNIQUE;
-                """
-            )
-
             # print("Adding ego")
-            result = session.run(
-                """
-                MERGE (e:Ego {id: $ego})
-                """, ego = ego_id,
-            )
+            session.run(self.MERGE_EGO, ego = ego_id)
 
             # print("Adding users")
-            for user_chunk in split_to_chunks(users):
-                result = session.run(
-                    """
-                    UNWIND $users as n
-                    MERGE (u:User {id: n.id})
-                    """, users = user_chunk
-                )
-
+            self.run_chunked(session, self.MERGE_USERS, users)
             users.clear()
 
             # print("Adding circles")
-
-            for circle_chunk in split_to_chunks(circs):
-                result = session.run(
-                    """
-                    UNWIND $circles as n
-                    MERGE (c:Circle {id: n.id})
-                    WITH n,c
-                    MATCH (e:Ego {id: n.ego})
-                    MERGE (e)-[:OWNS]->(c)
-                    """, circles = circle_chunk
-                )
-
+            self.run_chunked(session, self.MERGE_CIRCLES, circs)
             circs.clear()
 
             # print("Adding feature groups")
-            for featgroup_chunk in split_to_chunks(feat_groups):
-                result = session.run(
-                    """
-                    UNWIND $fg_names as f
-                    MERGE (fg:FeatGroup {name: f.name})
-                    """, fg_names = featgroup_chunk
-                )
-
+            self.run_chunked(session, self.MERGE_FEAT_GROUPS, feat_groups)
             feat_groups.clear()
 
-            for feat_group_map_chunk in split_to_chunks(feat_group_map):
-                result = session.run(
-                    """
-                    UNWIND $feats as f
-                    MERGE (fn:FeatName {name: f.fn})
-                    WITH f, fn
-                    MATCH (fg:FeatGroup {name: f.gn})
-                    MERGE (fg)-[:OWNS_FEAT]->(fn)
-                    """, feats = feat_group_map_chunk
-                )
-
+            self.run_chunked(session, self.MERGE_FEAT_NAMES, feat_group_map)
             feat_group_map.clear()
 
-            for feature_map_chunk in split_to_chunks(feature_map):
-                result = session.run(
-                    """
-                    UNWIND $map as m
-                    MATCH (u:User {id: m.id})
-                    MATCH (fn:FeatName {name: m.fn})
-                    MERGE (u)-[:HAS_FEAT]->(fn)
-                    """, map = feature_map_chunk
-                )
-
+            self.run_chunked(session, self.MERGE_USER_FEATS, feature_map)
             feature_map.clear()
 
-            result = session.run(
-                """
-                UNWIND $map as m
-                MATCH (e:Ego {id: m.id})
-                MATCH (fn:FeatName {name: m.fn})
-                MERGE (e)-[:HAS_FEAT]->(fn)
-                """, map = ego_feature_map
-            )
-
+            self.run_chunked(session, self.MERGE_EGO_FEATS, ego_feature_map)
             ego_feature_map.clear()
 
             # print("Connecting nodes")
+            self.run_chunked(session, self.MERGE_EGO_FOLLOWS, ego_follows)
+            ego_follows.clear()
 
-            for edges_chunk in split_to_chunks(ego_follows):
-                result = session.run(
-                    """
-                    UNWIND $edges as n
-                    MATCH (e:Ego {id: n.src})
-                    MATCH (u:User {id: n.dst})
-                    MERGE (e)-[:FOLLOWS]->(u)
-                    """, edges = edges_chunk
-                )
+            self.run_chunked(session, self.MERGE_USER_FOLLOWS, follows)
+            follows.clear()
 
-            ego_follows.clear()
+            self.run_chunked(session, self.MERGE_MEMBERSHIPS, memberships)
+            memberships.clear()
 
-            for edges_chunk in split_to_chunks(follows):
-                result = session.run(
-                    """
-                    UNWIND $edges as n
-                    MATCH (a:User {id: n.src})
-                    MATCH (b:User {id: n.dst})
-                    MERGE (a)-[:FOLLOWS]->(b)
-                    """, edges = edges_chunk
-                )
+    CREATE_NODES: dict[str, LiteralString] = {
+        "Ego": "UNWIND $rows AS n CREATE (:Ego {id: n})",
+        "User": "UNWIND $rows AS n CREATE (:User {id: n})",
+        "Circle": "UNWIND $rows AS n CREATE (:Circle {id: n})",
+        "FeatGroup": "UNWIND $rows AS n CREATE (:FeatGroup {name: n})",
+        "FeatName": "UNWIND $rows AS n CREATE (:FeatName {name: n})",
+    }
+
+    CREATE_RELATIONSHIPS: dict[str, LiteralString] = {
+        "OWNS": """
+            UNWIND $rows AS r
+            MATCH (a:Ego {id: r[0]})
+            MATCH (b:Circle {id: r[1]})
+            CREATE (a)-[:OWNS]->(b)
+        """,
+        "OWNS_FEAT": """
+            UNWIND $rows AS r
+            MATCH (a:FeatGroup {name: r[0]})
+            MATCH (b:FeatName {name: r[1]})
+            CREATE (a)-[:OWNS_FEAT]->(b)
+        """,
+        "EGO_HAS_FEAT": """
+            UNWIND $rows AS r
+            MATCH (a:Ego {id: r[0]})
+            MATCH (b:FeatName {name: r[1]})
+            CREATE (a)-[:HAS_FEAT]->(b)
+        """,
+        "EGO_FOLLOWS": """
+            UNWIND $rows AS r
+            MATCH (a:Ego {id: r[0]})
+            MATCH (b:User {id: r[1]})
+            CREATE (a)-[:FOLLOWS]->(b)
+        """,
+        "USER_HAS_FEAT": """
+            UNWIND $rows AS r
+            MATCH (a:User {id: r[0]})
+            MATCH (b:FeatName {name: r[1]})
+            CREATE (a)-[:HAS_FEAT]->(b)
+        """,
+        "USER_FOLLOWS": """
+            UNWIND $rows AS r
+            MATCH (a:User {id: r[0]})
+            MATCH (b:User {id: r[1]})
+            CREATE (a)-[:FOLLOWS]->(b)
+        """,
+        # Follows between users created by earlier egos may already exist
+        "USER_FOLLOWS_KNOWN": """
+            UNWIND $rows AS r
+            MATCH (a:User {id: r[0]})
+            MATCH (b:User {id: r[1]})
+            MERGE (a)-[:FOLLOWS]->(b)
+        """,
+        "PART_OF": """
+            UNWIND $rows AS r
+            MATCH (a:User {id: r[0]})
+            MATCH (b:Circle {id: r[1]})
+            CREATE (a)-[:PART_OF]->(b)
+        """,
+    }
+
+    @staticmethod
+    def write_rows(tx, query: LiteralString, rows: list):
+        tx.run(query, rows = rows).consume()
+
+    def write_batch(self, query: LiteralString, rows: list, kind: str | None = None):
+        """
+        Rows of a batch are recorded as created under kind once the
+        transaction that wrote them committed, so a retried ego writes
+        exactly what is still missing.
+        """
+        def write(chunk: list):
+            session.execute_write(self.write_rows, query, chunk)
+            if kind is not None:
+                self.created[kind].update(chunk)
 
-            follows.clear()
+        with self.driver.session() as session:
+            self.batcher.run(query, rows, write)
 
-            for member_chunk in split_to_chunks(memberships):
-                result = session.run(
-                    """
-                    UNWIND $membership as n
-                    MATCH (u:User {id: n.user})
-                    MATCH (c:Circle {id: n.circle})
-                    MERGE (u)-[:PART_OF]->(c)
-                    """, membership = member_chunk
-                )
+    def write_partitioned(
+        self,
+        pool: ThreadPoolExecutor,
+        query: LiteralString,
+        pairs: list[tuple[str, str]],
+        same_space: bool,
+        kind: str | None = None
+    ):
+        """
+        Writes relationship pairs round by round, the batches of a round
+        concurrently, each on its own session in managed transactions.
+        """
+        for batches in partition_rounds(pairs, 2 * self.writers, same_space):
+            for future in [pool.submit(self.write_batch, query, batch, kind) for batch in batches]:
+                future.result()
+
+    def new_items(self, kind: str, items) -> list:
+        """
+        Distinct items of the given node label or relationship kind that
+        were not created yet. They are only recorded as created by
+        write_batch.
+        """
+        created = self.created[kind]
+        return [item for item in dict.fromkeys(items) if item not in created]
+
+    def createEgoNetwork(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        feats: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ):
+        """
+        Fresh-load path for an empty database (see begin_load). Nodes and
+        relationships are deduplicated on the client against everything
+        created so far and written with CREATE instead of MERGE.
+        Relationships whose endpoints were never created are dropped, like the
+        MATCH of the merge path. Relationships are written by concurrent
+        sessions, partitioned by node id so that no two sessions writing at
+        the same time lock the same node. Egos are loaded one at a time, so
+        each ego sees every node created by the previous ones.
+        Follows are not tracked across egos: those touching a user new to
+        this ego are created, the others merged.
+        """
+        if not self.fresh:
+            raise ValueError("The create load mode needs begin_load on an empty database")
+
+        intern = sys.intern
+
+        with self.create_lock, ThreadPoolExecutor(self.writers) as pool:
+            users = self.created["User"]
+            circle_ids = self.created["Circle"]
+            names = self.created["FeatName"]
+
+            nodes = {
+                "Ego": self.new_items("Ego", [ego_id]),
+                "User": self.new_items("User", (intern(uid) for uid in node_features.keys())),
+                "Circle": self.new_items("Circle", circles.keys()),
+                "FeatGroup": self.new_items("FeatGroup", {group for group, _ in feats}),
+                "FeatName": self.new_items("FeatName", {name for _, name in feats}),
+            }
 
-            memberships.clear()
+            # New nodes lock nothing that already exists, write them concurrently
+            for future in [
+                pool.submit(self.write_batch, self.CREATE_NODES[label], batch, label)
+                for label, rows in nodes.items()
+                for batch in split_to_chunks(rows, max(len(rows) // self.writers, 1))
+            ]:
+                future.result()
+            new_users = set(nodes["User"])
+
+            # Relationships from the ego all lock the ego node, a single writer is enough
+            for kind, pairs in [
+                ("OWNS", ((ego_id, cid) for cid in circles.keys())),
+                ("EGO_FOLLOWS", ((ego_id, uid) for uid in node_features.keys() if uid in users)),
+                ("EGO_HAS_FEAT", ((ego, name) for ego, fs in ego_features.items() for name in fs if name in names)),
+            ]:
+                self.write_batch(self.CREATE_RELATIONSHIPS[kind], self.new_items(kind, pairs), kind)
+
+            self.write_partitioned(pool, self.CREATE_RELATIONSHIPS["OWNS_FEAT"], self.new_items(
+                "OWNS_FEAT", feats
+            ), same_space = False, kind = "OWNS_FEAT")
+
+            self.write_partitioned(pool, self.CREATE_RELATIONSHIPS["USER_HAS_FEAT"], self.new_items(
+                "USER_HAS_FEAT", ((uid, name) for uid, fs in node_features.items() for name in fs if name in names)
+            ), same_space = False, kind = "USER_HAS_FEAT")
+
+            follows = dict.fromkeys((intern(a), intern(b)) for a, b in edges if a in users and b in users)
+            for kind, pairs in [
+                ("USER_FOLLOWS", [pair for pair in follows if pair[0] in new_users or pair[1] in new_users]),
+                ("USER_FOLLOWS_KNOWN", [pair for pair in follows if pair[0] not in new_users and pair[1] not in new_users]),
+            ]:
+                self.write_partitioned(pool, self.CREATE_RELATIONSHIPS[kind], pairs, same_space = True)
+
+            self.write_partitioned(pool, self.CREATE_RELATIONSHIPS["PART_OF"], self.new_items(
+                "PART_OF", ((uid, cid) for cid, members in circles.items() if cid in circle_ids for uid in members if uid in users)
+            ), same_space = False, kind = "PART_OF")
+
+    def ingestEgoStream(self, ego_id: str, stream: EgoStream):
+        """
+        Same graph as ingestEgoNetwork, but the ego's files are read and
+        written one batch at a time, so memory is bounded by the batch size.
+        Users are written before circles and edges, which MATCH on them.
+        """
+        feats = stream.features()
+
+        with self.driver.session() as session:
+            session.run(self.MERGE_EGO, ego = ego_id)
+
+            self.run_chunked(session, self.MERGE_FEAT_GROUPS, [{"name": name} for name in {g for g, _ in feats}])
+            self.run_chunked(session, self.MERGE_FEAT_NAMES, [{"gn": g, "fn": f} for g, f in feats])
+
+            for batch in stream.node_features():
+                self.run_chunked(session, self.MERGE_USERS, [{"id": uid} for uid in sorted(batch.keys())])
+                self.run_chunked(session, self.MERGE_USER_FEATS, [
+                    {"id": node_id, "fn": name} for node_id in sorted(batch.keys()) for name in batch[node_id]
+                ])
+                self.run_chunked(session, self.MERGE_EGO_FOLLOWS, [{"src": ego_id, "dst": uid} for uid in batch.keys()])
+
+            self.run_chunked(session, self.MERGE_EGO_FEATS, [
+                {"id": ego, "fn": name} for ego, names in stream.ego_features().items() for name in names
+            ])
+
+            for batch in stream.circles():
+                self.run_chunked(session, self.MERGE_CIRCLES, [{"id": cid, "ego": ego_id} for cid in batch.keys()])
+                self.run_chunked(session, self.MERGE_MEMBERSHIPS, [
+                    {"user": uid, "circle": cid} for cid, users in batch.items() for uid in users
+                ])
+
+            for batch in stream.edges():
+                self.run_chunked(session, self.MERGE_USER_FOLLOWS, [{"src": a, "dst": b} for a, b in sorted(batch)])
+
+
+class FeatureIndex:
+    """
+    In-process cache of feature ids, loaded once from feature_group and
+    feature_name and extended as new features are inserted. Node features
+    only carry the feature name, so names are resolved to the first
+    feature_id registered under that name.
+    The index is shared by parallel workers, so registration is serialized.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.groups: dict[str, int] = {}
+        self.by_key: dict[tuple[str, str], int] = {}
+        self.by_name: dict[str, int] = {}
+
+    def clear(self):
+        self.loaded = False
+        self.groups.clear()
+        self.by_key.clear()
+        self.by_name.clear()
+
+    def add_group(self, group_id: int, group_name: str):
+        self.groups.setdefault(group_name, group_id)
+
+    def add_feature(self, feature_id: int, group_name: str, name: str):
+        self.by_key.setdefault((group_name, name), feature_id)
+        self.by_name.setdefault(name, feature_id)
+
+    def load(self, cur):
+        self.clear()
+
+        for group_id, group_name in cur.execute(
+            "select group_id, group_name from feature_group order by group_id"
+        ):
+            self.add_group(group_id, group_name)
+
+        for feature_id, group_name, name in cur.execute(
+            """
+            select fn.feature_id, fg.group_name, fn.name
+            from feature_name fn
+            join feature_group fg on fg.group_id = fn.group_id
+            order by fn.feature_id
+            """
+        ):
+            self.add_feature(feature_id, group_name, name)
+
+        self.loaded = True
+
+    def register(self, cur, features: list[tuple[str, str]]):
+        """
+        Inserts the (group, name) pairs that are not indexed yet,
+        records the ids the database assigned to them and commits.
+        """
+        with self.lock:
+            self._register(cur, features)
+            cur.connection.commit()
+
+    def _register(self, cur, features: list[tuple[str, str]]):
+        if not self.loaded:
+            self.load(cur)
+
+        new_groups = list({group for group, _ in features if group not in self.groups})
+        if new_groups:
+            for group_id, group_name in cur.execute(
+                """
+                insert into feature_group(group_name)
+                select unnest(%s::text[])
+                returning group_id, group_name
+                """, (new_groups,)
+            ).fetchall():
+                self.add_group(group_id, group_name)
+
+        new_features = list({(group, name) for group, name in features if (group, name) not in self.by_key})
+        if not new_features:
+            return
+
+        group_ids = [self.groups[group] for group, _ in new_features]
+        names = [name for _, name in new_features]
+
+        # Rows inserted by another connection since load() conflict and are fetched instead
+        inserted = cur.execute(
+            """
+            insert into feature_name(group_id, name)
+            select * from unnest(%s::int[], %s::text[])
+            on conflict do nothing
+            returning feature_id, group_id, name
+            """, (group_ids, names)
+        ).fetchall()
+
+        existing = cur.execute(
+            """
+            select fn.feature_id, fn.group_id, fn.name
+            from feature_name fn
+            join unnest(%s::int[], %s::text[]) as f(group_id, name)
+              on fn.group_id = f.group_id and fn.name = f.name
+            """, (group_ids, names)
+        ).fetchall() if len(inserted) < len(new_features) else []
+
+        group_names = {group_id: group_name for group_name, group_id in self.groups.items()}
+        for feature_id, group_id, name in sorted(inserted + existing):
+            self.add_feature(feature_id, group_names[group_id], name)
 
 
 class PSQLIngestor:
-    def __init__(self, username: str, password: str, host: str, port: int, dbname: str) -> None:
+    LOAD_MODES = ("insert", "copy", "fast")
+    SCHEMA = "public"
+    KEY_TYPE = "text"
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        host: str,
+        port: int,
+        dbname: str,
+        load_mode: str = "insert",
+        aggregates: bool = False,
+        indexes: str = "none"
+    ) -> None:
         import psycopg
+        if load_mode not in self.LOAD_MODES:
+            raise ValueError(f"Unknown load mode: {load_mode}")
+        if indexes not in self.INDEX_PROFILES:
+            raise ValueError(f"Unknown index profile: {indexes}")
         self.database = dbname
-        self.conn= psycopg.connect(dbname = dbname, user = username, password = password, host = host, port = port)
+        self.label = dbname if self.KEY_TYPE == "text" else f"{dbname}_{self.KEY_TYPE}"
+        self.load_mode = load_mode
+        self.aggregates = aggregates
+        self.indexes = indexes
+        self.features = FeatureIndex()
+        self.batcher = AdaptiveBatcher(self.shrinkable)
+        self.connect_args = dict(dbname = dbname, user = username, password = password, host = host, port = port)
+        if self.SCHEMA != "public":
+            self.connect_args["options"] = f"-c search_path={self.SCHEMA},public"
+        self.conn= psycopg.connect(**self.connect_args)
         self.setup_tables()
+        if aggregates:
+            self.setup_aggregates()
+        self.build_indexes()
 
     def close(self):
         self.conn.close()
 
-    def metrics(self, queries: dict[str, LiteralString], complexity: str):
-        results = []
-        makedirs(RESULT_DIR, exist_ok=True)
+    def worker(self) -> "PSQLIngestor":
+        """
+        Returns an ingestor with its own connection for a parallel import worker.
+        The feature index is shared with this ingestor.
+        """
+        import psycopg
+        worker = copy(self)
+        worker.conn = psycopg.connect(**self.connect_args)
+        return worker
+
+    def retryable(self, exc: Exception) -> bool:
+        """
+        Rolls back the failed transaction and tells whether the ego can be
+        re-ingested. Every statement is idempotent, so a retry is always safe.
+        """
+        from psycopg import errors
+        if not isinstance(exc, (errors.DeadlockDetected, errors.SerializationFailure)):
+            return False
+        self.conn.rollback()
+        return True
+
+    def shrinkable(self, exc: Exception) -> bool:
+        """
+        Batches cancelled by statement_timeout or failing for lack of memory
+        can succeed when retried smaller.
+        """
+        from psycopg import errors
+        return isinstance(exc, (errors.QueryCanceled, errors.OutOfMemory))
+
+    def batch_sizes(self) -> pd.DataFrame:
+        return self.batcher.settled(stage_names(type(self)))
+
+    def reconnect(self, timeout_sec: float = 120):
+        """
+        Replaces the connection, waiting for the server to accept
+        connections again, e.g. after a restart.
+        """
+        import psycopg
+        self.conn.close()
+        deadline = time.monotonic() + timeout_sec
+        while True:
+            try:
+                self.conn = psycopg.connect(**self.connect_args)
+                return
+            except psycopg.OperationalError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1)
+
+    def server_version(self) -> str:
+        with self.conn.cursor() as cur:
+            version = cur.execute("show server_version").fetchone()[0]
+        self.conn.commit()
+        return version
+
+    EXPLAIN_TIMING: LiteralString = "explain (analyze, timing off, summary, format json) "
 
+    def server_time(self, query: LiteralString) -> float:
+        """
+        Planning plus execution time of a query on the server, from a
+        separate EXPLAIN ANALYZE run. Per-node timing is off to keep the
+        instrumentation overhead low, and no rows are sent to the client.
+        """
         with self.conn.cursor() as cur:
-            for name, query in queries.items():
-                start = time.perf_counter()
-                cur.execute(query)
-                rows = cur.fetchall() if cur.description else []
-                elapsed = time.perf_counter() - start
+            plan = cur.execute(self.EXPLAIN_TIMING + query).fetchone()[0][0]
+        self.conn.commit()
+        return (plan["Planning Time"] + plan["Execution Time"]) / 1000
+
+    def run_query(self, query: LiteralString) -> tuple[pd.DataFrame, dict[str, float]]:
+        """
+        Runs a query and returns its rows with the time spent until they are
+        all on the client (time_sec), of which fetch_sec went to turning
+        them into Python rows, and the DataFrame build (frame_sec).
+        server_sec is filled in by metrics, see server_time.
+        """
+        with self.conn.cursor() as cur:
+            start = time.perf_counter()
+            cur.execute(query)
+            executed = time.perf_counter()
+            rows = cur.fetchall() if cur.description else []
+            elapsed = time.perf_counter() - start
+            fetch = elapsed - (executed - start)
+
+            start = time.perf_counter()
+            if cur.description:
+                columns = [desc[0] for desc in cur.description]
+                df = pd.DataFrame(rows, columns = columns)
+            else:
+                df = pd.DataFrame()
+            frame = time.perf_counter() - start
+        self.conn.commit()
+        return df, {"time_sec": elapsed, "fetch_sec": fetch, "frame_sec": frame}
+
+    def stream_query(self, query: LiteralString, batch_rows: int = RESULT_BATCH_ROWS) -> Iterator[tuple[list[str], list[tuple]]]:
+        """
+        Runs a query on a named (server-side) cursor and yields its column
+        names and rows batch_rows at a time, so only one batch is ever on
+        the client. numeric is loaded as float, Arrow has no unbounded
+        decimal type.
+        """
+        from psycopg.types.numeric import FloatLoader
+        with self.conn.cursor(name="result_stream") as cur:
+            cur.adapters.register_loader("numeric", FloatLoader)
+            cur.execute(query)
+            columns = [desc[0] for desc in cur.description]
+            # The first batch is yielded even when empty, it names the columns
+            rows = cur.fetchmany(batch_rows)
+            yield columns, rows
+            while rows := cur.fetchmany(batch_rows):
+                yield columns, rows
+        self.conn.commit()
+
+    def stream_to(self, query: LiteralString, path: str, fmt: str) -> tuple[dict, dict[str, float]]:
+        """
+        Runs a query streaming its rows into path (see stream_query), with
+        the time until the file is written (time_sec), of which write_sec
+        went to converting and writing the batches.
+        """
+        start = time.perf_counter()
+        exported = stream_result(self.stream_query(query), path, fmt)
+        elapsed = time.perf_counter() - start
+        return exported, {"time_sec": elapsed, "write_sec": exported["write_sec"]}
+
+    EXPLAIN_PLAN: LiteralString = "explain (format json, analyze, buffers) "
+
+    def query_plan(self, query: LiteralString) -> dict:
+        """
+        Executed plan of a query, with the actual rows and buffer usage of every node.
+        """
+        with self.conn.cursor() as cur:
+            plan = cur.execute(self.EXPLAIN_PLAN + query).fetchone()[0][0]
+        self.conn.commit()
+        return plan
+
+    # Plan node keys that describe what a node does, rather than how it performed
+    PLAN_SHAPE_KEYS = ("Join Type", "Strategy", "Relation Name", "Index Name", "Subplan Name")
+
+    @staticmethod
+    def plan_outline(plan: dict, depth: int = 0) -> list[str]:
+        """
+        The shape of a plan, one node per line: what it does and on what,
+        without any costs, row counts or timings.
+        """
+        node = plan.get("Plan", plan)
+        details = " ".join(str(node[key]) for key in PSQLIngestor.PLAN_SHAPE_KEYS if key in node)
+        lines = ["  " * depth + (f"{node['Node Type']} {details}" if details else node["Node Type"])]
+        for child in node.get("Plans", []):
+            lines += PSQLIngestor.plan_outline(child, depth + 1)
+        return lines
+
+    @staticmethod
+    def plan_counters(plan: dict) -> dict[str, int]:
+        """
+        Buffer usage of the whole query, which the root node includes.
+        """
+        return {
+            "shared_hit_blocks": plan["Plan"].get("Shared Hit Blocks", 0),
+            "shared_read_blocks": plan["Plan"].get("Shared Read Blocks", 0),
+        }
+
+    def metrics(
+        self,
+        queries: dict[str, LiteralString],
+        complexity: str,
+        warmup: int = 0,
+        iterations: int = 1,
+        before_run: Callable[[], None] | None = None,
+        label: str | None = None,
+        result_format: str = "csv"
+    ):
+        """
+        Runs every query warmup times untimed, then iterations timed times,
+        calling before_run (e.g. a cache eviction) ahead of each timed run.
+        Every phase (see run_query) is reported as its median, write_sec is
+        the time to write the result file and samples holds every timed run.
+        Results are reported under label, the ingestor's label by default.
+
+        With a streamed result_format (see results.py) every timed run
+        streams the rows into the result file instead of fetching them
+        whole. Either way the export's throughput is reported, and its peak
+        memory is that of the last timed run, which writes the result file
+        (see PeakMemory).
+        """
+        results = []
+        label = label or self.label
+        makedirs(RESULT_DIR, exist_ok=True)
 
-                if cur.description:
-                    columns = [desc[0] for desc in cur.description]
-                    df = pd.DataFrame(rows, columns = columns)
+        for name, query in queries.items():
+            path = result_path(RESULT_DIR, label, name, result_format)
+            for _ in range(warmup):
+                self.run_query(query)
+
+            timings = []
+            peak_memory = PeakMemory()
+            for i in range(iterations):
+                last = i == iterations - 1
+                if before_run is not None:
+                    before_run()
+                if last:
+                    peak_memory.start()
+                if result_format == "csv":
+                    df, timing = self.run_query(query)
+                    if last:
+                        start = time.perf_counter()
+                        df.to_csv(path, index=False)
+                        write_sec = time.perf_counter() - start
                 else:
-                    df = pd.DataFrame()
+                    exported, timing = self.stream_to(query, path, result_format)
+                if last:
+                    peak = peak_memory.stop()
+
+                # EXPLAIN ANALYZE runs the query again, from cold caches too if they are evicted
+                if before_run is not None:
+                    before_run()
+                timing["server_sec"] = self.server_time(query)
+                timings.append(timing)
+
+            medians = phase_medians(timings)
+            if result_format == "csv":
+                medians["write_sec"] = write_sec
+                exported = {"rows": len(df), "preview": df.head(10).to_dict(orient="records")}
+                export_sec = medians["time_sec"] + medians["frame_sec"] + medians["write_sec"]
+            else:
+                export_sec = medians["time_sec"]
+
+            results.append({
+                "db": label,
+                "query": name,
+                "complexity": complexity,
+                **medians,
+                "samples": timings,
+                "rows": exported["rows"],
+                "preview": exported["preview"],
+                "result_path": path,
+                **export_stats(exported["rows"], path, export_sec, peak)
+            })
+        return results
 
-                result_path = f"{RESULT_DIR}/{self.database}_{name}.csv"
-                df.to_csv(result_path, index=False)
+    def table_sizes(self) -> list[dict]:
+        """
+        On-disk size of every table in this ingestor's schema, in bytes.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                select c.relname, pg_relation_size(c.oid), pg_indexes_size(c.oid), pg_total_relation_size(c.oid)
+                from pg_class c
+                join pg_namespace n on n.oid = c.relnamespace
+                where n.nspname = %s and c.relkind in ('r', 'p')
+                order by c.relname
+                """, (self.SCHEMA,)
+            )
+            rows = cur.fetchall()
+        self.conn.commit()
 
-                results.append({
-                    "db": self.database,
-                    "query": name,
-                    "complexity": complexity,
-                    "time_sec": elapsed,
-                    "rows": len(df),
-                    "preview": df.head(10).to_dict(orient="records"),
-                    "result_path": result_path
-                })
-        return results
+        return [
+            {
+                "db": self.label,
+                "table": table,
+                "heap_bytes": heap,
+                "index_bytes": index,
+                "total_bytes": total
+            }
+            for table, heap, index, total in rows
+        ]
 
     def wipe(self):
         with self.conn.cursor() as cur:
             result = cur.execute(
                 """
                 truncate table
-                node, ego, user_node, feature, node_features, circle, circle_member
-                cascade;
+                node, ego, user_node, feature_group, feature_name, node_feature, circle, circle_member, edge, ingest_manifest
+                restart identity cascade;
                 """
             )
+            if self.aggregates:
+                cur.execute("truncate table ego_stats, node_degree")
             self.conn.commit()
+            self.features.clear()
+
+    # Tables of the text schema; edge is kept apart so that subclasses can
+    # partition it (see PartitionedPSQLIngestor)
+    TABLES: LiteralString = """
+        create table if not exists node (
+            node_id text primary key,
+            node_type text not null,
+            constraint node_type_check check (node_type in ('ego', 'user'))
+        );
+
+        create table if not exists ego (
+            node_id text primary key references node(node_id) on delete cascade
+        );
+        
+        create table if not exists user_node (
+            node_id text primary key references node(node_id) on delete cascade,
+            ego_id text not null references ego(node_id) on delete cascade
+        );
+
+        create table if not exists circle (
+            circle_id text primary key,
+            ego_id text not null references ego(node_id) on delete cascade,
+            unique (ego_id, circle_id)
+        );
+
+        create table if not exists circle_member (
+            circle_id text references circle(circle_id) on delete cascade,
+            node_id text references node(node_id) on delete cascade,
+            primary key (circle_id, node_id)
+        );
+
+        create table if not exists feature_group (
+            group_id serial primary key,
+            group_name text not null
+        );
+
+        create table if not exists feature_name (
+            feature_id serial primary key,
+            name text not null,
+            group_id int not null references feature_group(group_id) on delete cascade,
+            constraint feature_name_unique unique(group_id, name)
+        );
+
+        create table if not exists node_feature (
+            node_id text not null references node(node_id) on delete cascade,
+            feature_id int not null references feature_name(feature_id) on delete cascade,
+            primary key (node_id, feature_id)
+        );
+
+        create table if not exists ingest_manifest (
+            ego_id text primary key,
+            checksums jsonb not null,
+            row_counts jsonb not null,
+            completed_at timestamptz not null default now()
+        );
+    """
+
+    EDGE_TABLE: LiteralString = """
+        create table if not exists edge (
+            src_id text not null references node(node_id) on delete cascade,
+            dst_id text not null references node(node_id) on delete cascade,
+            ego_id text not null references ego(node_id) on delete cascade,
+            primary key (src_id, dst_id, ego_id)
+        )
+    """
 
     def setup_tables(self):
-        result = self.conn.execute(
-            """
-            create table if not exists node (
-                node_id text primary key,
-                node_type text not null,
-                constraint node_type_check check (node_type in ('ego', 'user'))
-            );
-
-            create table if not exists ego (
-                node_id text primary key references node(node_id) on delete cascade
-            );
-            
-            create table if not exists user_node (
-                node_id text primary key references node(node_id) on delete cascade,
-                ego_id text not null references ego(node_id) on delete cascade
-            );
+        self.conn.execute(self.TABLES + self.EDGE_TABLE + ";")
+        self.conn.commit()
 
-            create table if not exists circle (
-                circle_id text primary key,
-                ego_id text not null references ego(node_id) on delete cascade,
-                unique (ego_id, circle_id)
-            );
+    INSERT_EGO_NODE: LiteralString = """
+        insert into node(node_id, node_type) values (%s, 'ego')
+        on conflict do nothing
+    """
+
+    INSERT_EGO: LiteralString = """
+        insert into ego(node_id) values (%s)
+        on conflict do nothing
+    """
+
+    INSERT_NODES: LiteralString = """
+        insert into node(node_id, node_type) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_USER_NODES: LiteralString = """
+        insert into user_node(node_id, ego_id) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_CIRCLES: LiteralString = """
+        insert into circle(circle_id, ego_id) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_MEMBERSHIPS: LiteralString = """
+        insert into circle_member(circle_id, node_id) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_NODE_FEATURES: LiteralString = """
+        insert into node_feature(node_id, feature_id) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_EDGES: LiteralString = """
+        insert into edge(src_id, dst_id, ego_id) values (%s, %s, %s)
+        on conflict do nothing
+    """
+
+    def insert_chunked(self, cur, query: LiteralString, rows: list[tuple]):
+        def write(chunk: list[tuple]):
+            # A failed batch only rolls back to the savepoint
+            with self.conn.transaction():
+                cur.executemany(query, chunk)
+            self.conn.commit()
 
-            create table if not exists circle_member (
-                circle_id text references circle(circle_id) on delete cascade,
-                node_id text references node(node_id) on delete cascade,
-                primary key (circle_id, node_id)
-            );
+        self.batcher.run(query, rows, write)
 
-            create table if not exists feature_group (
-                group_id serial primary key,
-                group_name text not null
-            );
+    def key(self, node_id: str) -> str | int:
+        """
+        Value the other tables reference a node by.
+        """
+        return node_id
 
-            create table if not exists feature_name (
-                feature_id serial primary key,
-                name text not null,
-                group_id int not null references feature_group(group_id) on delete cascade,
-                constraint feature_name_unique unique(group_id, name)
-            );
-
-            create table if not exists node_feature (
-                node_id text not null references node(node_id) on delete cascade,
-                feature_id int not null references feature_name(feature_id) on delete cascade,
-                primary key (node_id, feature_id)
-            );
-
-            create table if not exists edge (
-                src_id text not null references node(node_id) on delete cascade,
-                dst_id text not null references node(node_id) on delete cascade,
-                ego_id text not null references ego(node_id) on delete cascade,
-                primary key (src_id, dst_id, ego_id)
-            );
-            """
-        )
+    def insert_ego(self, cur, ego_id: str):
+        cur.execute(self.INSERT_EGO_NODE, (ego_id,))
+        cur.execute(self.INSERT_EGO, (ego_id,))
         self.conn.commit()
 
+    def insert_nodes(self, cur, node_ids: list[str], node_type: str):
+        self.insert_chunked(cur, self.INSERT_NODES, [(uid, node_type) for uid in node_ids])
+
     def ingestEgoNetwork(
         self,
         ego_id: str,
@@ -370,125 +1513,1172 @@ class PSQLIngestor:
         ego_features: dict[str, list[str]],
         circles: dict[str, list[str]]
     ):
+        if self.load_mode == "copy":
+            return self.bulkIngestEgoNetwork(ego_id, edges, features, node_features, ego_features, circles)
+        if self.load_mode == "fast":
+            return self.fastIngestEgoNetwork(ego_id, edges, features, node_features, ego_features, circles)
+
         cur = self.conn.cursor()
 
-        cur.execute(
-            """
-            insert into node(node_id, node_type) values (%s, 'ego')
-            on conflict do nothing
-            """,
-            (ego_id,)
+        self.insert_ego(cur, ego_id)
+
+        key = self.key
+        ego_key = key(ego_id)
+
+        # Rows shared with other egos are sorted so parallel workers lock them in the same order
+        users = sorted(node_features.keys())
+
+        circs = [(cid, ego_key) for cid in circles.keys()]
+
+        self.insert_nodes(cur, users, 'user')
+        self.insert_chunked(cur, self.INSERT_USER_NODES, [(key(user), ego_key) for user in users])
+
+        memberships = [(cid, key(uid)) for cid, users in circles.items() for uid in users]
+
+        self.insert_chunked(cur, self.INSERT_CIRCLES, circs)
+        circs.clear()
+
+        self.insert_chunked(cur, self.INSERT_MEMBERSHIPS, memberships)
+        memberships.clear()
+
+        self.features.register(cur, features)
+
+        by_name = self.features.by_name
+        node_feature_rows = [
+            (node_id, by_name[name])
+            for node_id, feats in node_features.items()
+            for name in feats
+        ]
+        node_feature_rows += [
+            (ego, by_name[name])
+            for ego, feats in ego_features.items()
+            for name in feats
+        ]
+        node_feature_rows.sort()
+
+        self.insert_chunked(cur, self.INSERT_NODE_FEATURES, [(key(node_id), fid) for node_id, fid in node_feature_rows])
+        node_feature_rows.clear()
+
+        self.insert_chunked(cur, self.INSERT_EDGES, [(key(src), key(dst), ego_key) for src, dst in edges])
+
+    def egoStages(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        features: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ) -> list[list[tuple[LiteralString, list[tuple]]]]:
+        """
+        The statements of ingestEgoNetwork with their rows, in stages for the
+        async pipeline. Statements of a stage are independent of each other,
+        every stage references rows written by the stages before it.
+        Registers the ego's features, the only write done here.
+        """
+        if self.load_mode != "insert":
+            raise ValueError("The async pipeline only supports the insert load mode")
+
+        self.features.register(self.conn.cursor(), features)
+        by_name = self.features.by_name
+
+        users = sorted(node_features.keys())
+        node_feature_rows = sorted(
+            (node_id, by_name[name])
+            for feats in (node_features, ego_features)
+            for node_id, names in feats.items()
+            for name in names
         )
 
-        cur.execute(
+        return [
+            [
+                (self.INSERT_EGO_NODE, [(ego_id,)]),
+                (self.INSERT_NODES, [(uid, 'user') for uid in users]),
+            ],
+            [
+                (self.INSERT_EGO, [(ego_id,)]),
+            ],
+            [
+                (self.INSERT_USER_NODES, [(uid, ego_id) for uid in users]),
+                (self.INSERT_CIRCLES, [(cid, ego_id) for cid in circles.keys()]),
+                (self.INSERT_NODE_FEATURES, node_feature_rows),
+                (self.INSERT_EDGES, [(src, dst, ego_id) for src, dst in edges]),
+            ],
+            [
+                (self.INSERT_MEMBERSHIPS, [(cid, uid) for cid, members in circles.items() for uid in members]),
+            ],
+        ]
+
+    def finishedEgos(self) -> dict[str, dict[str, str]]:
+        """
+        Source file checksums of every ego in the ingest manifest.
+        """
+        with self.conn.cursor() as cur:
+            finished = dict(cur.execute("select ego_id, checksums from ingest_manifest").fetchall())
+        self.conn.commit()
+        return finished
+
+    def recordEgo(self, ego_id: str, checksums: dict[str, str], row_counts: dict[str, int]):
+        from psycopg.types.json import Jsonb
+        self.conn.execute(
             """
-            insert into ego(node_id) values (%s)
-            on conflict do nothing
-            """,
-            (ego_id,)
+            insert into ingest_manifest(ego_id, checksums, row_counts, completed_at)
+            values (%s, %s, %s, now())
+            on conflict (ego_id) do update
+            set checksums = excluded.checksums, row_counts = excluded.row_counts, completed_at = excluded.completed_at
+            """, (ego_id, Jsonb(checksums), Jsonb(row_counts))
         )
         self.conn.commit()
 
-        users = [(uid, 'user') for uid in node_features.keys()]
+    AGGREGATE_TABLES: LiteralString = """
+        create table if not exists ego_stats (
+            ego_id text primary key,
+            user_count int not null,
+            edge_count int not null,
+            circle_count int not null,
+            nonempty_circle_count int not null,
+            member_count int not null,
+            max_out_degree int not null,
+            avg_out_degree float8
+        );
+
+        create table if not exists node_degree (
+            ego_id text not null,
+            src_id text not null,
+            out_degree int not null,
+            primary key (ego_id, src_id)
+        );
+
+        create index if not exists edge_ego_idx on edge(ego_id);
+        create index if not exists user_node_ego_idx on user_node(ego_id);
+    """
+
+    REFRESH_AGGREGATES: list[LiteralString] = [
+        "delete from node_degree where ego_id = any(%(egos)s)",
+        """
+        insert into node_degree(ego_id, src_id, out_degree)
+        select ego_id, src_id, count(*) from edge
+        where ego_id = any(%(egos)s)
+        group by ego_id, src_id
+        """,
+        """
+        insert into ego_stats
+        select
+            e.node_id,
+            (select count(*) from user_node u where u.ego_id = e.node_id),
+            (select coalesce(sum(out_degree), 0) from node_degree d where d.ego_id = e.node_id),
+            (select count(*) from circle c where c.ego_id = e.node_id),
+            (select count(distinct cm.circle_id) from circle_member cm join circle c using (circle_id) where c.ego_id = e.node_id),
+            (select count(*) from circle_member cm join circle c using (circle_id) where c.ego_id = e.node_id),
+            (select coalesce(max(out_degree), 0) from node_degree d where d.ego_id = e.node_id),
+            (select avg(out_degree) from node_degree d where d.ego_id = e.node_id)
+        from ego e
+        where e.node_id = any(%(egos)s)
+        on conflict (ego_id) do update set
+            user_count = excluded.user_count,
+            edge_count = excluded.edge_count,
+            circle_count = excluded.circle_count,
+            nonempty_circle_count = excluded.nonempty_circle_count,
+            member_count = excluded.member_count,
+            max_out_degree = excluded.max_out_degree,
+            avg_out_degree = excluded.avg_out_degree
+        """,
+    ]
+
+    ALL_EGOS: LiteralString = "select node_id from ego"
+
+    def setup_aggregates(self):
+        """
+        Optional per-ego summary tables the precomputed benchmark queries read
+        (see POSTGRES_AGG_QUERIES), plus the ego indexes their refresh needs.
+        """
+        self.conn.execute(self.AGGREGATE_TABLES)
+        self.conn.commit()
 
-        circs = [(cid, ego_id) for cid in circles.keys()]
+    def refresh_aggregates(self, ego_keys: list):
+        """
+        Recomputes the summary rows of the given egos. They only depend on
+        each ego's own rows, so the rows of other egos stay valid.
+        """
+        with self.conn.cursor() as cur:
+            for statement in self.REFRESH_AGGREGATES:
+                cur.execute(statement, {"egos": ego_keys})
+        self.conn.commit()
 
-        feature_groupnames = list({group for group, _ in features})
+    def finish_ego(self, ego_id: str):
+        """
+        Called once an ego is fully written, keeps the aggregates up to date.
+        In fast mode they are built by finish_load instead.
+        """
+        if self.aggregates and self.load_mode != "fast":
+            self.refresh_aggregates([self.key(ego_id)])
+
+    # Secondary indexes by profile, on top of the primary keys. The workload
+    # profile covers the benchmark queries: per-ego grouping of edges and
+    # users, the C4 self-join on dst_id = src_id, and the joins on
+    # circle_member.node_id and node_feature.feature_id.
+    INDEX_PROFILES: dict[str, dict[str, LiteralString]] = {
+        "none": {},
+        "workload": {
+            "edge_ego_src_idx": "create index if not exists edge_ego_src_idx on edge(ego_id, src_id)",
+            "edge_dst_ego_idx": "create index if not exists edge_dst_ego_idx on edge(dst_id, ego_id)",
+            "user_node_ego_node_idx": "create index if not exists user_node_ego_node_idx on user_node(ego_id, node_id)",
+            "circle_member_node_idx": "create index if not exists circle_member_node_idx on circle_member(node_id, circle_id)",
+            "node_feature_feature_idx": "create index if not exists node_feature_feature_idx on node_feature(feature_id, node_id)",
+        },
+    }
+
+    def build_indexes(self, profile: str | None = None) -> list[dict]:
+        """
+        Creates the indexes of profile (this ingestor's by default) that do
+        not exist yet, returns the build time and size of each index.
+        """
+        profile = profile or self.indexes
+        results = []
+        with self.conn.cursor() as cur:
+            for name, statement in self.INDEX_PROFILES[profile].items():
+                start = time.perf_counter()
+                cur.execute(statement)
+                self.conn.commit()
+                elapsed = time.perf_counter() - start
 
-        memberships = [(cid, uid) for cid, users in circles.items() for uid in users]
+                # A partitioned index has no storage of its own, its partitions do
+                cur.execute(
+                    """
+                    select pg_relation_size(i) + coalesce(
+                        (select sum(pg_relation_size(relid)) from pg_partition_tree(i) where isleaf), 0
+                    )
+                    from (select %s::regclass as i) index
+                    """,
+                    (f"{self.SCHEMA}.{name}",)
+                )
+                results.append({
+                    "db": self.label,
+                    "profile": profile,
+                    "index": name,
+                    "build_sec": elapsed,
+                    "index_bytes": cur.fetchone()[0]
+                })
+        self.conn.commit()
 
-        for user_chunk in split_to_chunks(users):
-            cur.executemany(
-                """
-                insert into node(node_id, node_type) values (%s, %s)
-                on conflict do nothing
-                """, user_chunk
-            )
+        return results
+
+    def analyze(self):
+        # analyze cannot run inside a transaction block
+        self.conn.autocommit = True
+        try:
+            self.conn.execute("analyze")
+        finally:
+            self.conn.autocommit = False
+
+    def drop_indexes(self):
+        """
+        Drops the indexes of every profile.
+        """
+        with self.conn.cursor() as cur:
+            for statements in self.INDEX_PROFILES.values():
+                for name in statements:
+                    cur.execute(f"drop index if exists {self.SCHEMA}.{name}")
+        self.conn.commit()
+
+    DELETE_USER_NODES: LiteralString = """
+        delete from user_node where node_id = %s and ego_id = %s
+    """
+
+    DELETE_CIRCLES: LiteralString = """
+        delete from circle where circle_id = %s and ego_id = %s
+    """
+
+    DELETE_MEMBERSHIPS: LiteralString = """
+        delete from circle_member where circle_id = %s and node_id = %s
+    """
+
+    DELETE_NODE_FEATURES: LiteralString = """
+        delete from node_feature where node_id = %s and feature_id = %s
+    """
+
+    DELETE_EDGES: LiteralString = """
+        delete from edge where src_id = %s and dst_id = %s and ego_id = %s
+    """
+
+    def resolve_nodes(self, cur, node_ids: list[str]):
+        """
+        Makes key() work for nodes inserted before this ingestor started.
+        """
+        pass
+
+    def ingestEgoDiff(self, diff: EgoDiff):
+        """
+        Writes only the rows that changed since the ego was last ingested.
+        Users, circles, memberships and edges are stored per ego and removed
+        exactly, unless another ego owns the shared user_node row. Node
+        features are stored once per node and kept while another ego still
+        asserts them. Nodes and features themselves are never removed.
+        """
+        cur = self.conn.cursor()
+        key = self.key
+        ego_id = diff.ego_id
+
+        self.insert_ego(cur, ego_id)
+        ego_key = key(ego_id)
+        self.features.register(cur, diff.feats)
+        by_name = self.features.by_name
+
+        self.insert_nodes(cur, diff.added_users, 'user')
+        self.resolve_nodes(cur, sorted(
+            {n for pair in diff.removed_edges + diff.added_edges for n in pair}
+            | {n for _, n in diff.removed_memberships + diff.added_memberships}
+            | {n for n, _ in diff.removed_node_features + diff.added_node_features}
+            | set(diff.removed_users)
+        ))
+
+        self.insert_chunked(cur, self.DELETE_EDGES, [(key(src), key(dst), ego_key) for src, dst in diff.removed_edges])
+        self.insert_chunked(cur, self.DELETE_MEMBERSHIPS, [(cid, key(uid)) for cid, uid in diff.removed_memberships])
+        self.insert_chunked(cur, self.DELETE_CIRCLES, [(cid, ego_key) for cid in diff.removed_circles])
+        self.insert_chunked(cur, self.DELETE_NODE_FEATURES, [
+            (key(node_id), by_name[name]) for node_id, name in diff.removed_node_features
+            if name in by_name and (node_id, name) not in diff.shared_node_features
+        ])
+        self.insert_chunked(cur, self.DELETE_USER_NODES, [
+            (key(uid), ego_key) for uid in diff.removed_users if uid not in diff.shared_users
+        ])
+
+        self.insert_chunked(cur, self.INSERT_USER_NODES, [(key(uid), ego_key) for uid in diff.added_users])
+        self.insert_chunked(cur, self.INSERT_CIRCLES, [(cid, ego_key) for cid in diff.added_circles])
+        self.insert_chunked(cur, self.INSERT_MEMBERSHIPS, [(cid, key(uid)) for cid, uid in diff.added_memberships])
+        self.insert_chunked(cur, self.INSERT_NODE_FEATURES, [
+            (key(node_id), by_name[name]) for node_id, name in diff.added_node_features
+        ])
+        self.insert_chunked(cur, self.INSERT_EDGES, [(key(src), key(dst), ego_key) for src, dst in diff.added_edges])
+
+    def ingestEgoStream(self, ego_id: str, stream: EgoStream):
+        """
+        Same rows as ingestEgoNetwork, but the ego's files are read and
+        written one batch at a time, so memory is bounded by the batch size.
+        Users are written before circles and edges, which reference them.
+        """
+        cur = self.conn.cursor()
+        key = self.key
+
+        self.insert_ego(cur, ego_id)
+        ego_key = key(ego_id)
+        self.features.register(cur, stream.features())
+        by_name = self.features.by_name
+
+        for batch in stream.node_features():
+            users = sorted(batch.keys())
+            self.insert_nodes(cur, users, 'user')
+            self.insert_chunked(cur, self.INSERT_USER_NODES, [(key(uid), ego_key) for uid in users])
+            self.insert_chunked(cur, self.INSERT_NODE_FEATURES, [
+                (key(uid), fid) for uid, fid in sorted((uid, by_name[name]) for uid in users for name in batch[uid])
+            ])
+
+        self.insert_chunked(cur, self.INSERT_NODE_FEATURES, [
+            (key(ego), fid) for ego, fid in sorted((ego, by_name[name]) for ego, names in stream.ego_features().items() for name in names)
+        ])
+
+        for batch in stream.circles():
+            self.insert_chunked(cur, self.INSERT_CIRCLES, [(cid, ego_key) for cid in batch.keys()])
+            self.insert_chunked(cur, self.INSERT_MEMBERSHIPS, [
+                (cid, key(uid)) for cid, users in batch.items() for uid in users
+            ])
+
+        for batch in stream.edges():
+            self.insert_chunked(cur, self.INSERT_EDGES, [(key(src), key(dst), ego_key) for src, dst in batch])
+
+    MERGE_STAGED_NODES: LiteralString = """
+        insert into node(node_id, node_type)
+        select distinct node_id, 'user' from stage_node
+        order by node_id
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_USER_NODES: LiteralString = """
+        insert into user_node(node_id, ego_id)
+        select distinct node_id, %s from stage_node
+        order by node_id
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_CIRCLES: LiteralString = """
+        insert into circle(circle_id, ego_id)
+        select distinct circle_id, %s from stage_circle_member
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_MEMBERSHIPS: LiteralString = """
+        insert into circle_member(circle_id, node_id)
+        select distinct circle_id, node_id from stage_circle_member
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_NODE_FEATURES: LiteralString = """
+        insert into node_feature(node_id, feature_id)
+        select distinct node_id, feature_id from stage_node_feature
+        order by node_id, feature_id
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_EDGES: LiteralString = """
+        insert into edge(src_id, dst_id, ego_id)
+        select distinct src_id, dst_id, %s from stage_edge
+        on conflict do nothing
+    """
+
+    def setup_staging(self, cur):
+        """
+        Session-local staging tables for the COPY load path.
+        Rows are dropped automatically when the load transaction commits.
+        """
+        cur.execute(
+            """
+            create temp table if not exists stage_node (
+                node_id text not null
+            ) on commit delete rows;
+
+            create temp table if not exists stage_circle_member (
+                circle_id text not null,
+                node_id text not null
+            ) on commit delete rows;
+
+            create temp table if not exists stage_node_feature (
+                node_id text not null,
+                feature_id int not null
+            ) on commit delete rows;
+
+            create temp table if not exists stage_edge (
+                src_id text not null,
+                dst_id text not null
+            ) on commit delete rows;
+            """
+        )
+
+    def bulkIngestEgoNetwork(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        features: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ):
+        """
+        Streams an ego network into staging tables with COPY FROM STDIN,
+        then merges each staging table into its target with a single
+        INSERT ... SELECT ... ON CONFLICT, all in one transaction.
+        """
+        with self.conn.cursor() as cur:
+            # The ego row is committed up front, like the insert path, so that
+            # workers loading egos that follow each other never wait on it
+            self.insert_ego(cur, ego_id)
+
+            self.features.register(cur, features)
+            by_name = self.features.by_name
+
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            self.setup_staging(cur)
+
+            with cur.copy("copy stage_node (node_id) from stdin") as copy:
+                for uid in node_features.keys():
+                    copy.write_row((uid,))
+
+            with cur.copy("copy stage_circle_member (circle_id, node_id) from stdin") as copy:
+                for cid, users in circles.items():
+                    for uid in users:
+                        copy.write_row((cid, uid))
+
+            with cur.copy("copy stage_node_feature (node_id, feature_id) from stdin") as copy:
+                for node_id, feats in node_features.items():
+                    for name in feats:
+                        copy.write_row((node_id, by_name[name]))
+                for ego, feats in ego_features.items():
+                    for name in feats:
+                        copy.write_row((ego, by_name[name]))
+
+            with cur.copy("copy stage_edge (src_id, dst_id) from stdin") as copy:
+                for row in edges:
+                    copy.write_row(row)
+
+            ego_key = self.key(ego_id)
+
+            # Shared rows are merged in key order so parallel workers lock them in the same order
+            cur.execute(self.MERGE_STAGED_NODES)
+            cur.execute(self.MERGE_STAGED_USER_NODES, (ego_key,))
+            cur.execute(self.MERGE_STAGED_CIRCLES, (ego_key,))
+
+            # Circles without members never reach stage_circle_member
+            cur.executemany(self.INSERT_CIRCLES, [(cid, ego_key) for cid, users in circles.items() if not users])
+
+            cur.execute(self.MERGE_STAGED_MEMBERSHIPS)
+            cur.execute(self.MERGE_STAGED_NODE_FEATURES)
+            cur.execute(self.MERGE_STAGED_EDGES, (ego_key,))
+
+    # Fast load: unlogged tables without keys, constraints are added once everything is loaded
+    FAST_LOAD_TABLES: LiteralString = """
+        drop table if exists edge, node_feature, circle_member, circle, user_node, ego, node, feature_name, feature_group cascade;
+
+        create unlogged table node (node_id text not null, node_type text not null);
+        create unlogged table ego (node_id text not null);
+        create unlogged table user_node (node_id text not null, ego_id text not null);
+        create unlogged table circle (circle_id text not null, ego_id text not null);
+        create unlogged table circle_member (circle_id text not null, node_id text not null);
+        create unlogged table feature_group (group_id serial primary key, group_name text not null);
+        create unlogged table feature_name (
+            feature_id serial primary key,
+            name text not null,
+            group_id int not null,
+            constraint feature_name_unique unique(group_id, name)
+        );
+        create unlogged table node_feature (node_id text not null, feature_id int not null);
+        create unlogged table edge (src_id text not null, dst_id text not null, ego_id text not null);
+    """
+
+    # Without keys every on conflict do nothing inserts, keep the first copy of each row
+    FAST_LOAD_DEDUPLICATE: list[LiteralString] = [
+        "delete from node a using node b where a.node_id = b.node_id and a.ctid > b.ctid",
+        "delete from ego a using ego b where a.node_id = b.node_id and a.ctid > b.ctid",
+        "delete from user_node a using user_node b where a.node_id = b.node_id and a.ctid > b.ctid",
+        "delete from circle a using circle b where a.circle_id = b.circle_id and a.ctid > b.ctid",
+        """
+        delete from circle_member a using circle_member b
+        where (a.circle_id, a.node_id) = (b.circle_id, b.node_id) and a.ctid > b.ctid
+        """,
+        """
+        delete from node_feature a using node_feature b
+        where (a.node_id, a.feature_id) = (b.node_id, b.feature_id) and a.ctid > b.ctid
+        """,
+        """
+        delete from edge a using edge b
+        where (a.src_id, a.dst_id, a.ego_id) = (b.src_id, b.dst_id, b.ego_id) and a.ctid > b.ctid
+        """,
+    ]
+
+    # Constraint names match the ones setup_tables gets by default
+    FAST_LOAD_KEYS: LiteralString = """
+        alter table node
+            add constraint node_pkey primary key (node_id),
+            add constraint node_type_check check (node_type in ('ego', 'user')) not valid;
+        alter table ego add constraint ego_pkey primary key (node_id);
+        alter table user_node add constraint user_node_pkey primary key (node_id);
+        alter table circle
+            add constraint circle_pkey primary key (circle_id),
+            add constraint circle_ego_id_circle_id_key unique (ego_id, circle_id);
+        alter table circle_member add constraint circle_member_pkey primary key (circle_id, node_id);
+        alter table node_feature add constraint node_feature_pkey primary key (node_id, feature_id);
+        alter table edge add constraint edge_pkey primary key (src_id, dst_id, ego_id);
+    """
+
+    FAST_LOAD_FOREIGN_KEYS: dict[str, dict[str, LiteralString]] = {
+        "ego": {
+            "ego_node_id_fkey": "foreign key (node_id) references node(node_id) on delete cascade",
+        },
+        "user_node": {
+            "user_node_node_id_fkey": "foreign key (node_id) references node(node_id) on delete cascade",
+            "user_node_ego_id_fkey": "foreign key (ego_id) references ego(node_id) on delete cascade",
+        },
+        "circle": {
+            "circle_ego_id_fkey": "foreign key (ego_id) references ego(node_id) on delete cascade",
+        },
+        "circle_member": {
+            "circle_member_circle_id_fkey": "foreign key (circle_id) references circle(circle_id) on delete cascade",
+            "circle_member_node_id_fkey": "foreign key (node_id) references node(node_id) on delete cascade",
+        },
+        "feature_name": {
+            "feature_name_group_id_fkey": "foreign key (group_id) references feature_group(group_id) on delete cascade",
+        },
+        "node_feature": {
+            "node_feature_node_id_fkey": "foreign key (node_id) references node(node_id) on delete cascade",
+            "node_feature_feature_id_fkey": "foreign key (feature_id) references feature_name(feature_id) on delete cascade",
+        },
+        "edge": {
+            "edge_src_id_fkey": "foreign key (src_id) references node(node_id) on delete cascade",
+            "edge_dst_id_fkey": "foreign key (dst_id) references node(node_id) on delete cascade",
+            "edge_ego_id_fkey": "foreign key (ego_id) references ego(node_id) on delete cascade",
+        },
+    }
+
+    # Referenced tables first, a logged table cannot reference an unlogged one
+    FAST_LOAD_LOGGED_ORDER = [
+        "node", "ego", "feature_group", "feature_name", "circle",
+        "user_node", "circle_member", "node_feature", "edge"
+    ]
+
+    def begin_load(self):
+        """
+        In fast mode, recreates every table as UNLOGGED and without keys.
+        Meant for an initial load, all existing data is dropped.
+        """
+        if self.load_mode != "fast":
+            return
+
+        self.conn.execute(self.FAST_LOAD_TABLES)
+        self.conn.execute("truncate table ingest_manifest")
+        if self.aggregates:
+            self.conn.execute("truncate table ego_stats, node_degree")
+        self.conn.commit()
+        self.features.clear()
+
+    def finish_load(self):
+        """
+        In fast mode, deduplicates the loaded rows, builds the primary keys,
+        adds the foreign keys as NOT VALID and validates them, then makes
+        the tables LOGGED and analyzes them.
+        """
+        if self.load_mode != "fast":
+            return
+
+        with self.conn.cursor() as cur:
+            for statement in self.FAST_LOAD_DEDUPLICATE:
+                cur.execute(statement)
             self.conn.commit()
 
-        for user_chunk in split_to_chunks(users):
-            cur.executemany(
-                """
-                insert into user_node(node_id, ego_id) values (%s, %s)
-                on conflict do nothing
-                """, [(user, ego_id) for user, _ in user_chunk]
-            )
+            cur.execute(self.FAST_LOAD_KEYS)
             self.conn.commit()
 
-        for circle_chunk in split_to_chunks(circs):
-            cur.executemany(
-                """
-                insert into circle(circle_id, ego_id) values (%s, %s)
-                on conflict do nothing
-                """, circle_chunk
-            )
+            for table, constraints in self.FAST_LOAD_FOREIGN_KEYS.items():
+                for name, definition in constraints.items():
+                    cur.execute(f"alter table {table} add constraint {name} {definition} not valid")
             self.conn.commit()
 
-        circs.clear()
+            cur.execute("alter table node validate constraint node_type_check")
+            for table, constraints in self.FAST_LOAD_FOREIGN_KEYS.items():
+                for name in constraints:
+                    cur.execute(f"alter table {table} validate constraint {name}")
+            self.conn.commit()
 
-        for membership_chunk in split_to_chunks(memberships):
-            cur.executemany(
-                """
-                insert into circle_member(circle_id, node_id) values (%s, %s)
-                on conflict do nothing
-                """, membership_chunk
-            )
+            for table in self.FAST_LOAD_LOGGED_ORDER:
+                cur.execute(f"alter table {table} set logged")
             self.conn.commit()
 
-        memberships.clear()
+        if self.aggregates:
+            self.setup_aggregates()
+            self.refresh_aggregates([key for (key,) in self.conn.execute(self.ALL_EGOS).fetchall()])
+        self.build_indexes()
+        self.analyze()
 
-        for feat_grname_chunk in split_to_chunks(feature_groupnames):
-            cur.executemany(
+    def fastIngestEgoNetwork(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        features: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ):
+        """
+        COPY straight into the keyless tables set up by begin_load.
+        Duplicates are removed by finish_load.
+        """
+        with self.conn.cursor() as cur:
+            self.insert_ego(cur, ego_id)
+            self.features.register(cur, features)
+            by_name = self.features.by_name
+
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            with cur.copy("copy node (node_id, node_type) from stdin") as copy:
+                for uid in node_features.keys():
+                    copy.write_row((uid, 'user'))
+
+            with cur.copy("copy user_node (node_id, ego_id) from stdin") as copy:
+                for uid in node_features.keys():
+                    copy.write_row((uid, ego_id))
+
+            with cur.copy("copy circle (circle_id, ego_id) from stdin") as copy:
+                for cid in circles.keys():
+                    copy.write_row((cid, ego_id))
+
+            with cur.copy("copy circle_member (circle_id, node_id) from stdin") as copy:
+                for cid, users in circles.items():
+                    for uid in users:
+                        copy.write_row((cid, uid))
+
+            with cur.copy("copy node_feature (node_id, feature_id) from stdin") as copy:
+                for node_id, feats in node_features.items():
+                    for name in feats:
+                        copy.write_row((node_id, by_name[name]))
+                for ego, feats in ego_features.items():
+                    for name in feats:
+                        copy.write_row((ego, by_name[name]))
+
+            with cur.copy("copy edge (src_id, dst_id, ego_id) from stdin") as copy:
+                for src, dst in edges:
+                    copy.write_row((src, dst, ego_id))
+
+
+class NodeIndex:
+    """
+    In-process map from node id to the surrogate key of IntKeyPSQLIngestor.
+    Filled as nodes are inserted and shared by parallel workers.
+    """
+    def __init__(self) -> None:
+        self.keys: dict[str, int] = {}
+
+    def clear(self):
+        self.keys.clear()
+
+    def register(self, cur, node_ids: list[str], node_type: str):
+        """
+        Inserts the nodes that have no key yet and records their keys.
+        Nodes inserted concurrently by another worker conflict and are looked up instead.
+        """
+        missing = [uid for uid in node_ids if uid not in self.keys]
+
+        for chunk in split_to_chunks(missing):
+            cur.execute(
                 """
-                insert into feature_group(group_name) values (%s)
-                on conflict do nothing
-                """, [(g,) for g in feat_grname_chunk]
+                insert into node(node_id, node_type)
+                select unnest(%s::text[]), %s
+                on conflict (node_id) do nothing
+                """, (chunk, node_type)
             )
-            self.conn.commit()
+            self.keys.update(cur.execute(
+                "select node_id, node_key from node where node_id = any(%s)", (chunk,)
+            ).fetchall())
+            cur.connection.commit()
+
+    def lookup(self, cur, node_ids: list[str]):
+        """
+        Records the keys of existing nodes without inserting any.
+        """
+        missing = [uid for uid in node_ids if uid not in self.keys]
+
+        for chunk in split_to_chunks(missing):
+            self.keys.update(cur.execute(
+                "select node_id, node_key from node where node_id = any(%s)", (chunk,)
+            ).fetchall())
+
+
+class IntKeyPSQLIngestor(PSQLIngestor):
+    """
+    Same data as PSQLIngestor in the intkeys schema, where nodes get a compact
+    integer surrogate key. node maps each node id to its key and every other
+    table references nodes by key only.
+    """
+    LOAD_MODES = ("insert", "copy")
+    SCHEMA = "intkeys"
+    KEY_TYPE = "int"
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        host: str,
+        port: int,
+        dbname: str,
+        load_mode: str = "insert",
+        aggregates: bool = False,
+        indexes: str = "none"
+    ) -> None:
+        self.nodes = NodeIndex()
+        super().__init__(username, password, host, port, dbname, load_mode, aggregates, indexes)
 
-        group_map = dict(cur.execute("select group_name, group_id from feature_group").fetchall())
+    def wipe(self):
+        super().wipe()
+        self.nodes.clear()
 
-        for feature_chunk in split_to_chunks([(group_map[group], name) for group, name in features]):
-            cur.executemany(
-                """
-                insert into feature_name (group_id, name) values (%s, %s)
-                on conflict do nothing
-                """, feature_chunk
-            )
-            self.conn.commit()
+    def setup_tables(self):
+        result = self.conn.execute(
+            """
+            create schema if not exists intkeys;
 
-        feature_id_map = {(gid, name): fid for fid, gid, name in cur.execute("select feature_id, group_id, name from feature_name").fetchall()}
+            create table if not exists intkeys.node (
+                node_key int generated always as identity primary key,
+                node_id text not null unique,
+                node_type text not null,
+                constraint node_type_check check (node_type in ('ego', 'user'))
+            );
 
-        node_feature_rows = []
-        for node_id, feats in node_features.items():
-            for name in feats:
-                group_id = next(gid for (gid, fname) in feature_id_map if fname == name)
-                feature_id = feature_id_map[(group_id, name)]
-                node_feature_rows.append((node_id, feature_id))
+            create table if not exists intkeys.ego (
+                node_key int primary key references intkeys.node(node_key) on delete cascade
+            );
 
-        for ego, feats in ego_features.items():
-            for name in feats:
-                group_id = next(gid for (gid, fname) in feature_id_map if fname == name)
-                feature_id = feature_id_map[(group_id, name)]
-                node_feature_rows.append((ego, feature_id))
+            create table if not exists intkeys.user_node (
+                node_key int primary key references intkeys.node(node_key) on delete cascade,
+                ego_key int not null references intkeys.ego(node_key) on delete cascade
+            );
 
-        for featmap_chunk in split_to_chunks(node_feature_rows):
-            cur.executemany(
-                """
-                insert into node_feature(node_id, feature_id) values (%s, %s)
-                on conflict do nothing
-                """, featmap_chunk
-            )
-            self.conn.commit()
+            create table if not exists intkeys.circle (
+                circle_id text primary key,
+                ego_key int not null references intkeys.ego(node_key) on delete cascade,
+                unique (ego_key, circle_id)
+            );
 
-        feature_id_map.clear()
-        group_map.clear()
-        
-        for edges_chunk in split_to_chunks(edges):
-            cur.executemany(
-                """
-                insert into edge(src_id, dst_id, ego_id) values (%s, %s, %s)
-                on conflict do nothing
-                """, [(src, dst, ego_id) for src, dst in edges_chunk]
-            )
-            self.conn.commit()
+            create table if not exists intkeys.circle_member (
+                circle_id text references intkeys.circle(circle_id) on delete cascade,
+                node_key int references intkeys.node(node_key) on delete cascade,
+                primary key (circle_id, node_key)
+            );
+
+            create table if not exists intkeys.feature_group (
+                group_id serial primary key,
+                group_name text not null
+            );
+
+            create table if not exists intkeys.feature_name (
+                feature_id serial primary key,
+                name text not null,
+                group_id int not null references intkeys.feature_group(group_id) on delete cascade,
+                constraint feature_name_unique unique(group_id, name)
+            );
+
+            create table if not exists intkeys.node_feature (
+                node_key int not null references intkeys.node(node_key) on delete cascade,
+                feature_id int not null references intkeys.feature_name(feature_id) on delete cascade,
+                primary key (node_key, feature_id)
+            );
+
+            create table if not exists intkeys.edge (
+                src_key int not null references intkeys.node(node_key) on delete cascade,
+                dst_key int not null references intkeys.node(node_key) on delete cascade,
+                ego_key int not null references intkeys.ego(node_key) on delete cascade,
+                primary key (src_key, dst_key, ego_key)
+            );
+
+            create table if not exists intkeys.ingest_manifest (
+                ego_id text primary key,
+                checksums jsonb not null,
+                row_counts jsonb not null,
+                completed_at timestamptz not null default now()
+            );
+            """
+        )
+        self.conn.commit()
+
+    INSERT_EGO: LiteralString = """
+        insert into ego(node_key) values (%s)
+        on conflict do nothing
+    """
+
+    INSERT_USER_NODES: LiteralString = """
+        insert into user_node(node_key, ego_key) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_CIRCLES: LiteralString = """
+        insert into circle(circle_id, ego_key) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_MEMBERSHIPS: LiteralString = """
+        insert into circle_member(circle_id, node_key) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_NODE_FEATURES: LiteralString = """
+        insert into node_feature(node_key, feature_id) values (%s, %s)
+        on conflict do nothing
+    """
+
+    INSERT_EDGES: LiteralString = """
+        insert into edge(src_key, dst_key, ego_key) values (%s, %s, %s)
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_USER_NODES: LiteralString = """
+        insert into user_node(node_key, ego_key)
+        select distinct n.node_key, %s
+        from stage_node s
+        join node n on n.node_id = s.node_id
+        order by n.node_key
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_CIRCLES: LiteralString = """
+        insert into circle(circle_id, ego_key)
+        select distinct circle_id, %s from stage_circle_member
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_MEMBERSHIPS: LiteralString = """
+        insert into circle_member(circle_id, node_key)
+        select distinct s.circle_id, n.node_key
+        from stage_circle_member s
+        join node n on n.node_id = s.node_id
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_NODE_FEATURES: LiteralString = """
+        insert into node_feature(node_key, feature_id)
+        select distinct n.node_key, s.feature_id
+        from stage_node_feature s
+        join node n on n.node_id = s.node_id
+        order by n.node_key, s.feature_id
+        on conflict do nothing
+    """
+
+    MERGE_STAGED_EDGES: LiteralString = """
+        insert into edge(src_key, dst_key, ego_key)
+        select distinct src.node_key, dst.node_key, %s
+        from stage_edge s
+        join node src on src.node_id = s.src_id
+        join node dst on dst.node_id = s.dst_id
+        on conflict do nothing
+    """
+
+    def key(self, node_id: str) -> int:
+        return self.nodes.keys[node_id]
+
+    def insert_ego(self, cur, ego_id: str):
+        self.nodes.register(cur, [ego_id], 'ego')
+        cur.execute(self.INSERT_EGO, (self.key(ego_id),))
+        self.conn.commit()
+
+    def insert_nodes(self, cur, node_ids: list[str], node_type: str):
+        self.nodes.register(cur, node_ids, node_type)
+
+    def resolve_nodes(self, cur, node_ids: list[str]):
+        self.nodes.lookup(cur, node_ids)
+
+    AGGREGATE_TABLES: LiteralString = """
+        create table if not exists intkeys.ego_stats (
+            ego_key int primary key,
+            user_count int not null,
+            edge_count int not null,
+            circle_count int not null,
+            nonempty_circle_count int not null,
+            member_count int not null,
+            max_out_degree int not null,
+            avg_out_degree float8
+        );
+
+        create table if not exists intkeys.node_degree (
+            ego_key int not null,
+            src_key int not null,
+            out_degree int not null,
+            primary key (ego_key, src_key)
+        );
+
+        create index if not exists edge_ego_idx on intkeys.edge(ego_key);
+        create index if not exists user_node_ego_idx on intkeys.user_node(ego_key);
+    """
+
+    REFRESH_AGGREGATES: list[LiteralString] = [
+        "delete from node_degree where ego_key = any(%(egos)s)",
+        """
+        insert into node_degree(ego_key, src_key, out_degree)
+        select ego_key, src_key, count(*) from edge
+        where ego_key = any(%(egos)s)
+        group by ego_key, src_key
+        """,
+        """
+        insert into ego_stats
+        select
+            e.node_key,
+            (select count(*) from user_node u where u.ego_key = e.node_key),
+            (select coalesce(sum(out_degree), 0) from node_degree d where d.ego_key = e.node_key),
+            (select count(*) from circle c where c.ego_key = e.node_key),
+            (select count(distinct cm.circle_id) from circle_member cm join circle c using (circle_id) where c.ego_key = e.node_key),
+            (select count(*) from circle_member cm join circle c using (circle_id) where c.ego_key = e.node_key),
+            (select coalesce(max(out_degree), 0) from node_degree d where d.ego_key = e.node_key),
+            (select avg(out_degree) from node_degree d where d.ego_key = e.node_key)
+        from ego e
+        where e.node_key = any(%(egos)s)
+        on conflict (ego_key) do update set
+            user_count = excluded.user_count,
+            edge_count = excluded.edge_count,
+            circle_count = excluded.circle_count,
+            nonempty_circle_count = excluded.nonempty_circle_count,
+            member_count = excluded.member_count,
+            max_out_degree = excluded.max_out_degree,
+            avg_out_degree = excluded.avg_out_degree
+        """,
+    ]
+
+    ALL_EGOS: LiteralString = "select node_key from ego"
+
+    INDEX_PROFILES: dict[str, dict[str, LiteralString]] = {
+        "none": {},
+        "workload": {
+            "edge_ego_src_idx": "create index if not exists edge_ego_src_idx on intkeys.edge(ego_key, src_key)",
+            "edge_dst_ego_idx": "create index if not exists edge_dst_ego_idx on intkeys.edge(dst_key, ego_key)",
+            "user_node_ego_node_idx": "create index if not exists user_node_ego_node_idx on intkeys.user_node(ego_key, node_key)",
+            "circle_member_node_idx": "create index if not exists circle_member_node_idx on intkeys.circle_member(node_key, circle_id)",
+            "node_feature_feature_idx": "create index if not exists node_feature_feature_idx on intkeys.node_feature(feature_id, node_key)",
+        },
+    }
+
+    def egoStages(self, ego_id: str, *network) -> list[list[tuple[LiteralString, list[tuple]]]]:
+        """
+        Rows reference nodes by keys only known once the nodes are inserted,
+        which the stages of the async pipeline cannot express.
+        """
+        raise ValueError("The async pipeline does not support the int schema")
+
+    DELETE_USER_NODES: LiteralString = """
+        delete from user_node where node_key = %s and ego_key = %s
+    """
+
+    DELETE_CIRCLES: LiteralString = """
+        delete from circle where circle_id = %s and ego_key = %s
+    """
+
+    DELETE_MEMBERSHIPS: LiteralString = """
+        delete from circle_member where circle_id = %s and node_key = %s
+    """
+
+    DELETE_NODE_FEATURES: LiteralString = """
+        delete from node_feature where node_key = %s and feature_id = %s
+    """
+
+    DELETE_EDGES: LiteralString = """
+        delete from edge where src_key = %s and dst_key = %s and ego_key = %s
+    """
+
+
+class PartitionedPSQLIngestor(PSQLIngestor):
+    """
+    Same tables as PSQLIngestor in the partitioned schema, except that edge
+    is list-partitioned on ego_id with one partition per ego. A new ego's
+    edges are loaded into a standalone table, which is attached as the ego's
+    partition once complete, so loads of different egos share no edge index.
+
+    user_node and circle stay unpartitioned: a user belongs to a single ego
+    (node_id is the primary key) and circle_member references circle_id
+    alone, and a unique key of a partitioned table must include ego_id.
+    """
+    LOAD_MODES = ("insert",)
+    SCHEMA = "partitioned"
+    EDGE_TABLE: LiteralString = PSQLIngestor.EDGE_TABLE + "partition by list (ego_id)\n"
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        host: str,
+        port: int,
+        dbname: str,
+        load_mode: str = "insert",
+        aggregates: bool = False,
+        indexes: str = "none"
+    ) -> None:
+        super().__init__(username, password, host, port, dbname, load_mode, aggregates, indexes)
+        self.label = f"{dbname}_{self.SCHEMA}"
+
+    def setup_tables(self):
+        """
+        The text schema's tables, created in the partitioned schema through
+        the search_path of the connection.
+        """
+        self.conn.execute("create schema if not exists partitioned")
+        super().setup_tables()
+
+    def partitions(self, conn=None) -> list[str]:
+        """
+        Names of the partitions attached to edge.
+        """
+        conn = conn or self.conn
+        rows = conn.execute(
+            """
+            select c.relname from pg_inherits i
+            join pg_class c on c.oid = i.inhrelid
+            where i.inhparent = 'partitioned.edge'::regclass
+            """
+        ).fetchall()
+        conn.commit()
+        return [name for (name,) in rows]
+
+    def load_partition(self, ego_id: str, edges: list[tuple[str, str]], conn=None):
+        """
+        Copies the ego's edges into a standalone table and attaches it as the
+        ego's partition. A table left behind by a failed load is replaced.
+        The check constraint lets ATTACH skip scanning the table for rows
+        outside the partition, the primary key and foreign keys are built
+        and validated by ATTACH itself.
+        """
+        from psycopg import sql
+        conn = conn or self.conn
+        part = sql.Identifier(self.SCHEMA, f"edge_{ego_id}")
+        ego = sql.Literal(ego_id)
+
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(sql.SQL("drop table if exists {}").format(part))
+            cur.execute(sql.SQL("create table {} (like partitioned.edge including defaults)").format(part))
+            with cur.copy(sql.SQL("copy {} (src_id, dst_id, ego_id) from stdin").format(part)) as copy:
+                for src, dst in sorted(set(edges)):
+                    copy.write_row((src, dst, ego_id))
+            cur.execute(sql.SQL("alter table {} add check (ego_id = {})").format(part, ego))
+            cur.execute(sql.SQL("alter table partitioned.edge attach partition {} for values in ({})").format(part, ego))
+        conn.commit()
+
+    def attach_empty(self, ego_id: str, conn=None):
+        """
+        Attaches an empty partition for the ego if it has none, for the load
+        paths that insert edges through edge itself.
+        """
+        if f"edge_{ego_id}" not in self.partitions(conn):
+            self.load_partition(ego_id, [], conn)
+
+    def ingestEgoNetwork(
+        self,
+        ego_id: str,
+        edges: list[tuple[str, str]],
+        features: list[tuple[str, str]],
+        node_features: dict[str, list[str]],
+        ego_features: dict[str, list[str]],
+        circles: dict[str, list[str]]
+    ):
+        """
+        An ego with a partition already (e.g. re-ingested) is inserted
+        through edge, otherwise its edges are loaded by load_partition
+        after the other rows, which they reference.
+        """
+        if f"edge_{ego_id}" in self.partitions():
+            return super().ingestEgoNetwork(ego_id, edges, features, node_features, ego_features, circles)
+
+        super().ingestEgoNetwork(ego_id, [], features, node_features, ego_features, circles)
+        self.load_partition(ego_id, edges)
+
+    def ingestEgoStream(self, ego_id: str, stream: EgoStream):
+        self.attach_empty(ego_id)
+        super().ingestEgoStream(ego_id, stream)
+
+    def egoStages(self, ego_id: str, *network) -> list[list[tuple[LiteralString, list[tuple]]]]:
+        """
+        The partition is attached on a connection of its own, its DDL runs
+        in a transaction block that must not share self.conn with the other
+        steps of the async pipeline.
+        """
+        import psycopg
+        with psycopg.connect(**self.connect_args) as conn:
+            self.attach_empty(ego_id, conn)
+        return super().egoStages(ego_id, *network)
+
+    def wipe(self):
+        """
+        Drops the per-ego partitions, so the next load attaches new ones.
+        """
+        from psycopg import sql
+        for name in self.partitions():
+            self.conn.execute(sql.SQL("drop table {}").format(sql.Identifier(self.SCHEMA, name)))
+        self.conn.commit()
+        super().wipe()
+
+    def scanned_partitions(self, query: LiteralString) -> int:
+        """
+        Number of edge partitions the executed plan of a query read from,
+        each scan of a partition that ran at least once counts.
+        """
+        names = set(self.partitions())
+
+        def count(node: dict) -> int:
+            scanned = node.get("Relation Name") in names and node.get("Actual Loops", 0) > 0
+            return scanned + sum(count(child) for child in node.get("Plans", []))
+
+        return count(self.query_plan(query)["Plan"])
+
+    def partitionwise(self, enabled: bool):
+        """
+        Toggles partition-wise aggregation and joins, which the planner
+        leaves off by default, for this session.
+        """
+        value = "on" if enabled else "off"
+        self.conn.execute(f"set enable_partitionwise_aggregate = {value}")
+        self.conn.execute(f"set enable_partitionwise_join = {value}")
+        self.conn.commit()
+
+
+PSQL_SCHEMAS: dict[str, type[PSQLIngestor]] = {
+    "text": PSQLIngestor,
+    "int": IntKeyPSQLIngestor,
+    "partitioned": PartitionedPSQLIngestor,
+}
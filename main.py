@@ -1,10 +1,13 @@
 from pathlib import Path
-import parser, ingestor, plots, benchmark
+import parser, ingestor, plots, benchmark, manifest, pipeline, reference, results, history, download
 from os import remove, getenv 
 from os.path import join, dirname
 from alive_progress import alive_bar
 from dotenv import load_dotenv
 import argparse
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -15,7 +18,7 @@ def parse_args():
         "--segments",
         nargs="+",
         required=True,
-        choices=["data-download", "data-import", "metrics"],
+        choices=["data-download", "data-cache", "data-import", "metrics", "load-metrics", "offline-load-metrics", "memory-metrics", "throughput-metrics", "index-metrics", "partition-metrics", "history-report"],
         help="Pipeline segments to run (choose at least one)"
     )
 
@@ -26,42 +29,384 @@ def parse_args():
         help="Database target: p=Postgres, n=Neo4j, b=both (default)"
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of parallel parse and ingest workers for data-import (default 1)"
+    )
+
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help="Stream each ego in batches sized to keep ingestion under this many MB (default: load whole egos)"
+    )
+
+    parser.add_argument(
+        "--async-batches",
+        type=int,
+        default=None,
+        help="Import through the asyncio pipeline with at most this many batches in flight per database "
+             "(text schema with --pg-load insert, --n4j-load merge; default: off)"
+    )
+
+    parser.add_argument(
+        "--pg-schema",
+        choices=list(ingestor.PSQL_SCHEMAS),
+        default="text",
+        help="PostgreSQL schema: text=node ids as keys (default), int=integer surrogate keys in the intkeys schema, "
+             "partitioned=text schema with edge partitioned by ego (insert load only)"
+    )
+
+    parser.add_argument(
+        "--pg-load",
+        choices=["insert", "copy", "fast"],
+        default="insert",
+        help="PostgreSQL load path: insert=executemany (default), copy=COPY into staging tables, "
+             "fast=initial load into UNLOGGED keyless tables, constraints built at the end (drops existing data)"
+    )
+
+    parser.add_argument(
+        "--pg-aggregates",
+        action="store_true",
+        help="Keep per-ego aggregate tables up to date while importing into PostgreSQL, "
+             "and also time the queries they answer against them"
+    )
+
+    parser.add_argument(
+        "--pg-indexes",
+        choices=list(ingestor.PSQLIngestor.INDEX_PROFILES),
+        default="none",
+        help="PostgreSQL secondary index profile: none=primary keys only (default), "
+             "workload=covering indexes for the benchmark queries; index-metrics compares both"
+    )
+
+    parser.add_argument(
+        "--n4j-load",
+        choices=["merge", "create"],
+        default="merge",
+        help="Neo4j load path: merge=idempotent MERGE (default), "
+             "create=concurrent CREATE into an empty database, one writer per worker"
+    )
+
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Untimed runs of each query before it is timed in metrics (default: 1)"
+    )
+
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=10,
+        help="Timed runs of each query in metrics (default: 10)"
+    )
+
+    parser.add_argument(
+        "--cold-cmd",
+        default=None,
+        help="Shell command run before every timed query in metrics to empty the caches, "
+             "e.g. restarting both servers and dropping the OS page cache"
+    )
+
+    parser.add_argument(
+        "--reference",
+        action="store_true",
+        help="Also compute the metrics queries in process with NumPy/SciPy and flag database results that differ"
+    )
+
+    parser.add_argument(
+        "--analytics",
+        action="store_true",
+        help="Also time the graph analytics (triangles, components, k-core, PageRank) in metrics"
+    )
+
+    parser.add_argument(
+        "--result-format",
+        choices=results.RESULT_FORMATS,
+        default="csv",
+        help="Format of the query results written by metrics; parquet and arrow are streamed "
+             "batch by batch instead of fetched whole (default: csv)"
+    )
+
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Concurrent range requests used by data-download (default: 4)"
+    )
+
+    parser.add_argument(
+        "--dataset-sha256",
+        default=None,
+        help="Expected sha256 of the downloaded dataset archive; the download fails if it differs"
+    )
+
+    parser.add_argument(
+        "--history",
+        default="benchmark_history.sqlite",
+        help="SQLite file every metrics run is appended to (default: benchmark_history.sqlite)"
+    )
+
+    parser.add_argument(
+        "--regression-threshold",
+        type=float,
+        default=0.2,
+        help="Fraction by which a query must be slower than its rolling baseline to be flagged (default: 0.2)"
+    )
+
+    parser.add_argument(
+        "--baseline-runs",
+        type=int,
+        default=5,
+        help="Number of earlier runs of the same configuration making up the rolling baseline (default: 5)"
+    )
+
+    parser.add_argument(
+        "--clients",
+        default="1,2,4,8,16",
+        help="Comma-separated numbers of concurrent clients swept by throughput-metrics (default: 1,2,4,8,16)"
+    )
+
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="Seconds each concurrency level of throughput-metrics runs for (default: 10)"
+    )
+
+    parser.add_argument(
+        "--neo4j-admin",
+        default=None,
+        help="Path to neo4j-admin; offline-load-metrics then also times an offline import"
+    )
+
+    parser.add_argument(
+        "--neo4j-admin-db",
+        default=None,
+        help="Database offline-load-metrics imports into, one the server is not running "
+             "(default: <N4J_DB>-offline)"
+    )
+
     return parser.parse_args()
 
-def check_dataset(data_dir: Path):
+def check_dataset(data_dir: Path, workers: int = 4, sha256: str | None = None):
+    """
+    Downloads and extracts the dataset when data_dir is missing. An archive
+    already on disk is extracted as is; otherwise it is fetched in parallel
+    ranges and extracted while it downloads, resuming an interrupted attempt.
+    """
     print("Checking for dataset...")
     if not data_dir.is_dir():
         print("Dataset directory not found!")
         zipfile = f"{data_dir}.tar.gz"
-        if not Path(zipfile).exists():
-            import requests
-            print("Downloading dataset...")
+        if Path(zipfile).exists():
+            print("Extracting dataset...")
+            from shutil import unpack_archive
+            unpack_archive(zipfile, format = "gztar")
+            remove(zipfile)
+        else:
+            print("Downloading and extracting dataset...")
             url = "https://snap.stanford.edu/data/gplus.tar.gz"
-            with requests.get(url, stream = True) as r:
-                with open(zipfile, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size = 8192):
-                        f.write(chunk)
-        print("Extracting dataset...")
-        from shutil import unpack_archive
-        unpack_archive(zipfile, format = "gztar")
-        remove(zipfile)
+            digest = download.fetchArchive(url, Path(zipfile), data_dir.parent, workers, sha256=sha256)
+            print(f"Archive sha256: {digest}")
     else:
         print("Found dataset!")
 
-def import_data(db, data_dir: Path):
+def import_data(db, data_dir: Path, workers: int = 1, batch_bytes: int | None = None, async_batches: int | None = None):
+    """
+    Ingests the egos missing from db's ingest manifest and re-ingests the
+    egos whose files changed since as a diff. Finished egos are skipped.
+    """
+    db.begin_load()
+
     uids = parser.getUids(data_dir)
+    finished = db.finishedEgos()
+    checksums = {uid: manifest.checksums(data_dir, uid) for uid in uids}
+    pending = [uid for uid in uids if uid not in finished]
+    changed = [uid for uid in uids if uid in finished and finished[uid] != checksums[uid]]
+
+    skipped = len(uids) - len(pending) - len(changed)
+    if skipped:
+        print(f"Skipping {skipped} egos already ingested")
+
+    if async_batches is not None:
+        import_data_async(db, data_dir, pending, checksums, async_batches)
+    elif workers > 1:
+        import_data_parallel(db, data_dir, pending, checksums, workers, batch_bytes)
+    else:
+        import_data_serial(db, data_dir, pending, checksums, batch_bytes)
+
+    if changed:
+        import_data_changes(db, data_dir, changed, finished, checksums)
 
+    print("Finishing import...")
+    db.finish_load()
+
+    sizes = db.batch_sizes()
+    if not sizes.empty:
+        print("Settled batch sizes:")
+        print(sizes.to_string(index=False))
+
+def record_ego(db, data_dir: Path, uid: str, checksums: dict[str, str], row_counts: dict[str, int]):
+    """
+    Marks an ego finished, after keeping a snapshot of its files to diff later versions against
+    and updating the aggregates derived from its rows.
+    """
+    manifest.snapshot(data_dir, uid, checksums)
+    db.finish_ego(uid)
+    db.recordEgo(uid, checksums, row_counts)
+
+def import_data_serial(db, data_dir: Path, uids: list[str], checksums: dict[str, dict[str, str]], batch_bytes: int | None = None):
     print("Importing dataset to Neo4J and PostgreSQL...")
     with alive_bar(len(uids)) as bar:
         for uid in uids:
-            edges = parser.parseEdges(data_dir / f"{uid}.edges")
-            featNames = parser.parseFeatNames(data_dir / f"{uid}.featnames")
-            userFeatures = parser.mapFeatsToUser(data_dir / f"{uid}.feat", featNames)
-            egoFeatures = parser.mapFeatsToUser(data_dir / f"{uid}.egofeat", featNames, uid)
-            circles = parser.parseCircles(data_dir / f"{uid}.circles")
-            db.ingestEgoNetwork(uid, edges, [(i, v) for i, v in featNames.values()], userFeatures, egoFeatures, circles)
+            if batch_bytes is not None:
+                stream = parser.EgoStream(data_dir, uid, batch_bytes)
+                db.ingestEgoStream(uid, stream)
+                record_ego(db, data_dir, uid, checksums[uid], manifest.streamRowCounts(stream))
+            else:
+                network = parser.parseEgoNetwork(data_dir, uid)
+                db.ingestEgoNetwork(uid, *network)
+                record_ego(db, data_dir, uid, checksums[uid], manifest.rowCounts(*network))
+            bar()
+
+def import_data_async(db, data_dir: Path, uids: list[str], checksums: dict[str, dict[str, str]], max_batches: int):
+    print(f"Importing dataset to Neo4J and PostgreSQL with up to {max_batches} batches in flight...")
+    with alive_bar(len(uids)) as bar:
+        asyncio.run(pipeline.importDataAsync(db, data_dir, uids, checksums, max_batches, on_done=bar))
+
+def import_data_changes(db, data_dir: Path, changed: list[str], finished: dict[str, dict[str, str]], checksums: dict[str, dict[str, str]]):
+    """
+    Re-ingests egos whose files changed, writing only the rows added or
+    removed since the snapshot of the files they were last ingested from.
+    Without a snapshot the whole ego is ingested again, which adds the new
+    rows but cannot remove the old ones. The diffs are taken first, so that
+    the rows they remove are looked up in the other egos in a single pass.
+    """
+    uids = parser.getUids(data_dir)
+    diffs = []
+
+    print(f"Re-ingesting {len(changed)} changed egos...")
+    with alive_bar(len(changed)) as bar:
+        for uid in changed:
+            network = parser.parseEgoNetwork(data_dir, uid)
+            old = manifest.parseSnapshot(uid, finished[uid])
+
+            if old is None:
+                print(f"No snapshot of ego {uid}, ingesting it again in full")
+                db.ingestEgoNetwork(uid, *network)
+                record_ego(db, data_dir, uid, checksums[uid], manifest.rowCounts(*network))
+                bar()
+            else:
+                diffs.append((manifest.EgoDiff(uid, old, network), manifest.rowCounts(*network)))
+
+        manifest.findShared(data_dir, [diff for diff, _ in diffs], uids)
+
+        for diff, row_counts in diffs:
+            db.ingestEgoDiff(diff)
+            record_ego(db, data_dir, diff.ego_id, checksums[diff.ego_id], row_counts)
             bar()
 
+def import_data_parallel(
+    db,
+    data_dir: Path,
+    uids: list[str],
+    checksums: dict[str, dict[str, str]],
+    workers: int,
+    batch_bytes: int | None = None,
+    max_retries: int = 5
+):
+    """
+    Parses egos in a process pool and ingests them in a thread pool,
+    each thread writing through its own db.worker().
+    At most 2 * workers parsed egos wait for ingestion at any time.
+    When streaming (batch_bytes is set), each thread parses its own ego
+    batch by batch and the process pool is not used.
+    """
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def ingest(uid, network):
+        if not hasattr(local, "db"):
+            local.db = db.worker()
+            with handles_lock:
+                handles.append(local.db)
+
+        # Egos sharing users can deadlock each other, retry those
+        for attempt in range(max_retries):
+            try:
+                if network is None:
+                    stream = parser.EgoStream(data_dir, uid, batch_bytes)
+                    local.db.ingestEgoStream(uid, stream)
+                    row_counts = manifest.streamRowCounts(stream)
+                else:
+                    local.db.ingestEgoNetwork(uid, *network)
+                    row_counts = manifest.rowCounts(*network)
+                break
+            except Exception as e:
+                if attempt == max_retries - 1 or not local.db.retryable(e):
+                    raise
+
+        record_ego(local.db, data_dir, uid, checksums[uid], row_counts)
+
+    print(f"Importing dataset to Neo4J and PostgreSQL with {workers} workers...")
+    try:
+        with ProcessPoolExecutor(workers) as parse_pool, \
+             ThreadPoolExecutor(workers) as write_pool, \
+             alive_bar(len(uids)) as bar:
+            pending_uids = iter(uids)
+            parsing = {}
+            writing = set()
+
+            def parse_next():
+                uid = next(pending_uids, None)
+                if uid is None:
+                    return
+                if batch_bytes is not None:
+                    writing.add(write_pool.submit(ingest, uid, None))
+                else:
+                    parsing[parse_pool.submit(parser.parseEgoNetwork, data_dir, uid)] = uid
+
+            for _ in range(workers if batch_bytes is not None else 2 * workers):
+                parse_next()
+
+            while parsing or writing:
+                done, _ = wait([*parsing, *writing], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in parsing:
+                        uid = parsing.pop(future)
+                        writing.add(write_pool.submit(ingest, uid, future.result()))
+                    else:
+                        writing.remove(future)
+                        future.result()
+                        bar()
+                        parse_next()
+    finally:
+        for handle in handles:
+            if handle is not db:
+                handle.close()
+
+def report_regressions(args, run_id: str | None = None):
+    """
+    Writes regression_report.csv for run_id, the latest run by default,
+    prints the queries that regressed and plots the history.
+    """
+    report = history.regression_report(args.history, run_id, args.regression_threshold, args.baseline_runs)
+    report.to_csv("regression_report.csv", index=False)
+    if not report.empty and report["baseline_runs"].max() == 0:
+        print("No earlier run of the same configuration to compare with")
+    elif not report.empty:
+        for r in report[report["regressed"]].itertuples():
+            print(
+                f"{r.query} on {r.db} regressed: {r.median_sec:.4f}s against a baseline of {r.baseline_sec:.4f}s "
+                f"({r.change:+.0%}, p={r.p_value:.2f})"
+            )
+    plots.plot_history(args.history)
+
 if __name__ == "__main__":
     if not load_dotenv(join(dirname(__file__), '.env')):
         print("Unable to get .env file. Is it present?")
@@ -85,9 +430,20 @@ if __name__ == "__main__":
         exit()
 
     data_dir = Path("./gplus")
+    batch_bytes = None
+    if args.memory_limit is not None:
+        batch_bytes = parser.batchBytesFor(args.memory_limit * 2**20, args.workers)
 
     if "data-download" in args.segments:
-        check_dataset(data_dir)
+        check_dataset(data_dir, args.download_workers, args.dataset_sha256)
+
+    if "data-cache" in args.segments:
+        import cache
+        if cache.isFresh(data_dir):
+            print("Dataset cache is up to date!")
+        else:
+            print("Compiling dataset cache...")
+            cache.compileCache(data_dir)
 
     n4ji = None
     psql = None
@@ -101,8 +457,10 @@ if __name__ == "__main__":
             pg_user = str(getenv("PG_USER"))
             pg_pw = str(getenv("PG_PW"))
             pg_db = str(getenv("PG_DB"))
-            psql = ingestor.PSQLIngestor(pg_user, pg_pw, pg_url, pg_port, pg_db)
-            import_data(psql, data_dir)
+            psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+            )
+            import_data(psql, data_dir, args.workers, batch_bytes, args.async_batches)
 
         if args.db in ("n", "b"):
             n4j_url = str(getenv("N4J_URL"))
@@ -110,8 +468,8 @@ if __name__ == "__main__":
             n4j_pw = str(getenv("N4J_PW"))
             n4j_db = str(getenv("N4J_DB"))
             
-            n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db)
-            import_data(n4ji, data_dir)
+            n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db, args.n4j_load, args.workers)
+            import_data(n4ji, data_dir, args.workers, batch_bytes, args.async_batches)
         
     if "metrics" in args.segments:
         print("Running metrics on database...")
@@ -122,7 +480,9 @@ if __name__ == "__main__":
                 pg_user = str(getenv("PG_USER"))
                 pg_pw = str(getenv("PG_PW"))
                 pg_db = str(getenv("PG_DB"))
-                psql = ingestor.PSQLIngestor(pg_user, pg_pw, pg_url, pg_port, pg_db)
+                psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                    pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+                )
 
         if args.db in ("n", "b"):
             if n4ji is None:
@@ -130,11 +490,155 @@ if __name__ == "__main__":
                 n4j_user = str(getenv("N4J_USER"))
                 n4j_pw = str(getenv("N4J_PW"))
                 n4j_db = str(getenv("N4J_DB"))
-                n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db)
+                n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db, args.n4j_load, args.workers)
 
-        benchmark.run_metrics(psql, n4ji)
+        ref = reference.ReferenceEngine(data_dir) if args.reference else None
+        info = history.run_info(psql, n4ji, args.warmup, args.iterations, args.cold_cmd is not None, args.result_format)
+        benchmark.run_metrics(
+            psql, n4ji, args.warmup, args.iterations, args.cold_cmd, ref, args.analytics, args.result_format
+        )
+        run_id = history.record_run(args.history, info)
+        report_regressions(args, run_id)
+        if psql is not None:
+            print(benchmark.run_size_metrics(psql))
         plots.plot_metrics() 
 
+    if "load-metrics" in args.segments:
+        print("Running load metrics on database...")
+        if args.db in ("p", "b"):
+            if psql is None:
+                pg_url = str(getenv("PG_URL"))
+                pg_port = int(getenv("PG_PORT"))
+                pg_user = str(getenv("PG_USER"))
+                pg_pw = str(getenv("PG_PW"))
+                pg_db = str(getenv("PG_DB"))
+                psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                    pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+                )
+
+            print(benchmark.run_load_metrics(psql, data_dir, list(psql.LOAD_MODES)))
+
+        if args.db in ("n", "b"):
+            if n4ji is None:
+                n4j_url = str(getenv("N4J_URL"))
+                n4j_user = str(getenv("N4J_USER"))
+                n4j_pw = str(getenv("N4J_PW"))
+                n4j_db = str(getenv("N4J_DB"))
+                n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db, args.n4j_load, args.workers)
+
+            print(benchmark.run_load_metrics(n4ji, data_dir, list(ingestor.Neo4JIngestor.LOAD_MODES)))
+
+    if "offline-load-metrics" in args.segments:
+        print("Running offline load metrics...")
+        # The importer overwrites its target, which must not be running: never N4J_DB itself
+        target = args.neo4j_admin_db or f"{getenv('N4J_DB')}-offline"
+        print(benchmark.run_offline_load_metrics(data_dir, target, args.neo4j_admin))
+
+    if "memory-metrics" in args.segments:
+        print("Running memory metrics on database...")
+        memory_batch_bytes = batch_bytes or parser.batchBytesFor(256 * 2**20)
+
+        if args.db in ("p", "b"):
+            if psql is None:
+                pg_url = str(getenv("PG_URL"))
+                pg_port = int(getenv("PG_PORT"))
+                pg_user = str(getenv("PG_USER"))
+                pg_pw = str(getenv("PG_PW"))
+                pg_db = str(getenv("PG_DB"))
+                psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                    pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+                )
+
+            print(benchmark.run_memory_metrics(psql, data_dir, memory_batch_bytes))
+
+        if args.db in ("n", "b"):
+            if n4ji is None:
+                n4j_url = str(getenv("N4J_URL"))
+                n4j_user = str(getenv("N4J_USER"))
+                n4j_pw = str(getenv("N4J_PW"))
+                n4j_db = str(getenv("N4J_DB"))
+                n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db, args.n4j_load, args.workers)
+
+            print(benchmark.run_memory_metrics(n4ji, data_dir, memory_batch_bytes))
+
+    if "throughput-metrics" in args.segments:
+        print("Running throughput metrics on database...")
+        levels = [int(k) for k in args.clients.split(",")]
+        csv_paths = []
+        if args.db in ("p", "b"):
+            if psql is None:
+                pg_url = str(getenv("PG_URL"))
+                pg_port = int(getenv("PG_PORT"))
+                pg_user = str(getenv("PG_USER"))
+                pg_pw = str(getenv("PG_PW"))
+                pg_db = str(getenv("PG_DB"))
+                psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                    pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+                )
+
+            print(benchmark.run_throughput_metrics(psql, levels, args.duration))
+            csv_paths.append(f"throughput_results_{psql.label}.csv")
+
+        if args.db in ("n", "b"):
+            if n4ji is None:
+                n4j_url = str(getenv("N4J_URL"))
+                n4j_user = str(getenv("N4J_USER"))
+                n4j_pw = str(getenv("N4J_PW"))
+                n4j_db = str(getenv("N4J_DB"))
+                n4ji = ingestor.Neo4JIngestor(n4j_url, n4j_user, n4j_pw, n4j_db, args.n4j_load, args.workers)
+
+            print(benchmark.run_throughput_metrics(n4ji, levels, args.duration))
+            csv_paths.append(f"throughput_results_{n4ji.label}.csv")
+
+        plots.plot_throughput(csv_paths)
+
+    if "index-metrics" in args.segments:
+        print("Running index metrics on database...")
+        if args.db in ("p", "b"):
+            if psql is None:
+                pg_url = str(getenv("PG_URL"))
+                pg_port = int(getenv("PG_PORT"))
+                pg_user = str(getenv("PG_USER"))
+                pg_pw = str(getenv("PG_PW"))
+                pg_db = str(getenv("PG_DB"))
+                psql = ingestor.PSQL_SCHEMAS[args.pg_schema](
+                    pg_user, pg_pw, pg_url, pg_port, pg_db, args.pg_load, args.pg_aggregates, args.pg_indexes
+                )
+
+            build, speedup = benchmark.run_index_metrics(psql, "workload", args.warmup, args.iterations)
+            print(build)
+            print(speedup)
+            plots.plot_index_speedup(f"index_speedup_{psql.label}.csv")
+        else:
+            print("Index profiles only apply to PostgreSQL")
+
+    if "partition-metrics" in args.segments:
+        print("Running partition metrics on database...")
+        if args.db in ("p", "b"):
+            pg_url = str(getenv("PG_URL"))
+            pg_port = int(getenv("PG_PORT"))
+            pg_user = str(getenv("PG_USER"))
+            pg_pw = str(getenv("PG_PW"))
+            pg_db = str(getenv("PG_DB"))
+            # Compared with the text schema, both are expected to hold the same dataset
+            partitioned = ingestor.PartitionedPSQLIngestor(pg_user, pg_pw, pg_url, pg_port, pg_db)
+            text = ingestor.PSQLIngestor(pg_user, pg_pw, pg_url, pg_port, pg_db)
+
+            partition_results, comparison = benchmark.run_partition_metrics(partitioned, text, args.warmup, args.iterations)
+            print(partition_results)
+            print(comparison)
+            partitioned.close()
+            text.close()
+        else:
+            print("Partitioning only applies to PostgreSQL")
+
+    if "history-report" in args.segments:
+        print("Reporting on benchmark history...")
+        if Path(args.history).exists():
+            report_regressions(args)
+        else:
+            print(f"No benchmark history at {args.history}")
+
     if n4ji is not None:
         n4ji.close()
 
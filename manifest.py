@@ -0,0 +1,156 @@
+"""
+Bookkeeping for resumable ingestion. Each backend keeps an ingest manifest
+with one entry per finished ego: the checksums of its source files, the
+number of rows of each kind and when it completed. The files an ego was
+ingested from are kept in SNAPSHOT_DIR under their checksum, so that an ego
+whose files changed can be diffed against what the backend holds.
+"""
+
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+import parser
+
+SNAPSHOT_DIR = "ingest_snapshots"
+EGO_SUFFIXES = (".edges", ".feat", ".featnames", ".egofeat", ".circles")
+
+def checksums(data_dir: Path, uid: str) -> dict[str, str]:
+    """
+    sha256 of each of the ego's files, by suffix.
+    """
+    sums: dict[str, str] = {}
+    for suffix in EGO_SUFFIXES:
+        with open(data_dir / f"{uid}{suffix}", "rb") as f:
+            sums[suffix] = hashlib.file_digest(f, "sha256").hexdigest()
+    return sums
+
+def rowCounts(
+    edges: list[tuple[str, str]],
+    feats: list[tuple[str, str]],
+    node_features: dict[str, list[str]],
+    ego_features: dict[str, list[str]],
+    circles: dict[str, list[str]]
+) -> dict[str, int]:
+    return {
+        "users": len(node_features),
+        "edges": len(edges),
+        "features": len(feats),
+        "node_features": sum(len(fs) for fs in node_features.values()) + sum(len(fs) for fs in ego_features.values()),
+        "circles": len(circles),
+        "memberships": sum(len(members) for members in circles.values()),
+    }
+
+def streamRowCounts(stream: parser.EgoStream) -> dict[str, int]:
+    """
+    rowCounts of a streamed ego, counted batch by batch.
+    """
+    counts = dict.fromkeys(("users", "edges", "features", "node_features", "circles", "memberships"), 0)
+    counts["features"] = len(stream.features())
+    counts["node_features"] = sum(len(fs) for fs in stream.ego_features().values())
+
+    for batch in stream.node_features():
+        counts["users"] += len(batch)
+        counts["node_features"] += sum(len(fs) for fs in batch.values())
+    for batch in stream.edges():
+        counts["edges"] += len(batch)
+    for batch in stream.circles():
+        counts["circles"] += len(batch)
+        counts["memberships"] += sum(len(members) for members in batch.values())
+
+    return counts
+
+def snapshot(data_dir: Path, uid: str, sums: dict[str, str], snap_dir: Path = Path(SNAPSHOT_DIR)):
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    for suffix, digest in sums.items():
+        target = snap_dir / digest
+        if not target.exists():
+            shutil.copyfile(data_dir / f"{uid}{suffix}", target)
+
+def parseSnapshot(uid: str, sums: dict[str, str], snap_dir: Path = Path(SNAPSHOT_DIR)):
+    """
+    Parses the ego as it was when sums were recorded,
+    or returns None if a snapshot file is missing.
+    """
+    if not all((snap_dir / digest).exists() for digest in sums.values()):
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for suffix, digest in sums.items():
+            (Path(tmp) / f"{uid}{suffix}").symlink_to((snap_dir / digest).resolve())
+        return parser.parseEgoNetwork(Path(tmp), uid, use_cache=False)
+
+class EgoDiff:
+    """
+    Rows added to and removed from an ego between two parses of its files.
+    The shared_* sets hold removed users, edges and node features that other
+    egos still assert (see findShared); backends that store those rows once
+    for all egos must keep them.
+    """
+    def __init__(self, ego_id: str, old: tuple, new: tuple) -> None:
+        old_edges, _, old_nf, old_ef, old_circles = old
+        edges, feats, node_features, ego_features, circles = new
+
+        self.ego_id = ego_id
+        self.feats = feats
+
+        self.added_users = sorted(node_features.keys() - old_nf.keys())
+        self.removed_users = sorted(old_nf.keys() - node_features.keys())
+
+        self.added_edges = sorted(set(edges) - set(old_edges))
+        self.removed_edges = sorted(set(old_edges) - set(edges))
+
+        new_pairs = self.node_feature_pairs(node_features, ego_features)
+        old_pairs = self.node_feature_pairs(old_nf, old_ef)
+        self.added_node_features = sorted(new_pairs - old_pairs)
+        self.removed_node_features = sorted(old_pairs - new_pairs)
+
+        self.added_circles = sorted(circles.keys() - old_circles.keys())
+        self.removed_circles = sorted(old_circles.keys() - circles.keys())
+
+        new_members = {(cid, uid) for cid, members in circles.items() for uid in members}
+        old_members = {(cid, uid) for cid, members in old_circles.items() for uid in members}
+        self.added_memberships = sorted(new_members - old_members)
+        self.removed_memberships = sorted(old_members - new_members)
+
+        self.shared_users: set[str] = set()
+        self.shared_edges: set[tuple[str, str]] = set()
+        self.shared_node_features: set[tuple[str, str]] = set()
+
+    @staticmethod
+    def node_feature_pairs(node_features: dict[str, list[str]], ego_features: dict[str, list[str]]) -> set[tuple[str, str]]:
+        return {
+            (node_id, name)
+            for features in (node_features, ego_features)
+            for node_id, names in features.items()
+            for name in names
+        }
+
+    def removes(self) -> bool:
+        return bool(self.removed_users or self.removed_edges or self.removed_node_features)
+
+def findShared(data_dir: Path, diffs: list[EgoDiff], uids: list[str]):
+    """
+    Fills the shared_* sets of the diffs that remove anything. Every ego is
+    parsed once, whatever the number of diffs, and the rows it asserts are
+    matched against the removals of all of them at once.
+    """
+    diffs = [diff for diff in diffs if diff.removes()]
+    if not diffs:
+        return
+
+    users = set().union(*(diff.removed_users for diff in diffs))
+    edges = set().union(*(diff.removed_edges for diff in diffs))
+    pairs = set().union(*(diff.removed_node_features for diff in diffs))
+
+    for uid in uids:
+        o_edges, _, o_nf, o_ef, _ = parser.parseEgoNetwork(data_dir, uid)
+        found_users = users.intersection(o_nf.keys())
+        found_edges = edges.intersection(o_edges)
+        found_pairs = pairs.intersection(EgoDiff.node_feature_pairs(o_nf, o_ef))
+
+        for diff in diffs:
+            if diff.ego_id != uid:
+                diff.shared_users.update(found_users.intersection(diff.removed_users))
+                diff.shared_edges.update(found_edges.intersection(diff.removed_edges))
+                diff.shared_node_features.update(found_pairs.intersection(diff.removed_node_features))
@@ -1,6 +1,14 @@
 from base64 import encode
 from collections import defaultdict
+from collections.abc import Callable, Iterator
 from pathlib import Path
+from typing import TypeVar
+
+T = TypeVar("T")
+
+# Rough ratio between the memory a parsed batch ends up holding (Python strings,
+# tuples and the ingestor's payload dicts) and the bytes of input it was read from
+BATCH_EXPANSION = 20
 
 def getUids(path: Path) -> list[str]:
     uids: list[str] = []
@@ -73,3 +81,107 @@ def parseCircles(path: Path) -> dict[str, list[str]]:
                 circles[circle].append(node_id)
     return circles
 
+
+def parseEgoNetwork(path: Path, uid: str, use_cache: bool = True) -> tuple[
+    list[tuple[str, str]],
+    list[tuple[str, str]],
+    dict[str, list[str]],
+    dict[str, list[str]],
+    dict[str, list[str]]
+]:
+    """
+    Parses every file of a single ego network and returns the arguments
+    expected by ingestEgoNetwork, in order:
+    (edges, feats, node_features, ego_features, circles)
+    Reads from the binary cache instead when it is up to date.
+    """
+    if use_cache:
+        import cache
+        if cache.isFresh(path):
+            return cache.loadEgoNetwork(cache.cacheDir(path), uid)
+
+    edges = parseEdges(path / f"{uid}.edges")
+    featNames = parseFeatNames(path / f"{uid}.featnames")
+    userFeatures = mapFeatsToUser(path / f"{uid}.feat", featNames)
+    egoFeatures = mapFeatsToUser(path / f"{uid}.egofeat", featNames, uid)
+    circles = parseCircles(path / f"{uid}.circles")
+
+    return edges, [(i, v) for i, v in featNames.values()], userFeatures, egoFeatures, circles
+
+def batchBytesFor(memory_limit: int, workers: int = 1) -> int:
+    """
+    Input bytes per batch that keep every worker's batches under memory_limit bytes.
+    """
+    return max(memory_limit // (BATCH_EXPANSION * workers), 1)
+
+def iterBatches(path: Path, parse_line: Callable[[str], T], batch_bytes: int) -> Iterator[list[T]]:
+    """
+    Yields the parsed lines of a file in batches of roughly batch_bytes of input.
+    """
+    batch: list[T] = []
+    size = 0
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            batch.append(parse_line(line))
+            size += len(line)
+            if size >= batch_bytes:
+                yield batch
+                batch = []
+                size = 0
+
+    if batch:
+        yield batch
+
+def iterEdges(path: Path, batch_bytes: int) -> Iterator[list[tuple[str, str]]]:
+    def parse_line(line: str) -> tuple[str, str]:
+        src, dst = line.strip().split()
+        return (src, dst)
+
+    return iterBatches(path, parse_line, batch_bytes)
+
+def iterFeatsToUser(path: Path, feat_names: dict[int, tuple[str, str]], batch_bytes: int) -> Iterator[dict[str, list[str]]]:
+    """
+    Streaming mapFeatsToUser, yields {userId: [list_of_associated_features]} batches.
+    """
+    def parse_line(line: str) -> tuple[str, list[str]]:
+        parts = line.rstrip().split()
+        return parts[0], [feat_names[i][1] for i, v in enumerate(parts[1:]) if v == "1"]
+
+    for batch in iterBatches(path, parse_line, batch_bytes):
+        yield dict(batch)
+
+def iterCircles(path: Path, batch_bytes: int) -> Iterator[dict[str, list[str]]]:
+    def parse_line(line: str) -> tuple[str, list[str]]:
+        parts = line.strip().split()
+        return parts[0], parts[1:]
+
+    for batch in iterBatches(path, parse_line, batch_bytes):
+        yield dict(batch)
+
+class EgoStream:
+    """
+    Lazily parsed ego network. Feature names and ego features are small and
+    read eagerly, users, circles and edges are read in batches of about
+    batch_bytes of input each time they are iterated.
+    """
+    def __init__(self, path: Path, uid: str, batch_bytes: int) -> None:
+        self.path = path
+        self.uid = uid
+        self.batch_bytes = batch_bytes
+        self.feat_names = parseFeatNames(path / f"{uid}.featnames")
+
+    def features(self) -> list[tuple[str, str]]:
+        return [(i, v) for i, v in self.feat_names.values()]
+
+    def node_features(self) -> Iterator[dict[str, list[str]]]:
+        return iterFeatsToUser(self.path / f"{self.uid}.feat", self.feat_names, self.batch_bytes)
+
+    def ego_features(self) -> dict[str, list[str]]:
+        return mapFeatsToUser(self.path / f"{self.uid}.egofeat", self.feat_names, self.uid)
+
+    def circles(self) -> Iterator[dict[str, list[str]]]:
+        return iterCircles(self.path / f"{self.uid}.circles", self.batch_bytes)
+
+    def edges(self) -> Iterator[list[tuple[str, str]]]:
+        return iterEdges(self.path / f"{self.uid}.edges", self.batch_bytes)
@@ -0,0 +1,170 @@
+"""
+Asyncio ingestion pipeline. Egos are parsed in a process pool while the
+batches of the egos before them are written through the async drivers:
+
+    parse (process pool) -> parsed queue -> stages (egoStages) -> batch writers
+
+At most max_egos parsed egos wait for or are being written, and at most
+max_batches batches are in flight per backend, so the client never buffers
+more than that while the database always has batches queued.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import LiteralString
+import parser
+import manifest
+from ingestor import Neo4JIngestor, PSQLIngestor
+
+class AsyncPSQLWriter:
+    """
+    A pool of async connections, one per batch in flight.
+    """
+    def __init__(self, db: PSQLIngestor, size: int, max_retries: int = 5) -> None:
+        self.db = db
+        self.size = size
+        self.max_retries = max_retries
+        self.pool: asyncio.Queue = asyncio.Queue()
+
+    async def open(self):
+        from psycopg import AsyncConnection
+        for _ in range(self.size):
+            self.pool.put_nowait(await AsyncConnection.connect(**self.db.connect_args))
+
+    async def close(self):
+        while not self.pool.empty():
+            await self.pool.get_nowait().close()
+
+    async def write(self, query: LiteralString, rows: list):
+        """
+        Batches of concurrent egos insert the same users and can deadlock
+        each other, those are retried.
+        """
+        from psycopg import errors
+        conn = await self.pool.get()
+        try:
+            for attempt in range(self.max_retries):
+                try:
+                    async with conn.cursor() as cur:
+                        await cur.executemany(query, rows)
+                    await conn.commit()
+                    return
+                except (errors.DeadlockDetected, errors.SerializationFailure):
+                    await conn.rollback()
+                    if attempt == self.max_retries - 1:
+                        raise
+        finally:
+            self.pool.put_nowait(conn)
+
+class AsyncNeo4jWriter:
+    """
+    An async driver, each batch in its own session and managed transaction,
+    which retries transient errors such as deadlocks.
+    """
+    def __init__(self, db: Neo4JIngestor, size: int) -> None:
+        self.db = db
+        self.size = size
+
+    async def open(self):
+        from neo4j import AsyncGraphDatabase
+        args = self.db.driver_args
+        self.driver = AsyncGraphDatabase.driver(
+            args["uri"], auth=args["auth"], database=args["database"], max_connection_pool_size=self.size
+        )
+
+    async def close(self):
+        await self.driver.close()
+
+    @staticmethod
+    async def write_rows(tx, query: LiteralString, rows: list):
+        await (await tx.run(query, rows = rows)).consume()
+
+    async def write(self, query: LiteralString, rows: list):
+        async with self.driver.session() as session:
+            await session.execute_write(self.write_rows, query, rows)
+
+def asyncWriter(db: PSQLIngestor | Neo4JIngestor, size: int) -> AsyncPSQLWriter | AsyncNeo4jWriter:
+    if isinstance(db, PSQLIngestor):
+        return AsyncPSQLWriter(db, size)
+    return AsyncNeo4jWriter(db, size)
+
+async def writeStages(
+    db: PSQLIngestor | Neo4JIngestor,
+    writer: AsyncPSQLWriter | AsyncNeo4jWriter,
+    slots: asyncio.Semaphore,
+    stages: list[list[tuple[LiteralString, list]]]
+):
+    """
+    Writes an ego's stages in order, the batches of a stage concurrently.
+    A slot is taken before a batch is submitted and given back once it is
+    written, so submitting blocks while max_batches are in flight. Batch
+    sizes come from the ingestor's AdaptiveBatcher.
+    """
+    async def write(query: LiteralString, chunk: list, size: int):
+        try:
+            start = time.perf_counter()
+            await writer.write(query, chunk)
+            db.batcher.observe(query, size, len(chunk), time.perf_counter() - start)
+        finally:
+            slots.release()
+
+    for stage in stages:
+        tasks = []
+        for query, rows in stage:
+            start = 0
+            while start < len(rows):
+                size = db.batcher.size(query)
+                await slots.acquire()
+                tasks.append(asyncio.create_task(write(query, rows[start:start + size], size)))
+                start += size
+        await asyncio.gather(*tasks)
+
+async def importDataAsync(
+    db: PSQLIngestor | Neo4JIngestor,
+    data_dir: Path,
+    uids: list[str],
+    checksums: dict[str, dict[str, str]],
+    max_batches: int = 8,
+    max_egos: int = 2,
+    on_done=None
+):
+    """
+    Ingests uids through the pipeline and records each finished ego in the
+    ingest manifest. on_done is called after each ego, e.g. to advance a
+    progress bar. The steps that run on the ingestor's own connection
+    (egoStages, finish_ego, recordEgo) take turns, so that one ego's
+    commit never lands between another ego's statements.
+    """
+    loop = asyncio.get_running_loop()
+    parsed: asyncio.Queue = asyncio.Queue(maxsize=max_egos)
+    slots = asyncio.Semaphore(max_batches)
+    db_lock = asyncio.Lock()
+    writer = asyncWriter(db, max_batches)
+    await writer.open()
+
+    async def parse_all(pool: ProcessPoolExecutor):
+        for uid in uids:
+            await parsed.put((uid, await loop.run_in_executor(pool, parser.parseEgoNetwork, data_dir, uid)))
+        for _ in range(max_egos):
+            await parsed.put(None)
+
+    async def write_all():
+        while (item := await parsed.get()) is not None:
+            uid, network = item
+            async with db_lock:
+                stages = await asyncio.to_thread(db.egoStages, uid, *network)
+            await writeStages(db, writer, slots, stages)
+            await asyncio.to_thread(manifest.snapshot, data_dir, uid, checksums[uid])
+            async with db_lock:
+                await asyncio.to_thread(db.finish_ego, uid)
+                await asyncio.to_thread(db.recordEgo, uid, checksums[uid], manifest.rowCounts(*network))
+            if on_done is not None:
+                on_done()
+
+    try:
+        with ProcessPoolExecutor(max(max_egos, 1)) as pool:
+            await asyncio.gather(parse_all(pool), *[write_all() for _ in range(max_egos)])
+    finally:
+        await writer.close()
@@ -58,3 +58,115 @@ def plot_metrics(csv_path="benchmark_results.csv", out_dir="plots"):
     fig.tight_layout()
     save_plot(fig, "rows_vs_time.png", out_dir)
 
+    # --- Time split into phases ---
+    phases = ["server_sec", "client_sec", "frame_sec", "write_sec"]
+    if set(phases) <= set(df.columns):
+        dbs = sorted(df["db"].unique())
+        # The last phase writes the result file, streamed unless it is a CSV
+        formats = set(df["result_path"].str.rsplit(".", n=1).str[-1]) if "result_path" in df.columns else {"csv"}
+        write_label = "CSV write" if formats == {"csv"} else "write/export"
+        fig, axes = plt.subplots(1, len(dbs), figsize=(6 * len(dbs), 5), sharey=True, squeeze=False)
+        for ax, db in zip(axes[0], dbs):
+            sub = df[df["db"] == db]
+            group = sub.set_index(sub["query"].str.split("_").str[0])[phases]
+            group.columns = ["server", "client fetch", "DataFrame", write_label]
+            group.sort_index().plot.bar(stacked=True, ax=ax, legend=ax is axes[0][0])
+            ax.set_title(db)
+            ax.set_xlabel("query")
+        axes[0][0].set_ylabel("Time (seconds)")
+        fig.suptitle("Query Time by Phase (medians)")
+        fig.tight_layout()
+        save_plot(fig, "time_phases.png", out_dir)
+
+    # --- Median per query with confidence interval ---
+    if "ci_low_sec" in df.columns:
+        df["query_id"] = df["query"].str.split("_").str[0]
+        fig, ax = plt.subplots(figsize=(10, 5))
+        width = 0.8 / df["db"].nunique()
+        query_ids = sorted(df["query_id"].unique())
+        for i, (db, group) in enumerate(df.groupby("db")):
+            group = group.set_index("query_id").reindex(query_ids)
+            x = [q + i * width for q in range(len(query_ids))]
+            ax.bar(
+                x,
+                group["median_sec"],
+                width,
+                yerr=[group["median_sec"] - group["ci_low_sec"], group["ci_high_sec"] - group["median_sec"]],
+                capsize=3,
+                label=db
+            )
+        ax.set_xticks([q + width * (df["db"].nunique() - 1) / 2 for q in range(len(query_ids))], query_ids)
+        ax.set_title("Median Query Time with 95% Confidence Interval")
+        ax.set_ylabel("Time (seconds)")
+        ax.legend()
+        fig.tight_layout()
+        save_plot(fig, "median_ci_per_query.png", out_dir)
+
+
+def plot_throughput(csv_paths, out_dir="plots"):
+    df = pd.concat([pd.read_csv(p) for p in csv_paths])
+
+    # --- Throughput vs latency, one point per concurrency level ---
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    for db, group in df.groupby("db"):
+        group = group.sort_values("clients")
+        for ax, col in zip(axes, ["p50_sec", "p95_sec"]):
+            ax.plot(group["qps"], group[col], marker="o", label=db)
+            for row in group.itertuples():
+                ax.annotate(f"K={row.clients}", (row.qps, getattr(row, col)), textcoords="offset points", xytext=(4, 4), fontsize=8)
+    for ax, title in zip(axes, ["Median", "p95"]):
+        ax.set_title(f"Throughput vs {title} Latency")
+        ax.set_xlabel("Queries per second")
+        ax.set_ylabel("Latency (seconds)")
+        ax.legend()
+    fig.tight_layout()
+    save_plot(fig, "qps_vs_latency.png", out_dir)
+
+
+def plot_index_speedup(csv_path, out_dir="plots"):
+    df = pd.read_csv(csv_path)
+
+    # --- Per-query speedup of the index profile ---
+    fig, ax = plt.subplots(figsize=(10, 5))
+    sns.barplot(data=df, x="query", y="speedup", ax=ax)
+    ax.axhline(1.0, color="black", linewidth=1, linestyle="--")
+    ax.set_title(f"Speedup with the {df['profile'].iloc[0]} Index Profile")
+    ax.set_ylabel("Median without / with indexes")
+    ax.tick_params(axis="x", rotation=45)
+    fig.tight_layout()
+    save_plot(fig, f"index_speedup_{df['db'].iloc[0]}.png", out_dir)
+
+
+def plot_history(history_path="benchmark_history.sqlite", report_csv="regression_report.csv", out_dir="plots"):
+    from history import load_history
+    df = load_history(history_path)
+    df["run"] = df.groupby("run_id", sort=False).ngroup()
+
+    # --- Median per query across runs, one panel per database ---
+    dbs = sorted(df["db"].unique())
+    fig, axes = plt.subplots(len(dbs), 1, figsize=(10, 4 * len(dbs)), squeeze=False)
+    for ax, db in zip(axes[:, 0], dbs):
+        sns.lineplot(data=df[df["db"] == db], x="run", y="median_sec", hue="query", marker="o", ax=ax)
+        ax.set_yscale("log")
+        ax.set_title(db)
+        ax.set_ylabel("Median time (seconds)")
+        ax.xaxis.get_major_locator().set_params(integer=True)
+        ax.legend(fontsize=7, bbox_to_anchor=(1.01, 1), loc="upper left")
+    axes[-1, 0].set_xlabel("Run")
+    fig.suptitle("Query Time Trend")
+    fig.tight_layout()
+    save_plot(fig, "history_trend.png", out_dir)
+
+    # --- Latest run against its rolling baseline ---
+    if Path(report_csv).exists():
+        report = pd.read_csv(report_csv).dropna(subset=["change"])
+        if not report.empty:
+            fig, ax = plt.subplots(figsize=(10, 5))
+            colors = report["regressed"].map({True: "tab:red", False: "tab:blue"})
+            ax.bar(report["db"] + " " + report["query"].str.split("_").str[0], report["change"] * 100, color=colors)
+            ax.axhline(0, color="black", linewidth=1)
+            ax.set_title("Change against Rolling Baseline (red: regressed)")
+            ax.set_ylabel("Median change (%)")
+            ax.tick_params(axis="x", rotation=90)
+            fig.tight_layout()
+            save_plot(fig, "history_regressions.png", out_dir)
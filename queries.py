@@ -86,9 +86,570 @@ POSTGRES_COMPLEX: dict[str, LiteralString] = {
         GROUP BY ego_id;
     """
 }
+# Same queries for the intkeys schema (IntKeyPSQLIngestor): aggregation and
+# joins run on integer keys, node ids are joined back in only for the output.
+POSTGRES_INT_SIMPLE: dict[str, LiteralString] = {
+    "S1_nodes_by_type": """
+        SELECT node_type, COUNT(*) FROM node GROUP BY node_type;
+    """,
+    "S2_users_per_ego": """
+        SELECT n.node_id AS ego_id, t.count
+        FROM (
+            SELECT ego_key, COUNT(*) FROM user_node GROUP BY ego_key
+        ) t
+        JOIN node n ON n.node_key = t.ego_key;
+    """,
+    "S3_edges_per_ego": """
+        SELECT n.node_id AS ego_id, t.count
+        FROM (
+            SELECT ego_key, COUNT(*) FROM edge GROUP BY ego_key
+        ) t
+        JOIN node n ON n.node_key = t.ego_key;
+    """,
+    "S4_circles_per_ego": """
+        SELECT n.node_id AS ego_id, t.count
+        FROM (
+            SELECT ego_key, COUNT(*) FROM circle GROUP BY ego_key
+        ) t
+        JOIN node n ON n.node_key = t.ego_key;
+    """,
+    "S5_avg_features_per_node": """
+        SELECT AVG(feature_count)
+        FROM (
+            SELECT node_key, COUNT(*) AS feature_count
+            FROM node_feature
+            GROUP BY node_key
+        ) t;
+    """,
+    "S6_top_features": """
+        SELECT fn.name, COUNT(*) AS usage_count
+        FROM node_feature nf
+        JOIN feature_name fn ON nf.feature_id = fn.feature_id
+        GROUP BY fn.name
+        ORDER BY usage_count DESC
+        LIMIT 10;
+    """
+}
+
+POSTGRES_INT_COMPLEX: dict[str, LiteralString] = {
+    "C1_avg_circle_size": """
+        SELECT n.node_id AS ego_id, t.avg
+        FROM (
+            SELECT c.ego_key, AVG(member_count)
+            FROM (
+                SELECT circle_id, COUNT(*) AS member_count
+                FROM circle_member
+                GROUP BY circle_id
+            ) cm
+            JOIN circle c ON cm.circle_id = c.circle_id
+            GROUP BY c.ego_key
+        ) t
+        JOIN node n ON n.node_key = t.ego_key;
+    """,
+    "C2_high_degree_users": """
+        SELECT s.node_id AS src_id, e.node_id AS ego_id, t.degree
+        FROM (
+            SELECT src_key, ego_key, COUNT(*) AS degree
+            FROM edge
+            GROUP BY src_key, ego_key
+            HAVING COUNT(*) > (
+                SELECT AVG(cnt)
+                FROM (
+                    SELECT COUNT(*) AS cnt
+                    FROM edge
+                    WHERE ego_key = edge.ego_key
+                    GROUP BY src_key
+                ) t
+            )
+        ) t
+        JOIN node s ON s.node_key = t.src_key
+        JOIN node e ON e.node_key = t.ego_key;
+    """,
+    "C3_feature_overlap": """
+        SELECT cm1.circle_id, COUNT(*)
+        FROM circle_member cm1
+        JOIN circle_member cm2
+          ON cm1.circle_id = cm2.circle_id
+         AND cm1.node_key < cm2.node_key
+        JOIN node_feature nf1 ON cm1.node_key = nf1.node_key
+        JOIN node_feature nf2
+          ON cm2.node_key = nf2.node_key
+         AND nf1.feature_id = nf2.feature_id
+        GROUP BY cm1.circle_id;
+    """,
+    "C4_triangle_proxy": """
+        SELECT n.node_id AS ego_id, t.two_hop_paths, t.distinct_sources, t.closure_potential
+        FROM (
+            SELECT ego_key,
+            COUNT(*) AS two_hop_paths,
+            COUNT(DISTINCT src_key) AS distinct_sources,
+            COUNT(*)::float / COUNT(DISTINCT src_key) AS closure_potential
+            FROM (
+                SELECT
+                    e1.ego_key,
+                    e1.src_key,
+                    e2.dst_key
+                FROM edge e1
+                JOIN edge e2
+                  ON e1.dst_key = e2.src_key
+                 AND e1.ego_key = e2.ego_key
+            ) t
+            GROUP BY ego_key
+        ) t
+        JOIN node n ON n.node_key = t.ego_key;
+    """
+}
+
+# The per-ego queries answered from the aggregate tables PSQLIngestor keeps
+# when built with aggregates=True, returning the same rows as the raw ones.
+POSTGRES_AGG_SIMPLE: dict[str, LiteralString] = {
+    "S2_users_per_ego": """
+        SELECT ego_id, user_count AS count FROM ego_stats WHERE user_count > 0;
+    """,
+    "S3_edges_per_ego": """
+        SELECT ego_id, edge_count AS count FROM ego_stats WHERE edge_count > 0;
+    """,
+    "S4_circles_per_ego": """
+        SELECT ego_id, circle_count AS count FROM ego_stats WHERE circle_count > 0;
+    """
+}
+
+POSTGRES_AGG_COMPLEX: dict[str, LiteralString] = {
+    "C1_avg_circle_size": """
+        SELECT ego_id, member_count::numeric / nonempty_circle_count AS avg
+        FROM ego_stats
+        WHERE nonempty_circle_count > 0;
+    """,
+    "C2_high_degree_users": """
+        SELECT src_id, ego_id, out_degree AS degree
+        FROM node_degree
+        WHERE out_degree > (
+            SELECT AVG(cnt)
+            FROM (
+                SELECT SUM(out_degree) AS cnt
+                FROM node_degree
+                GROUP BY src_id
+            ) t
+        );
+    """
+}
+
+POSTGRES_INT_AGG_SIMPLE: dict[str, LiteralString] = {
+    "S2_users_per_ego": """
+        SELECT n.node_id AS ego_id, s.user_count AS count
+        FROM ego_stats s
+        JOIN node n ON n.node_key = s.ego_key
+        WHERE s.user_count > 0;
+    """,
+    "S3_edges_per_ego": """
+        SELECT n.node_id AS ego_id, s.edge_count AS count
+        FROM ego_stats s
+        JOIN node n ON n.node_key = s.ego_key
+        WHERE s.edge_count > 0;
+    """,
+    "S4_circles_per_ego": """
+        SELECT n.node_id AS ego_id, s.circle_count AS count
+        FROM ego_stats s
+        JOIN node n ON n.node_key = s.ego_key
+        WHERE s.circle_count > 0;
+    """
+}
+
+POSTGRES_INT_AGG_COMPLEX: dict[str, LiteralString] = {
+    "C1_avg_circle_size": """
+        SELECT n.node_id AS ego_id, s.member_count::numeric / s.nonempty_circle_count AS avg
+        FROM ego_stats s
+        JOIN node n ON n.node_key = s.ego_key
+        WHERE s.nonempty_circle_count > 0;
+    """,
+    "C2_high_degree_users": """
+        SELECT s.node_id AS src_id, e.node_id AS ego_id, d.out_degree AS degree
+        FROM node_degree d
+        JOIN node s ON s.node_key = d.src_key
+        JOIN node e ON e.node_key = d.ego_key
+        WHERE d.out_degree > (
+            SELECT AVG(cnt)
+            FROM (
+                SELECT SUM(out_degree) AS cnt
+                FROM node_degree
+                GROUP BY src_key
+            ) t
+        );
+    """
+}
+
+# Single-ego variants of the per-ego edge queries. The ego is only known at
+# run time, so on the partitioned schema the other partitions are pruned by
+# the executor rather than the planner.
+POSTGRES_PRUNING: dict[str, LiteralString] = {
+    "P1_edges_of_one_ego": """
+        SELECT COUNT(*) FROM edge
+        WHERE ego_id = (SELECT MIN(node_id) FROM ego);
+    """,
+    "P2_degrees_in_one_ego": """
+        SELECT src_id, COUNT(*) AS degree
+        FROM edge
+        WHERE ego_id = (SELECT MIN(node_id) FROM ego)
+        GROUP BY src_id;
+    """,
+    "P3_two_hop_paths_in_one_ego": """
+        SELECT COUNT(*)
+        FROM edge e1
+        JOIN edge e2
+          ON e1.dst_id = e2.src_id
+         AND e1.ego_id = e2.ego_id
+        WHERE e1.ego_id = (SELECT MIN(node_id) FROM ego);
+    """
+}
+
+# Graph analytics per ego over the ego's edges without self-loops, undirected
+# except for PageRank (damping 0.85, 20 iterations, dangling rank spread
+# evenly). Iterative algorithms are recursive CTEs carrying one array per ego,
+# indexed by the ego's vertices numbered 1..n.
+POSTGRES_ANALYTICS: dict[str, LiteralString] = {
+    "A1_triangles": """
+        WITH und AS (
+            SELECT ego_id, src_id AS a, dst_id AS b FROM edge WHERE src_id <> dst_id
+            UNION
+            SELECT ego_id, dst_id, src_id FROM edge WHERE src_id <> dst_id
+        ),
+        triples AS (
+            SELECT ego_id, SUM(d * (d - 1) / 2) AS triples
+            FROM (SELECT ego_id, a, COUNT(*) AS d FROM und GROUP BY ego_id, a) deg
+            GROUP BY ego_id
+        ),
+        triangles AS (
+            SELECT e1.ego_id, COUNT(*) AS triangles
+            FROM und e1
+            JOIN und e2 ON e2.ego_id = e1.ego_id AND e2.a = e1.b AND e2.b > e2.a
+            JOIN und e3 ON e3.ego_id = e1.ego_id AND e3.a = e1.a AND e3.b = e2.b
+            WHERE e1.a < e1.b
+            GROUP BY e1.ego_id
+        )
+        SELECT t.ego_id, COALESCE(c.triangles, 0) AS triangles, 3.0 * COALESCE(c.triangles, 0) / t.triples AS clustering
+        FROM triples t
+        LEFT JOIN triangles c ON c.ego_id = t.ego_id
+        WHERE t.triples > 0;
+    """,
+    "A2_components": """
+        WITH RECURSIVE und AS (
+            SELECT ego_id, src_id AS a, dst_id AS b FROM edge WHERE src_id <> dst_id
+            UNION
+            SELECT ego_id, dst_id, src_id FROM edge WHERE src_id <> dst_id
+        ),
+        vertex AS (
+            SELECT ego_id, a AS node_id, ROW_NUMBER() OVER (PARTITION BY ego_id ORDER BY a)::int AS i
+            FROM und
+            GROUP BY ego_id, a
+        ),
+        graph AS (
+            SELECT u.ego_id, MAX(va.i) AS n, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM und u
+            JOIN vertex va ON va.ego_id = u.ego_id AND va.node_id = u.a
+            JOIN vertex vb ON vb.ego_id = u.ego_id AND vb.node_id = u.b
+            GROUP BY u.ego_id
+        ),
+        propagate(ego_id, labels, changed) AS (
+            SELECT ego_id, array(SELECT generate_series(1, n)), true FROM graph
+            UNION ALL
+            SELECT p.ego_id, step.labels, step.labels <> p.labels
+            FROM propagate p
+            JOIN graph g ON g.ego_id = p.ego_id
+            CROSS JOIN LATERAL (
+                SELECT array_agg(LEAST(p.labels[x.i], x.m) ORDER BY x.i) AS labels
+                FROM (
+                    SELECT e.a AS i, MIN(p.labels[e.b]) AS m
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.a
+                ) x
+            ) step
+            WHERE p.changed
+        ),
+        sizes AS (
+            SELECT p.ego_id, label, COUNT(*) AS size
+            FROM propagate p, unnest(p.labels) AS label
+            WHERE NOT p.changed
+            GROUP BY p.ego_id, label
+        )
+        SELECT ego_id, COUNT(*) AS components, MAX(size) AS largest_component
+        FROM sizes
+        GROUP BY ego_id;
+    """,
+    "A3_kcore": """
+        WITH RECURSIVE und AS (
+            SELECT ego_id, src_id AS a, dst_id AS b FROM edge WHERE src_id <> dst_id
+            UNION
+            SELECT ego_id, dst_id, src_id FROM edge WHERE src_id <> dst_id
+        ),
+        vertex AS (
+            SELECT ego_id, a AS node_id, ROW_NUMBER() OVER (PARTITION BY ego_id ORDER BY a)::int AS i
+            FROM und
+            GROUP BY ego_id, a
+        ),
+        graph AS (
+            SELECT u.ego_id, MAX(va.i) AS n, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM und u
+            JOIN vertex va ON va.ego_id = u.ego_id AND va.node_id = u.a
+            JOIN vertex vb ON vb.ego_id = u.ego_id AND vb.node_id = u.b
+            GROUP BY u.ego_id
+        ),
+        peel(ego_id, k, alive, core) AS (
+            SELECT ego_id, 1, array_fill(true, ARRAY[n]), array_fill(0, ARRAY[n]) FROM graph
+            UNION ALL
+            SELECT p.ego_id, CASE WHEN step.removed THEN p.k ELSE p.k + 1 END, step.alive, step.core
+            FROM peel p
+            JOIN graph g ON g.ego_id = p.ego_id
+            CROSS JOIN LATERAL (
+                SELECT bool_or(d.drop) AS removed,
+                       array_agg(p.alive[d.i] AND NOT d.drop ORDER BY d.i) AS alive,
+                       array_agg(CASE WHEN d.drop THEN p.k - 1 ELSE p.core[d.i] END ORDER BY d.i) AS core
+                FROM (
+                    SELECT e.a AS i, p.alive[e.a] AND COUNT(*) FILTER (WHERE p.alive[e.b]) < p.k AS drop
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.a
+                ) d
+            ) step
+            WHERE true = ANY(p.alive)
+        ),
+        cores AS (
+            SELECT p.ego_id, c.core, MAX(c.core) OVER (PARTITION BY p.ego_id) AS degeneracy
+            FROM peel p, unnest(p.core) AS c(core)
+            WHERE NOT true = ANY(p.alive)
+        )
+        SELECT ego_id, degeneracy, COUNT(*) AS core_size
+        FROM cores
+        WHERE core = degeneracy
+        GROUP BY ego_id, degeneracy;
+    """,
+    "A4_pagerank": """
+        WITH RECURSIVE directed AS (
+            SELECT DISTINCT ego_id, src_id AS a, dst_id AS b FROM edge WHERE src_id <> dst_id
+        ),
+        vertex AS (
+            SELECT ego_id, node_id, ROW_NUMBER() OVER (PARTITION BY ego_id ORDER BY node_id)::int AS i
+            FROM (SELECT ego_id, a AS node_id FROM directed UNION SELECT ego_id, b FROM directed) v
+        ),
+        degree AS (
+            SELECT v.ego_id, COUNT(*)::int AS n, array_agg(COALESCE(o.out, 0) ORDER BY v.i) AS out
+            FROM vertex v
+            LEFT JOIN (SELECT ego_id, a AS node_id, COUNT(*)::int AS out FROM directed GROUP BY ego_id, a) o
+                ON o.ego_id = v.ego_id AND o.node_id = v.node_id
+            GROUP BY v.ego_id
+        ),
+        graph AS (
+            SELECT d.ego_id, g.n, g.out, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM directed d
+            JOIN vertex va ON va.ego_id = d.ego_id AND va.node_id = d.a
+            JOIN vertex vb ON vb.ego_id = d.ego_id AND vb.node_id = d.b
+            JOIN degree g ON g.ego_id = d.ego_id
+            GROUP BY d.ego_id, g.n, g.out
+        ),
+        pagerank(ego_id, iteration, ranks) AS (
+            SELECT ego_id, 0, array_fill(1.0::float8 / n, ARRAY[n]) FROM graph
+            UNION ALL
+            SELECT r.ego_id, r.iteration + 1, step.ranks
+            FROM pagerank r
+            JOIN graph g ON g.ego_id = r.ego_id
+            CROSS JOIN LATERAL (
+                SELECT array_agg(0.15 / g.n + 0.85 * (COALESCE(inflow.rank, 0) + dangling.rank / g.n) ORDER BY v.i) AS ranks
+                FROM generate_series(1, g.n) AS v(i)
+                LEFT JOIN (
+                    SELECT e.b AS i, SUM(r.ranks[e.a] / g.out[e.a]) AS rank
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.b
+                ) inflow ON inflow.i = v.i
+                CROSS JOIN (
+                    SELECT COALESCE(SUM(r.ranks[i]), 0) AS rank
+                    FROM generate_series(1, g.n) AS i
+                    WHERE g.out[i] = 0
+                ) dangling
+            ) step
+            WHERE r.iteration < 20
+        )
+        SELECT v.ego_id, v.node_id, r.ranks[v.i] AS rank
+        FROM pagerank r
+        JOIN vertex v ON v.ego_id = r.ego_id
+        WHERE r.iteration = 20;
+    """
+}
+
+# The analytics for the intkeys schema, node ids joined back in for the output.
+POSTGRES_INT_ANALYTICS: dict[str, LiteralString] = {
+    "A1_triangles": """
+        WITH und AS (
+            SELECT ego_key, src_key AS a, dst_key AS b FROM edge WHERE src_key <> dst_key
+            UNION
+            SELECT ego_key, dst_key, src_key FROM edge WHERE src_key <> dst_key
+        ),
+        triples AS (
+            SELECT ego_key, SUM(d * (d - 1) / 2) AS triples
+            FROM (SELECT ego_key, a, COUNT(*) AS d FROM und GROUP BY ego_key, a) deg
+            GROUP BY ego_key
+        ),
+        triangles AS (
+            SELECT e1.ego_key, COUNT(*) AS triangles
+            FROM und e1
+            JOIN und e2 ON e2.ego_key = e1.ego_key AND e2.a = e1.b AND e2.b > e2.a
+            JOIN und e3 ON e3.ego_key = e1.ego_key AND e3.a = e1.a AND e3.b = e2.b
+            WHERE e1.a < e1.b
+            GROUP BY e1.ego_key
+        )
+        SELECT n.node_id AS ego_id, COALESCE(c.triangles, 0) AS triangles, 3.0 * COALESCE(c.triangles, 0) / t.triples AS clustering
+        FROM triples t
+        LEFT JOIN triangles c ON c.ego_key = t.ego_key
+        JOIN node n ON n.node_key = t.ego_key
+        WHERE t.triples > 0;
+    """,
+    "A2_components": """
+        WITH RECURSIVE und AS (
+            SELECT ego_key, src_key AS a, dst_key AS b FROM edge WHERE src_key <> dst_key
+            UNION
+            SELECT ego_key, dst_key, src_key FROM edge WHERE src_key <> dst_key
+        ),
+        vertex AS (
+            SELECT ego_key, a AS node_key, ROW_NUMBER() OVER (PARTITION BY ego_key ORDER BY a)::int AS i
+            FROM und
+            GROUP BY ego_key, a
+        ),
+        graph AS (
+            SELECT u.ego_key, MAX(va.i) AS n, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM und u
+            JOIN vertex va ON va.ego_key = u.ego_key AND va.node_key = u.a
+            JOIN vertex vb ON vb.ego_key = u.ego_key AND vb.node_key = u.b
+            GROUP BY u.ego_key
+        ),
+        propagate(ego_key, labels, changed) AS (
+            SELECT ego_key, array(SELECT generate_series(1, n)), true FROM graph
+            UNION ALL
+            SELECT p.ego_key, step.labels, step.labels <> p.labels
+            FROM propagate p
+            JOIN graph g ON g.ego_key = p.ego_key
+            CROSS JOIN LATERAL (
+                SELECT array_agg(LEAST(p.labels[x.i], x.m) ORDER BY x.i) AS labels
+                FROM (
+                    SELECT e.a AS i, MIN(p.labels[e.b]) AS m
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.a
+                ) x
+            ) step
+            WHERE p.changed
+        ),
+        sizes AS (
+            SELECT p.ego_key, label, COUNT(*) AS size
+            FROM propagate p, unnest(p.labels) AS label
+            WHERE NOT p.changed
+            GROUP BY p.ego_key, label
+        )
+        SELECT n.node_id AS ego_id, COUNT(*) AS components, MAX(s.size) AS largest_component
+        FROM sizes s
+        JOIN node n ON n.node_key = s.ego_key
+        GROUP BY n.node_id;
+    """,
+    "A3_kcore": """
+        WITH RECURSIVE und AS (
+            SELECT ego_key, src_key AS a, dst_key AS b FROM edge WHERE src_key <> dst_key
+            UNION
+            SELECT ego_key, dst_key, src_key FROM edge WHERE src_key <> dst_key
+        ),
+        vertex AS (
+            SELECT ego_key, a AS node_key, ROW_NUMBER() OVER (PARTITION BY ego_key ORDER BY a)::int AS i
+            FROM und
+            GROUP BY ego_key, a
+        ),
+        graph AS (
+            SELECT u.ego_key, MAX(va.i) AS n, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM und u
+            JOIN vertex va ON va.ego_key = u.ego_key AND va.node_key = u.a
+            JOIN vertex vb ON vb.ego_key = u.ego_key AND vb.node_key = u.b
+            GROUP BY u.ego_key
+        ),
+        peel(ego_key, k, alive, core) AS (
+            SELECT ego_key, 1, array_fill(true, ARRAY[n]), array_fill(0, ARRAY[n]) FROM graph
+            UNION ALL
+            SELECT p.ego_key, CASE WHEN step.removed THEN p.k ELSE p.k + 1 END, step.alive, step.core
+            FROM peel p
+            JOIN graph g ON g.ego_key = p.ego_key
+            CROSS JOIN LATERAL (
+                SELECT bool_or(d.drop) AS removed,
+                       array_agg(p.alive[d.i] AND NOT d.drop ORDER BY d.i) AS alive,
+                       array_agg(CASE WHEN d.drop THEN p.k - 1 ELSE p.core[d.i] END ORDER BY d.i) AS core
+                FROM (
+                    SELECT e.a AS i, p.alive[e.a] AND COUNT(*) FILTER (WHERE p.alive[e.b]) < p.k AS drop
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.a
+                ) d
+            ) step
+            WHERE true = ANY(p.alive)
+        ),
+        cores AS (
+            SELECT p.ego_key, c.core, MAX(c.core) OVER (PARTITION BY p.ego_key) AS degeneracy
+            FROM peel p, unnest(p.core) AS c(core)
+            WHERE NOT true = ANY(p.alive)
+        )
+        SELECT n.node_id AS ego_id, c.degeneracy, COUNT(*) AS core_size
+        FROM cores c
+        JOIN node n ON n.node_key = c.ego_key
+        WHERE c.core = c.degeneracy
+        GROUP BY n.node_id, c.degeneracy;
+    """,
+    "A4_pagerank": """
+        WITH RECURSIVE directed AS (
+            SELECT DISTINCT ego_key, src_key AS a, dst_key AS b FROM edge WHERE src_key <> dst_key
+        ),
+        vertex AS (
+            SELECT ego_key, node_key, ROW_NUMBER() OVER (PARTITION BY ego_key ORDER BY node_key)::int AS i
+            FROM (SELECT ego_key, a AS node_key FROM directed UNION SELECT ego_key, b FROM directed) v
+        ),
+        degree AS (
+            SELECT v.ego_key, COUNT(*)::int AS n, array_agg(COALESCE(o.out, 0) ORDER BY v.i) AS out
+            FROM vertex v
+            LEFT JOIN (SELECT ego_key, a AS node_key, COUNT(*)::int AS out FROM directed GROUP BY ego_key, a) o
+                ON o.ego_key = v.ego_key AND o.node_key = v.node_key
+            GROUP BY v.ego_key
+        ),
+        graph AS (
+            SELECT d.ego_key, g.n, g.out, array_agg(va.i) AS a, array_agg(vb.i) AS b
+            FROM directed d
+            JOIN vertex va ON va.ego_key = d.ego_key AND va.node_key = d.a
+            JOIN vertex vb ON vb.ego_key = d.ego_key AND vb.node_key = d.b
+            JOIN degree g ON g.ego_key = d.ego_key
+            GROUP BY d.ego_key, g.n, g.out
+        ),
+        pagerank(ego_key, iteration, ranks) AS (
+            SELECT ego_key, 0, array_fill(1.0::float8 / n, ARRAY[n]) FROM graph
+            UNION ALL
+            SELECT r.ego_key, r.iteration + 1, step.ranks
+            FROM pagerank r
+            JOIN graph g ON g.ego_key = r.ego_key
+            CROSS JOIN LATERAL (
+                SELECT array_agg(0.15 / g.n + 0.85 * (COALESCE(inflow.rank, 0) + dangling.rank / g.n) ORDER BY v.i) AS ranks
+                FROM generate_series(1, g.n) AS v(i)
+                LEFT JOIN (
+                    SELECT e.b AS i, SUM(r.ranks[e.a] / g.out[e.a]) AS rank
+                    FROM unnest(g.a, g.b) AS e(a, b)
+                    GROUP BY e.b
+                ) inflow ON inflow.i = v.i
+                CROSS JOIN (
+                    SELECT COALESCE(SUM(r.ranks[i]), 0) AS rank
+                    FROM generate_series(1, g.n) AS i
+                    WHERE g.out[i] = 0
+                ) dangling
+            ) step
+            WHERE r.iteration < 20
+        )
+        SELECT e.node_id AS ego_id, n.node_id, r.ranks[v.i] AS rank
+        FROM pagerank r
+        JOIN vertex v ON v.ego_key = r.ego_key
+        JOIN node e ON e.node_key = v.ego_key
+        JOIN node n ON n.node_key = v.node_key
+        WHERE r.iteration = 20;
+    """
+}
+
 NEO4J_SIMPLE: dict[str, LiteralString]= {
     "S1_nodes_by_label": """
         MATCH (n)
+        WHERE NOT n:IngestManifest
         RETURN labels(n) AS labels, COUNT(*) AS count;
     """,
 
@@ -159,4 +720,3 @@ NEO4J_COMPLEX: dict[str, LiteralString] = {
         RETURN e.id AS ego_id, COUNT(*) AS triangle_count;
     """
 }
-
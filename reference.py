@@ -0,0 +1,553 @@
+"""
+In-process reference engine. The parsed dataset is loaded into NumPy/SciPy
+structures and every benchmark query is computed from them, giving a
+database-free baseline and the expected result of each query:
+
+    edges       one sparse node x node adjacency per ego
+    user_feat   sparse node x feature name incidence of the users' features
+    ego_feat    the same for the egos' own features
+    members     sparse circle x node membership
+    owns        sparse ego x circle ownership
+
+Node ids, feature names and circle ids are interned to integers. The
+relational queries model what PSQLIngestor stores after a serial import in
+parser.getUids order (a user, node type or circle belongs to the first ego
+that inserted it); the graph queries model what Neo4JIngestor stores (see
+exporter.exportNeo4jImport).
+"""
+
+import time
+from collections.abc import Callable, Iterator
+from functools import partial
+from os import makedirs
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+import parser
+from ingestor import RESULT_DIR, phase_medians
+from results import PeakMemory, export_stats, read_result, result_path, write_frame
+
+# Queries whose rows are cut by ORDER BY ... LIMIT: rows tied at the cut can
+# differ between engines, so only their ranked values are compared
+RANKED = {"S6"}
+
+def binary(rows: list[int], cols: list[int], shape: tuple[int, int]) -> sp.csr_array:
+    """
+    Sparse 0/1 matrix with a one at every (row, col) pair, duplicates included once.
+    """
+    m = sp.coo_array((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=shape).tocsr()
+    m.sum_duplicates()
+    m.data[:] = 1
+    return m
+
+class ReferenceEngine:
+    def __init__(self, data_dir: Path) -> None:
+        self.label = "reference"
+        start = time.perf_counter()
+        self.load(data_dir)
+        self.load_sec = time.perf_counter() - start
+
+    def load(self, data_dir: Path):
+        nodes: dict[str, int] = {}
+        names: dict[str, int] = {}
+        circles: dict[str, int] = {}
+        groups: set[str] = set()
+
+        def node(node_id: str) -> int:
+            return nodes.setdefault(node_id, len(nodes))
+
+        def name(feature: str) -> int:
+            return names.setdefault(feature, len(names))
+
+        def circle(cid: str) -> int:
+            return circles.setdefault(cid, len(circles))
+
+        node_type: dict[int, int] = {}
+        user_ego: dict[int, int] = {}
+        circle_owner: dict[int, int] = {}
+        ego_edges: list[tuple[list[int], list[int]]] = []
+        ego_users: tuple[list[int], list[int]] = ([], [])
+        owns: tuple[list[int], list[int]] = ([], [])
+        members: tuple[list[int], list[int]] = ([], [])
+        user_feat: tuple[list[int], list[int]] = ([], [])
+        ego_feat: tuple[list[int], list[int]] = ([], [])
+
+        self.uids = parser.getUids(data_dir)
+        for e, uid in enumerate(self.uids):
+            edges, feats, node_features, ego_features, circs = parser.parseEgoNetwork(data_dir, uid)
+            ego = node(uid)
+            groups.update(group for group, _ in feats)
+            for _, feature in feats:
+                name(feature)
+
+            node_type.setdefault(ego, 0)
+            for user in map(node, node_features.keys()):
+                node_type.setdefault(user, 1)
+                user_ego.setdefault(user, e)
+                ego_users[0].append(e)
+                ego_users[1].append(user)
+
+            for features, rows in ((node_features, user_feat), (ego_features, ego_feat)):
+                for node_id, fs in features.items():
+                    n = node(node_id)
+                    for feature in fs:
+                        rows[0].append(n)
+                        rows[1].append(name(feature))
+
+            for cid, users in circs.items():
+                c = circle(cid)
+                circle_owner.setdefault(c, e)
+                owns[0].append(e)
+                owns[1].append(c)
+                for user in users:
+                    members[0].append(c)
+                    members[1].append(node(user))
+
+            ego_edges.append(([node(a) for a, _ in edges], [node(b) for _, b in edges]))
+
+        n, f, c, e = len(nodes), len(names), len(circles), len(self.uids)
+        self.node_ids = np.array(list(nodes.keys()), dtype=object)
+        self.feature_names = np.array(list(names.keys()), dtype=object)
+        self.circle_ids = np.array(list(circles.keys()), dtype=object)
+        self.groups = len(groups)
+
+        self.node_type = np.full(n, -1, dtype=np.int8)
+        self.node_type[list(node_type.keys())] = list(node_type.values())
+        self.user_ego = np.full(n, -1, dtype=np.int64)
+        self.user_ego[list(user_ego.keys())] = list(user_ego.values())
+        self.circle_owner = np.array([circle_owner[i] for i in range(c)], dtype=np.int64)
+        self.is_user = np.zeros(n, dtype=bool)
+        self.is_user[ego_users[1]] = True
+
+        self.edges = [binary(src, dst, (n, n)) for src, dst in ego_edges]
+        self.ego_users = binary(*ego_users, (e, n))
+        self.owns = binary(*owns, (e, c))
+        self.members = binary(*members, (c, n))
+        self.user_feat = binary(*user_feat, (n, f))
+        self.ego_feat = binary(*ego_feat, (n, f))
+
+    def metrics(
+        self,
+        queries: dict[str, Callable[["ReferenceEngine"], dict]],
+        complexity: str,
+        warmup: int = 0,
+        iterations: int = 1,
+        before_run: Callable[[], None] | None = None,
+        label: str | None = None,
+        result_format: str = "csv"
+    ):
+        """
+        Same records as PSQLIngestor.metrics. Queries return their result
+        columns, computing them counts as server time and building the
+        result DataFrame as frame_sec. Results are in memory already, so
+        every format is written from the DataFrame, after the last timed run
+        and within its peak memory.
+        """
+        results = []
+        label = label or self.label
+        makedirs(RESULT_DIR, exist_ok=True)
+
+        for query_name, query in queries.items():
+            for _ in range(warmup):
+                query(self)
+
+            path = result_path(RESULT_DIR, label, query_name, result_format)
+            timings = []
+            peak_memory = PeakMemory()
+            for i in range(iterations):
+                if before_run is not None:
+                    before_run()
+                if i == iterations - 1:
+                    peak_memory.start()
+                start = time.perf_counter()
+                columns = query(self)
+                elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                df = pd.DataFrame(columns)
+                frame = time.perf_counter() - start
+                timings.append({"time_sec": elapsed, "server_sec": elapsed, "frame_sec": frame})
+
+            start = time.perf_counter()
+            write_frame(df, path, result_format)
+            write_sec = time.perf_counter() - start
+            peak = peak_memory.stop()
+
+            medians = phase_medians(timings)
+            medians["write_sec"] = write_sec
+            export_sec = medians["time_sec"] + medians["frame_sec"] + medians["write_sec"]
+
+            results.append({
+                "db": label,
+                "query": query_name,
+                "complexity": complexity,
+                **medians,
+                "samples": timings,
+                "rows": len(df),
+                "preview": df.head(10).to_dict(orient="records"),
+                "result_path": path,
+                **export_stats(len(df), path, export_sec, peak)
+            })
+        return results
+
+    def mismatches(self, expected: list[dict], results: list[dict]) -> list[dict]:
+        """
+        Compares the result file of every query in results with the expected
+        one of the same query id. Rows are compared as a multiset with
+        numbers rounded, so neither row order, column names nor numeric
+        types matter.
+        """
+        by_id = {r["query"].split("_")[0]: r for r in expected}
+        records = []
+
+        for r in results:
+            query_id = r["query"].split("_")[0]
+            if query_id not in by_id:
+                continue
+            ref = by_id[query_id]
+            want = normalized(read_result(ref["result_path"]), query_id in RANKED)
+            got = normalized(read_result(r["result_path"]), query_id in RANKED)
+            records.append({
+                "db": r["db"],
+                "query": r["query"],
+                "reference": ref["db"],
+                "expected_rows": len(want),
+                "rows": len(got),
+                "missing_rows": len(set(want) - set(got)),
+                "extra_rows": len(set(got) - set(want)),
+                "match": want == got,
+            })
+        return records
+
+    def ego_rows(self, counts: np.ndarray, name: str) -> dict[str, np.ndarray]:
+        keep = np.flatnonzero(counts)
+        return {"ego_id": np.array(self.uids, dtype=object)[keep], name: counts[keep]}
+
+    def node_features(self) -> sp.csr_array:
+        """
+        Relational node_feature: users and egos share one node row.
+        """
+        m = (self.user_feat + self.ego_feat).tocsr()
+        m.data[:] = 1
+        return m
+
+def normalized(df: pd.DataFrame, ranked: bool = False) -> list[tuple]:
+    def value(v):
+        if isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool):
+            return round(float(v), 6)
+        return str(v)
+
+    if ranked:
+        numeric = df.select_dtypes("number")
+        return sorted(tuple(value(v) for v in row) for row in numeric.itertuples(index=False))
+    return sorted(tuple(value(v) for v in row) for row in df.itertuples(index=False))
+
+def top_features(counts: np.ndarray, names: np.ndarray, limit: int = 10) -> dict[str, np.ndarray]:
+    order = np.argsort(-counts, kind="stable")[:limit]
+    order = order[counts[order] > 0]
+    return {"name": names[order], "usage_count": counts[order]}
+
+# --- Relational queries, same names as POSTGRES_SIMPLE / POSTGRES_COMPLEX ---
+
+def nodes_by_type(ref: ReferenceEngine):
+    counts = np.bincount(ref.node_type[ref.node_type >= 0], minlength=2)
+    return {"node_type": np.array(["ego", "user"], dtype=object), "count": counts}
+
+def users_per_ego(ref: ReferenceEngine):
+    return ref.ego_rows(np.bincount(ref.user_ego[ref.user_ego >= 0], minlength=len(ref.uids)), "count")
+
+def edges_per_ego(ref: ReferenceEngine):
+    return ref.ego_rows(np.array([a.nnz for a in ref.edges]), "count")
+
+def circles_per_ego(ref: ReferenceEngine):
+    return ref.ego_rows(np.bincount(ref.circle_owner, minlength=len(ref.uids)), "count")
+
+def avg_features_per_node(ref: ReferenceEngine):
+    counts = np.diff(ref.node_features().indptr)
+    return {"avg": [counts[counts > 0].mean()]}
+
+def top_features_relational(ref: ReferenceEngine):
+    return top_features(ref.node_features().sum(axis=0), ref.feature_names)
+
+def avg_circle_size(ref: ReferenceEngine):
+    sizes = np.diff(ref.members.indptr)
+    filled = sizes > 0
+    total = np.bincount(ref.circle_owner[filled], weights=sizes[filled], minlength=len(ref.uids))
+    circles = np.bincount(ref.circle_owner[filled], minlength=len(ref.uids))
+    keep = np.flatnonzero(circles)
+    return {"ego_id": np.array(ref.uids, dtype=object)[keep], "avg": total[keep] / circles[keep]}
+
+def high_degree_users(ref: ReferenceEngine):
+    degrees = [np.diff(a.indptr) for a in ref.edges]
+    total = np.sum(degrees, axis=0)
+    threshold = total[total > 0].mean()
+
+    src, ego, degree = [], [], []
+    for uid, d in zip(ref.uids, degrees):
+        keep = np.flatnonzero(d > threshold)
+        src.append(ref.node_ids[keep])
+        ego.append(np.full(len(keep), uid, dtype=object))
+        degree.append(d[keep])
+    return {"src_id": np.concatenate(src), "ego_id": np.concatenate(ego), "degree": np.concatenate(degree)}
+
+def feature_overlap(ref: ReferenceEngine):
+    # Pairs of members sharing a feature: k choose 2 for the k members having it
+    k = (ref.members @ ref.node_features()).tocsr()
+    rows = np.repeat(np.arange(k.shape[0]), np.diff(k.indptr))
+    counts = np.bincount(rows, weights=k.data * (k.data - 1) // 2, minlength=k.shape[0]).astype(np.int64)
+    keep = np.flatnonzero(counts)
+    return {"circle_id": ref.circle_ids[keep], "count": counts[keep]}
+
+def triangle_proxy(ref: ReferenceEngine):
+    egos, paths, sources = [], [], []
+    for uid, a in zip(ref.uids, ref.edges):
+        per_source = a @ np.diff(a.indptr)
+        if per_source.sum() > 0:
+            egos.append(uid)
+            paths.append(per_source.sum())
+            sources.append(np.count_nonzero(per_source))
+    paths_a, sources_a = np.array(paths), np.array(sources)
+    return {
+        "ego_id": np.array(egos, dtype=object),
+        "two_hop_paths": paths_a,
+        "distinct_sources": sources_a,
+        "closure_potential": paths_a / sources_a if len(egos) else paths_a.astype(float)
+    }
+
+REFERENCE_SIMPLE: dict[str, Callable[[ReferenceEngine], dict]] = {
+    "S1_nodes_by_type": nodes_by_type,
+    "S2_users_per_ego": users_per_ego,
+    "S3_edges_per_ego": edges_per_ego,
+    "S4_circles_per_ego": circles_per_ego,
+    "S5_avg_features_per_node": avg_features_per_node,
+    "S6_top_features": top_features_relational,
+}
+
+REFERENCE_COMPLEX: dict[str, Callable[[ReferenceEngine], dict]] = {
+    "C1_avg_circle_size": avg_circle_size,
+    "C2_high_degree_users": high_degree_users,
+    "C3_feature_overlap": feature_overlap,
+    "C4_triangle_proxy": triangle_proxy,
+}
+
+# --- Graph queries, same names as NEO4J_SIMPLE / NEO4J_COMPLEX ---
+
+def follows(ref: ReferenceEngine) -> sp.csr_array:
+    """
+    User FOLLOWS relationships of every ego, merged, between users only.
+    """
+    users = sp.diags_array(ref.is_user, dtype=np.int64)
+    f = (users @ sum(ref.edges[1:], ref.edges[0]) @ users).tocsr()
+    f.eliminate_zeros()
+    f.data[:] = 1
+    return f
+
+def circle_users(ref: ReferenceEngine) -> sp.csr_array:
+    m = (ref.members @ sp.diags_array(ref.is_user, dtype=np.int64)).tocsr()
+    m.eliminate_zeros()
+    return m
+
+def nodes_by_label(ref: ReferenceEngine):
+    labels = ["Ego", "User", "Circle", "FeatGroup", "FeatName"]
+    counts = [len(ref.uids), int(ref.is_user.sum()), len(ref.circle_ids), ref.groups, len(ref.feature_names)]
+    return {"labels": [[label] for label in labels], "count": counts}
+
+def users_per_ego_graph(ref: ReferenceEngine):
+    return ref.ego_rows(np.diff(ref.ego_users.indptr), "user_count")
+
+def follows_per_ego_graph(ref: ReferenceEngine):
+    return ref.ego_rows(np.diff(ref.ego_users.indptr), "follows_count")
+
+def circles_per_ego_graph(ref: ReferenceEngine):
+    return ref.ego_rows(np.diff(ref.owns.indptr), "circle_count")
+
+def avg_features_per_user(ref: ReferenceEngine):
+    counts = np.diff(ref.user_feat.indptr)[ref.is_user]
+    return {"avg_features_per_user": [counts[counts > 0].mean()]}
+
+def top_features_graph(ref: ReferenceEngine):
+    # Ego and User nodes are distinct even when they share an id
+    return top_features(ref.user_feat.sum(axis=0) + ref.ego_feat.sum(axis=0), ref.feature_names)
+
+def avg_circle_size_graph(ref: ReferenceEngine):
+    sizes = np.diff(circle_users(ref).indptr)
+    filled = ref.owns @ sp.diags_array(sizes > 0, dtype=np.int64)
+    total = (filled @ sizes).astype(float)
+    circles = filled.sum(axis=1)
+    keep = np.flatnonzero(circles)
+    return {"ego_id": np.array(ref.uids, dtype=object)[keep], "avg_circle_size": total[keep] / circles[keep]}
+
+def high_degree_users_graph(ref: ReferenceEngine):
+    degree = np.diff(follows(ref).indptr)
+    threshold = degree[degree > 0].mean()
+    keep = np.flatnonzero(degree > threshold)
+    return {"user_id": ref.node_ids[keep], "degree": degree[keep]}
+
+def feature_overlap_graph(ref: ReferenceEngine):
+    # Features held by at least two members of the circle
+    k = (circle_users(ref) @ ref.user_feat).tocsr()
+    shared = sp.csr_array((k.data >= 2, k.indices, k.indptr), shape=k.shape).sum(axis=1)
+    keep = np.flatnonzero(shared)
+    return {"circle_id": ref.circle_ids[keep], "shared_features": shared[keep]}
+
+def triangle_proxy_graph(ref: ReferenceEngine):
+    # Mutual follows of each user, a user cannot follow itself twice
+    f = follows(ref)
+    mutual = f * f.T
+    mutual = mutual - sp.diags_array(mutual.diagonal(), dtype=mutual.dtype)
+    return ref.ego_rows(ref.ego_users @ mutual.sum(axis=1), "triangle_count")
+
+REFERENCE_GRAPH_SIMPLE: dict[str, Callable[[ReferenceEngine], dict]] = {
+    "S1_nodes_by_label": nodes_by_label,
+    "S2_users_per_ego": users_per_ego_graph,
+    "S3_edges_per_ego": follows_per_ego_graph,
+    "S4_circles_per_ego": circles_per_ego_graph,
+    "S5_avg_features_per_user": avg_features_per_user,
+    "S6_top_features": top_features_graph,
+}
+
+REFERENCE_GRAPH_COMPLEX: dict[str, Callable[[ReferenceEngine], dict]] = {
+    "C1_avg_circle_size": avg_circle_size_graph,
+    "C2_high_degree_users": high_degree_users_graph,
+    "C3_feature_overlap": feature_overlap_graph,
+    "C4_triangle_proxy": triangle_proxy_graph,
+}
+
+# --- Analytics, same names as POSTGRES_ANALYTICS ---
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_ITERATIONS = 20
+
+def ego_graphs(ref: ReferenceEngine, graph: bool = False) -> Iterator[tuple[str, np.ndarray, sp.csr_array]]:
+    """
+    Each ego's directed edges without self-loops as (ego id, node ids,
+    adjacency) over the nodes having any. The relational graph is the ego's
+    own edges, the graph one the FOLLOWS between the ego's users.
+    """
+    f = follows(ref) if graph else None
+    for e, uid in enumerate(ref.uids):
+        if graph:
+            ids = ref.ego_users.indices[ref.ego_users.indptr[e]:ref.ego_users.indptr[e + 1]]
+            a = f[ids][:, ids]
+        else:
+            ids = np.arange(len(ref.node_ids))
+            a = ref.edges[e]
+        a = (a - sp.diags_array(a.diagonal(), dtype=a.dtype)).tocsr()
+        a.eliminate_zeros()
+        touched = np.flatnonzero(np.diff(a.indptr) + np.diff(a.tocsc().indptr))
+        if len(touched):
+            yield uid, ids[touched], a[touched][:, touched].tocsr()
+
+def undirected(a: sp.csr_array) -> sp.csr_array:
+    u = (a + a.T).tocsr().astype(np.int64)
+    u.data[:] = 1
+    u.sort_indices()
+    return u
+
+def triangle_count(u: sp.csr_array, chunk: int = 1 << 16) -> int:
+    """
+    Sorted-adjacency intersection over the upper triangle: for every edge
+    (v, w) the higher neighbours of w are searched in the sorted row of v.
+    """
+    up = sp.triu(u, k=1).tocsr()
+    up.sort_indices()
+    n = up.shape[0]
+    degree = np.diff(up.indptr)
+    rows = np.repeat(np.arange(n), degree)
+    keys = rows * n + up.indices
+    total = 0
+
+    for start in range(0, up.nnz, chunk):
+        v, w = rows[start:start + chunk], up.indices[start:start + chunk]
+        lengths = degree[w]
+        if not lengths.sum():
+            continue
+        offsets = np.repeat(up.indptr[w] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        probe = np.repeat(v, lengths) * n + up.indices[offsets]
+        found = np.minimum(np.searchsorted(keys, probe), len(keys) - 1)
+        total += np.count_nonzero(keys[found] == probe)
+    return total
+
+def core_numbers(u: sp.csr_array) -> np.ndarray:
+    """
+    Peels level by level: at level k the nodes left with fewer than k live
+    neighbours are removed and get core number k - 1.
+    """
+    degree = np.diff(u.indptr).astype(np.int64)
+    alive = np.ones(u.shape[0], dtype=bool)
+    core = np.zeros(u.shape[0], dtype=np.int64)
+    k = 1
+    while alive.any():
+        drop = alive & (degree < k)
+        if not drop.any():
+            k = degree[alive].min() + 1
+            continue
+        core[drop] = k - 1
+        alive &= ~drop
+        degree -= u @ drop.astype(np.int64)
+    return core
+
+def pagerank(a: sp.csr_array) -> np.ndarray:
+    n = a.shape[0]
+    out = np.diff(a.indptr)
+    incoming = a.T.tocsr()
+    dangling = out == 0
+    ranks = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_ITERATIONS):
+        share = np.divide(ranks, out, out=np.zeros(n), where=~dangling)
+        ranks = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * (incoming @ share + ranks[dangling].sum() / n)
+    return ranks
+
+def triangles(ref: ReferenceEngine, graph: bool = False):
+    egos, counts, clustering = [], [], []
+    for uid, _, a in ego_graphs(ref, graph):
+        u = undirected(a)
+        degree = np.diff(u.indptr)
+        triples = (degree * (degree - 1) // 2).sum()
+        if triples > 0:
+            t = triangle_count(u)
+            egos.append(uid)
+            counts.append(t)
+            clustering.append(3 * t / triples)
+    return {"ego_id": np.array(egos, dtype=object), "triangles": counts, "clustering": clustering}
+
+def components(ref: ReferenceEngine, graph: bool = False):
+    egos, counts, largest = [], [], []
+    for uid, _, a in ego_graphs(ref, graph):
+        count, labels = connected_components(undirected(a), directed=False)
+        egos.append(uid)
+        counts.append(count)
+        largest.append(np.bincount(labels).max())
+    return {"ego_id": np.array(egos, dtype=object), "components": counts, "largest_component": largest}
+
+def kcore(ref: ReferenceEngine, graph: bool = False):
+    egos, degeneracy, size = [], [], []
+    for uid, _, a in ego_graphs(ref, graph):
+        core = core_numbers(undirected(a))
+        egos.append(uid)
+        degeneracy.append(core.max())
+        size.append(np.count_nonzero(core == core.max()))
+    return {"ego_id": np.array(egos, dtype=object), "degeneracy": degeneracy, "core_size": size}
+
+def pageranks(ref: ReferenceEngine, graph: bool = False):
+    egos, nodes, ranks = [], [], []
+    for uid, ids, a in ego_graphs(ref, graph):
+        egos.append(np.full(len(ids), uid, dtype=object))
+        nodes.append(ref.node_ids[ids])
+        ranks.append(pagerank(a))
+    if not egos:
+        return {"ego_id": [], "node_id": [], "rank": []}
+    return {"ego_id": np.concatenate(egos), "node_id": np.concatenate(nodes), "rank": np.concatenate(ranks)}
+
+REFERENCE_ANALYTICS: dict[str, Callable[[ReferenceEngine], dict]] = {
+    "A1_triangles": triangles,
+    "A2_components": components,
+    "A3_kcore": kcore,
+    "A4_pagerank": pageranks,
+}
+
+REFERENCE_GRAPH_ANALYTICS: dict[str, Callable[[ReferenceEngine], dict]] = {
+    name: partial(query, graph=True) for name, query in REFERENCE_ANALYTICS.items()
+}
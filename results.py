@@ -0,0 +1,213 @@
+"""
+Query result export. A result is written in one of RESULT_FORMATS:
+
+    csv      fetched whole into a DataFrame and written with pandas
+    parquet  streamed batch by batch into the row groups of a Parquet file
+    arrow    streamed batch by batch into an Arrow IPC file
+
+The streamed formats only hold one batch of rows on the client at a time,
+so results larger than client memory can be exported.
+"""
+
+import time
+from collections.abc import Iterable
+from pathlib import Path
+import pandas as pd
+
+RESULT_FORMATS = ("csv", "parquet", "arrow")
+
+# Rows fetched from the server and written per batch by the streamed formats
+RESULT_BATCH_ROWS = 10000
+
+# Rows held back while a column has only been NULL, see BatchWriter
+RESULT_PENDING_ROWS = 10 * RESULT_BATCH_ROWS
+
+def result_path(result_dir: str, label: str, name: str, fmt: str) -> str:
+    return f"{result_dir}/{label}_{name}.{fmt}"
+
+class BatchWriter:
+    """
+    Writes batches of rows to a Parquet or Arrow IPC file. The file's column
+    types are unified over the batches seen before it is opened, which is
+    held off while a column has only been NULL, for up to
+    RESULT_PENDING_ROWS rows; a column still NULL by then is written as
+    strings. Later batches are cast to the file's types.
+    """
+    def __init__(self, path: str, fmt: str) -> None:
+        if fmt not in ("parquet", "arrow"):
+            raise ValueError(f"Cannot stream results as {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+        self.schema = None
+        self.pending: list = []
+        self.pending_rows = 0
+        self.rows = 0
+        self.write_sec = 0.0
+
+    def write(self, columns: list[str], rows: list[tuple]):
+        import pyarrow as pa
+        start = time.perf_counter()
+        values = list(zip(*rows)) if rows else [() for _ in columns]
+        batch = pa.RecordBatch.from_arrays([pa.array(v) for v in values], names=list(columns))
+        if self.schema is None:
+            self.pending.append(batch)
+            self.pending_rows += len(rows)
+            schema = pa.unify_schemas([b.schema for b in self.pending], promote_options="permissive")
+            if self.pending_rows >= RESULT_PENDING_ROWS or not any(pa.types.is_null(f.type) for f in schema):
+                self.open(schema)
+        else:
+            self.writer.write_batch(batch.cast(self.schema))
+        self.rows += len(rows)
+        self.write_sec += time.perf_counter() - start
+
+    def open(self, schema):
+        """
+        Opens the file with schema, NULL columns as strings, and writes the
+        batches held back.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.schema = pa.schema([
+            f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema
+        ])
+        if self.fmt == "parquet":
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+        for batch in self.pending:
+            self.writer.write_batch(batch.cast(self.schema))
+        self.pending.clear()
+
+    def close(self, columns: list[str] | None = None):
+        """
+        An empty result still gets a file, with string columns.
+        """
+        import pyarrow as pa
+        if self.writer is None:
+            if self.pending:
+                self.open(pa.unify_schemas([b.schema for b in self.pending], promote_options="permissive"))
+            else:
+                self.open(pa.schema([(c, pa.null()) for c in columns or []]))
+        self.writer.close()
+
+def stream_result(batches: Iterable[tuple[list[str], list[tuple]]], path: str, fmt: str) -> dict:
+    """
+    Writes (column names, rows) batches to path as they come. Returns the
+    rows written, the share of time spent writing them (write_sec) and the
+    first rows as a preview.
+    """
+    writer = BatchWriter(path, fmt)
+    preview: list[dict] = []
+    columns: list[str] = []
+    try:
+        for columns, rows in batches:
+            if len(preview) < 10:
+                preview += [dict(zip(columns, row)) for row in rows[:10 - len(preview)]]
+            writer.write(columns, rows)
+    finally:
+        writer.close(columns)
+    return {"rows": writer.rows, "write_sec": writer.write_sec, "preview": preview}
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS counter (VmHWM) to the current RSS. Linux only,
+    elsewhere peak_rss() keeps reporting the peak of the whole process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def read_rss(field: str = "VmRSS") -> int:
+    """
+    Resident set size of this process in bytes, VmHWM gives the peak.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def release_memory():
+    """
+    Hands memory that was freed but kept by the allocators back to the OS,
+    so that its reuse shows up as resident memory again: Python's garbage,
+    Arrow's pool and, with glibc, the C heap.
+    """
+    import gc
+    import pyarrow as pa
+    gc.collect()
+    pa.default_memory_pool().release_unused()
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+# Buffers allocated through a proxy pool can outlive the export, e.g. the
+# Arrow-backed strings of a DataFrame, and freeing them through a pool that
+# is gone crashes; proxies are small, so every one is kept
+ARROW_POOLS: list = []
+
+class PeakMemory:
+    """
+    Peak memory of an export between start and stop: how far the resident
+    set grew above where it started, or the peak of Arrow's memory pool if
+    higher, as memory Arrow freed earlier is reused without growing it.
+    Cheap enough to wrap a timed run.
+    """
+    def start(self):
+        import pyarrow as pa
+        self.default_pool = pa.default_memory_pool()
+        # A proxy of the default pool, to read the peak of this export alone
+        self.pool = pa.proxy_memory_pool(self.default_pool)
+        ARROW_POOLS.append(self.pool)
+        pa.set_memory_pool(self.pool)
+        release_memory()
+        reset_peak_rss()
+        self.rss_before = read_rss()
+
+    def stop(self) -> int:
+        import pyarrow as pa
+        grown = read_rss("VmHWM") - self.rss_before
+        pa.set_memory_pool(self.default_pool)
+        return max(grown, self.pool.max_memory(), 0)
+
+def export_stats(rows: int, path: str, export_sec: float, peak_bytes: int) -> dict:
+    """
+    Throughput of an export that took export_sec from running the query to
+    the result file being written.
+    """
+    size = Path(path).stat().st_size
+    return {
+        "export_sec": export_sec,
+        "result_bytes": size,
+        "rows_per_sec": rows / export_sec if export_sec > 0 else float("nan"),
+        "bytes_per_sec": size / export_sec if export_sec > 0 else float("nan"),
+        "peak_bytes": peak_bytes,
+    }
+
+def write_frame(df: pd.DataFrame, path: str, fmt: str):
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(path)
+
+def read_result(path: str) -> pd.DataFrame:
+    """
+    A result file of any of the RESULT_FORMATS, by its suffix.
+    """
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".arrow"):
+        return pd.read_feather(path)
+    return pd.read_csv(path)